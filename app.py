@@ -56,7 +56,7 @@ def process_pdf(job_id, filepath):
             df_final = tile_ocr(drawing, batch_size=24, gpu=True)
             
             # Extract tendons
-            vis = extract_tendons(df_final, drawing)
+            vis, tendons = extract_tendons(df_final, drawing)
             
             # Save result
             output_path = os.path.join(job_output_folder, f'page_{i}.png')
@@ -0,0 +1,114 @@
+"""
+Accuracy and throughput of the CPU inference settings of the doctr backend
+
+Runs the same fixed tile set through each variant, every variant in its own
+process (torch thread pools and quantized engines are process-wide):
+  - eager     plain OCR(gpu=False), the reference
+  - cpu       inference_mode + channels-last + thread settings
+  - int8-reco cpu + dynamic int8 quantization of the recognition model
+  - int8-all  int8-reco + static int8 quantization of the detection backbone
+
+Accuracy is the fraction of the reference words found with the same text by
+a variant, and the largest shift of a matched box (tile-normalized).
+
+Usage:
+    python benchmarks/cpu_inference.py
+    python benchmarks/cpu_inference.py --tiles 16 --intra-op 8 --inter-op 1
+    python benchmarks/cpu_inference.py --variants eager int8-reco --save cpu.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.ocr_compare import parity, run, sample_tiles, words
+
+VARIANTS = {
+    'eager': dict(cpu_optimize=False),
+    'cpu': dict(cpu_optimize=True, quantize='none'),
+    'int8-reco': dict(cpu_optimize=True, quantize='recognition'),
+    'int8-all': dict(cpu_optimize=True, quantize='all'),
+}
+
+
+def run_variant(args):
+    from ocr.cpu_accel import calibration_tiles
+    from ocr.doctr import OCR
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Cannot read {args.image}")
+    tiles = sample_tiles(image, args.tiles)
+
+    options = dict(VARIANTS[args.variant])
+    if options['cpu_optimize']:
+        options.update(intra_op_threads=args.intra_op, inter_op_threads=args.inter_op)
+    if options.get('quantize') == 'all':
+        # Calibrated on other tiles of the calibration sheet than the ones measured
+        options['calibration_images'] = calibration_tiles(args.calibration_image)
+    ocr = OCR(gpu=False, **options)
+
+    # Warm-up so first-call allocations are not timed
+    run(ocr, tiles[:1], 1)
+    results, seconds = run(ocr, tiles, args.batch_size)
+    return {
+        'variant': args.variant,
+        'seconds_per_tile': round(seconds / len(tiles), 4),
+        'words': [words(r) for r in results],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=os.path.join(ROOT, 'data', 'original.png'))
+    parser.add_argument('--calibration-image', default=os.path.join(ROOT, 'data', 'original.png'))
+    parser.add_argument('--tiles', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--intra-op', type=int, default=0, help='torch intra-op threads (0 = default)')
+    parser.add_argument('--inter-op', type=int, default=0, help='torch inter-op threads (0 = default)')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--variant', choices=list(VARIANTS), help='run a single variant in this process')
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args)))
+        return
+
+    variants = ['eager'] + [v for v in args.variants if v != 'eager']
+    runs = []
+    for variant in variants:
+        cmd = [sys.executable, os.path.abspath(__file__), '--variant', variant,
+               '--image', args.image, '--calibration-image', args.calibration_image,
+               '--tiles', str(args.tiles), '--batch-size', str(args.batch_size),
+               '--intra-op', str(args.intra_op), '--inter-op', str(args.inter_op)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    reference = runs[0]
+    report = []
+    for r in runs:
+        report.append({
+            'variant': r['variant'],
+            'seconds_per_tile': r['seconds_per_tile'],
+            'speedup': round(reference['seconds_per_tile'] / r['seconds_per_tile'], 2),
+            **parity(reference['words'], r['words']),
+        })
+
+    print(f"{'variant':<11}{'s/tile':>9}{'speedup':>9}{'words':>7}{'matched':>9}{'max box delta':>15}")
+    for r in report:
+        print(f"{r['variant']:<11}{r['seconds_per_tile']:>9.3f}{r['speedup']:>9.2f}{r['reference_words']:>7}"
+              f"{r['match_rate']:>9.2%}{r['max_box_delta']:>15.4f}")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Peak memory and throughput of the CPU side of the pipeline, RGB vs grayscale mode
+
+A large sheet is built by resizing data/original.png (so the recorded words in
+data/final.csv still line up), then each mode runs in its own process:
+  - page array creation (what pdf2image hands over after rasterization)
+  - crop_tiles + per-batch OCR input preparation (channel replication for gray)
+  - extract_tendons with the recorded words
+  - PNG encoding of the annotated output
+
+Model inference is not included.
+
+Usage:
+    python benchmarks/grayscale_mode.py
+    python benchmarks/grayscale_mode.py --width-in 48 --height-in 36 --dpi 300
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        # Windows: no lifetime peak, current RSS instead
+        from memory import rss_bytes, to_mb
+        return to_mb(rss_bytes())
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def make_sheet(width, height, grayscale):
+    import cv2
+
+    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    source = cv2.imread(os.path.join(ROOT, 'data', 'original.png'), flag)
+    return cv2.resize(source, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def run_mode(args):
+    import cv2
+    import pandas as pd
+    from main import crop_tiles, batched
+    from ocr.doctr import OCR
+    from test_extractor import extract_tendons
+
+    words = pd.read_csv(os.path.join(ROOT, 'data', 'final.csv'))
+    width, height = int(args.width_in * args.dpi), int(args.height_in * args.dpi)
+    baseline_mb = peak_rss_mb()
+    timings = {}
+
+    start = time.perf_counter()
+    page = make_sheet(width, height, args.mode == 'gray')
+    timings['page'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tiles = crop_tiles(page)
+    ocr_input_bytes = 0
+    for batch in batched([tile["image"] for tile in tiles], args.batch_size):
+        model_input = [OCR.to_model_input(image) for image in batch]
+        ocr_input_bytes = max(ocr_input_bytes, sum(image.nbytes for image in model_input))
+    timings['tiles'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vis, _ = extract_tendons(words, page)
+    timings['extract_tendons'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ok, encoded = cv2.imencode('.png', vis)
+    timings['encode'] = time.perf_counter() - start
+
+    total = sum(timings.values())
+    return {
+        'mode': args.mode,
+        'sheet': f'{width}x{height}',
+        'page_mb': page.nbytes / 1e6,
+        'vis_mb': vis.nbytes / 1e6,
+        'max_batch_ocr_input_mb': ocr_input_bytes / 1e6,
+        'baseline_rss_mb': baseline_mb,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_over_baseline_mb': peak_rss_mb() - baseline_mb,
+        'seconds': {k: round(v, 3) for k, v in timings.items()},
+        'total_seconds': round(total, 3),
+        'megapixels_per_second': round(width * height / 1e6 / total, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width-in', type=float, default=48)
+    parser.add_argument('--height-in', type=float, default=36)
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=24)
+    parser.add_argument('--mode', choices=['rgb', 'gray'], help='run a single mode in this process')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    results = []
+    for mode in ('rgb', 'gray'):
+        cmd = [sys.executable, os.path.abspath(__file__), '--mode', mode,
+               '--width-in', str(args.width_in), '--height-in', str(args.height_in),
+               '--dpi', str(args.dpi), '--batch-size', str(args.batch_size)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6}{'sheet':>14}{'page MB':>10}{'peak RSS MB':>13}{'over base MB':>14}{'total s':>9}{'MP/s':>8}")
+    for r in results:
+        print(f"{r['mode']:<6}{r['sheet']:>14}{r['page_mb']:>10.1f}{r['peak_rss_mb']:>13.1f}"
+              f"{r['peak_rss_over_baseline_mb']:>14.1f}{r['total_seconds']:>9.2f}{r['megapixels_per_second']:>8.2f}")
+    for r in results:
+        print(f"{r['mode']}: {r['seconds']}")
+
+
+if __name__ == '__main__':
+    main()
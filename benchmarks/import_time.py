@@ -0,0 +1,84 @@
+"""
+Import-time budget for server.py
+
+Imports server in fresh interpreters and fails (exit status 1) when the
+median import time exceeds the budget, or when a heavy module that the
+model loader is meant to import in the background got imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 0.8 --runs 5
+    python benchmarks/import_time.py --show 15    # slowest imports (python -X importtime)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by `import server`
+HEAVY_MODULES = ('torch', 'doctr', 'cv2', 'pandas', 'pdf2image', 'main', 'test_extractor')
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure(runs):
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def slowest_imports(count):
+    """Top cumulative import times reported by python -X importtime"""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import server'],
+                         cwd=ROOT, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=1.0, help='maximum median import time in seconds')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--show', type=int, default=0, help='print the N slowest imports')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    median = statistics.median(r['seconds'] for r in results)
+    heavy = sorted({m for r in results for m in r['heavy']})
+    print(f"import server: median {median:.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+
+    if args.show:
+        for cumulative, name in slowest_imports(args.show):
+            print(f"{cumulative / 1e6:>8.3f}s  {name}")
+
+    failed = False
+    if median > args.budget:
+        print(f"FAIL: import time {median:.3f}s exceeds the {args.budget:.3f}s budget")
+        failed = True
+    if heavy:
+        print(f"FAIL: imported eagerly: {', '.join(heavy)} (should load in model_loader)")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Line detection on page pyramid levels vs full resolution
+
+For each sheet, runs the line stage of extract_tendons (threshold_lines +
+detect_lines_global + merge_lines) at level 0 and at each --levels level,
+and reports the time and how well the level's lines match the full-
+resolution lines: a line matches when a line of the same orientation lies
+within --tolerance px across it and covers at least --min-overlap of its
+length. With --words (tile_ocr output for the sheet, e.g. data/final.csv
+for data/original.png) extract_tendons runs end to end at every level and
+the callouts whose line changed are counted.
+
+Exits with status 1 when a level's recall of the full-resolution lines is
+below --min-recall or a callout line changed.
+
+Usage:
+    python benchmarks/line_pyramid.py
+    python benchmarks/line_pyramid.py --levels 1 2 --images data/original.png other.png
+    python benchmarks/line_pyramid.py --words '' --save lines.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ocr.line_detector import detect_lines_global, is_horizontal, merge_lines
+from test_extractor import extract_tendons, line_level_shape, threshold_lines
+
+
+def detect(image, level):
+    start = time.perf_counter()
+    erode = threshold_lines(image, np.empty(line_level_shape(image, level), np.uint8), level=level)
+    lines = merge_lines(detect_lines_global(erode, level=level))
+    return lines, time.perf_counter() - start
+
+
+def matches(line, other, tolerance, min_overlap):
+    if is_horizontal(line) != is_horizontal(other):
+        return False
+    if is_horizontal(line):
+        across, (a1, a2), (b1, b2) = abs(line[1] - other[1]), sorted((line[0], line[2])), sorted((other[0], other[2]))
+    else:
+        across, (a1, a2), (b1, b2) = abs(line[0] - other[0]), sorted((line[1], line[3])), sorted((other[1], other[3]))
+    covered = min(a2, b2) - max(a1, b1)
+    return across <= tolerance and covered >= min_overlap * max(a2 - a1, 1)
+
+
+def recall(reference, lines, tolerance, min_overlap):
+    found = sum(any(matches(r, line, tolerance, min_overlap) for line in lines) for r in reference)
+    return round(found / len(reference), 4) if reference else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='+', default=[os.path.join(ROOT, 'data', 'original.png')])
+    parser.add_argument('--words', default=os.path.join(ROOT, 'data', 'final.csv'),
+                        help="word table of the first image for the end-to-end check ('' to skip)")
+    parser.add_argument('--levels', nargs='+', type=int, default=[1, 2])
+    parser.add_argument('--tolerance', type=float, default=8, help='px across the line (full resolution)')
+    parser.add_argument('--min-overlap', type=float, default=0.8)
+    parser.add_argument('--min-recall', type=float, default=0.95)
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    # find_template_and_match loads img_templates/ relative to the working directory
+    os.chdir(ROOT)
+    report = []
+    failed = False
+    for path in args.images:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise SystemExit(f"Cannot read {path}")
+        reference, reference_seconds = detect(image, 0)
+        sheet = {'image': path, 'lines': len(reference), 'seconds': round(reference_seconds, 3), 'levels': {}}
+        for level in args.levels:
+            lines, seconds = detect(image, level)
+            result = {
+                'lines': len(lines),
+                'seconds': round(seconds, 3),
+                'speedup': round(reference_seconds / seconds, 2),
+                'recall': recall(reference, lines, args.tolerance, args.min_overlap),
+                'precision': recall(lines, reference, args.tolerance, args.min_overlap),
+            }
+            failed |= result['recall'] < args.min_recall
+            sheet['levels'][level] = result
+        report.append(sheet)
+
+    if args.words:
+        import pandas as pd
+
+        image = cv2.imread(args.images[0])
+        words = pd.read_csv(args.words, keep_default_na=False, dtype={'value': str})
+        _, reference = extract_tendons(words.copy(), image, line_level=0)
+        callouts = {'callouts': len(reference), 'lines_found': sum(r['line'] is not None for r in reference), 'levels': {}}
+        for level in args.levels:
+            _, records = extract_tendons(words.copy(), image, line_level=level)
+            changed = sum(
+                (r['line'] is None) != (o['line'] is None)
+                or (r['line'] is not None and not matches(r['line'], o['line'], args.tolerance, args.min_overlap))
+                for r, o in zip(reference, records)
+            )
+            callouts['levels'][level] = {'lines_found': sum(r['line'] is not None for r in records), 'changed': changed}
+            failed |= changed > 0
+        report.append(callouts)
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print("FAIL: a level lost full-resolution lines or changed a callout line")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Micro-benchmarks of the CPU-side hot functions
+
+Cases run on data/original.png and the recorded OCR words in data/final.csv.
+Synthetic generators scale the inputs:
+  --sheet-scale K   tile the page KxK (crop_tiles, detect_lines_global)
+  --word-scale K    repeat the words on a KxK grid of sheets (get_tendons);
+                    deduplicate_ocr also gets one overlapping duplicate per
+                    word, as neighbouring OCR tiles produce
+  --lines N         N random axis-aligned segments instead of the lines
+                    detected on the page (merge_lines, detect_line_ending_in_bbox)
+
+Each case is timed --repeat times after one warm-up run (fast cases loop
+inside a sample); the median per-call time is the figure that is compared.
+
+Usage:
+    python benchmarks/micro.py --save before.json
+    python benchmarks/micro.py --compare before.json --threshold 0.15
+    python benchmarks/micro.py --only merge_lines --lines 20000
+
+With --compare the script exits with status 1 when a case's median is slower
+than the baseline by more than the threshold (a fraction, 0.15 = 15%).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import crop_tiles, deduplicate_ocr
+from ocr.extractor import TextExtractor
+from ocr.line_detector import detect_lines_global, merge_lines, find_template_and_match, detect_line_ending_in_bbox
+from test_extractor import threshold_lines
+
+CASES = {}
+
+
+def case(name):
+    """Register a case: a setup function taking Fixtures and returning the callable to time"""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def synthetic_sheet(page, scale):
+    """Tile the page scale x scale"""
+    if scale == 1:
+        return page
+    return np.tile(page, (scale, scale, 1))
+
+
+def synthetic_words(words, scale):
+    """Repeat the words on a scale x scale grid of sheets, coordinates kept normalized"""
+    if scale == 1:
+        return words.copy()
+    copies = []
+    for row in range(scale):
+        for col in range(scale):
+            copy = words.copy()
+            copy[['x1', 'x2']] = (copy[['x1', 'x2']] + col) / scale
+            copy[['y1', 'y2']] = (copy[['y1', 'y2']] + row) / scale
+            copies.append(copy)
+    result = pd.concat(copies, ignore_index=True)
+    result['word_idx'] = range(len(result))
+    return result
+
+
+def with_overlap_duplicates(words, rng, jitter=0.0005):
+    """Add a slightly shifted, lower-confidence copy of every word"""
+    duplicates = words.copy()
+    for column in ('x1', 'y1', 'x2', 'y2'):
+        duplicates[column] += rng.uniform(-jitter, jitter, len(duplicates))
+    duplicates['confidence'] *= 0.95
+    return pd.concat([words, duplicates], ignore_index=True)
+
+
+def synthetic_lines(count, width, height, rng):
+    """Random horizontal and vertical segments, in the (x1, y1, x2, y2) form detect_lines_global returns"""
+    lines = []
+    for _ in range(count):
+        length = int(rng.integers(100, 1500))
+        if rng.random() < 0.5:
+            x, y = int(rng.integers(0, width - length)), int(rng.integers(0, height))
+            lines.append((x, y, x + length, y))
+        else:
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height - length))
+            lines.append((x, y, x, y + length))
+    return lines
+
+
+def indicator_boxes(words, width, height):
+    """Pixel bboxes of the TENDON callouts and the search window extract_tendons crops around them"""
+    boxes = []
+    for tendon in TextExtractor(words.copy()).get_tendons():
+        x1, y1 = int(tendon.x1.min() * width), int(tendon.y1.min() * height)
+        x2, y2 = int(tendon.x2.max() * width), int(tendon.y2.max() * height)
+        w, h = x2 - x1, y2 - y1
+        boxes.append(((x1, y1, x2, y2), (x1 - w, y1 - h, x2 + w, y2 + int(h * 2.5))))
+    return boxes
+
+
+class Fixtures:
+    """Inputs shared between cases, built once on first use"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.page = cv2.imread(os.path.join(ROOT, 'data', 'original.png'), cv2.IMREAD_COLOR)
+        # OCR values such as "NA" are words here, not missing data
+        self.words = pd.read_csv(os.path.join(ROOT, 'data', 'final.csv'), keep_default_na=False, dtype={'value': str})
+        self._cache = {}
+
+    def get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def sheet(self):
+        return self.get('sheet', lambda: synthetic_sheet(self.page, self.args.sheet_scale))
+
+    @property
+    def sheet_lines(self):
+        return self.get('sheet_lines', lambda: threshold_lines(self.sheet, np.empty(self.sheet.shape[:2], np.uint8)))
+
+    @property
+    def scaled_words(self):
+        return self.get('scaled_words', lambda: synthetic_words(self.words, self.args.word_scale))
+
+    @property
+    def raw_lines(self):
+        def build():
+            if self.args.lines:
+                height, width = self.page.shape[:2]
+                return synthetic_lines(self.args.lines, width, height, self.rng)
+            return detect_lines_global(threshold_lines(self.page, np.empty(self.page.shape[:2], np.uint8)))
+        return self.get('raw_lines', build)
+
+    @property
+    def boxes(self):
+        height, width = self.page.shape[:2]
+        return self.get('boxes', lambda: indicator_boxes(self.words, width, height))
+
+
+@case('crop_tiles')
+def bench_crop_tiles(fx):
+    sheet = fx.sheet
+    return lambda: crop_tiles(sheet)
+
+
+@case('deduplicate_ocr')
+def bench_deduplicate_ocr(fx):
+    words = with_overlap_duplicates(fx.scaled_words, fx.rng)
+    return lambda: deduplicate_ocr(words, iou_thresh=0.6)
+
+
+@case('detect_lines_global')
+def bench_detect_lines_global(fx):
+    lines_image = fx.sheet_lines
+    return lambda: detect_lines_global(lines_image)
+
+
+@case('merge_lines')
+def bench_merge_lines(fx):
+    raw_lines = fx.raw_lines
+    return lambda: merge_lines(raw_lines)
+
+
+@case('detect_line_ending_in_bbox')
+def bench_detect_line_ending_in_bbox(fx):
+    final_lines = merge_lines(fx.raw_lines)
+    boxes = [indicator for indicator, _ in fx.boxes]
+
+    def run():
+        for box in boxes:
+            detect_line_ending_in_bbox(final_lines, box)
+    return run
+
+
+@case('find_template_and_match')
+def bench_find_template_and_match(fx):
+    crops = []
+    for _, (xe1, ye1, xe2, ye2) in fx.boxes[:fx.args.template_crops]:
+        crop = fx.page[ye1:ye2, xe1:xe2]
+        if crop.shape[0] > 0 and crop.shape[1] > 0:
+            crops.append(crop)
+
+    def run():
+        for crop in crops:
+            find_template_and_match(crop)
+    return run
+
+
+@case('get_tendons')
+def bench_get_tendons(fx):
+    words = fx.scaled_words
+    # TextExtractor fills NaNs in place, so every run gets its own copy
+    return lambda: TextExtractor(words.copy()).get_tendons()
+
+
+def time_case(fn, repeat, min_sample_seconds=0.05):
+    """
+    Median per-call time. Fast cases are called several times per sample so
+    a sample is never shorter than min_sample_seconds.
+    """
+    start = time.perf_counter()
+    fn()  # warm-up: template/model caches, lazy imports
+    elapsed = time.perf_counter() - start
+    number = max(1, int(min_sample_seconds / elapsed)) if elapsed > 0 else 1000
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'median_seconds': statistics.median(samples),
+        'min_seconds': min(samples),
+        'max_seconds': max(samples),
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table, return the names of the cases that regressed"""
+    if baseline['params'] != results['params']:
+        print(f"warning: baseline was run with {baseline['params']}, now {results['params']}")
+
+    regressed = []
+    print(f"{'case':<28}{'baseline s':>12}{'current s':>12}{'change':>9}")
+    for name, current in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{current['median_seconds']:>12.6f}{'new':>9}")
+            continue
+        change = current['median_seconds'] / base['median_seconds'] - 1
+        flag = ''
+        if change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSED'
+        print(f"{name:<28}{base['median_seconds']:>12.6f}{current['median_seconds']:>12.6f}{change:>+9.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='run only these cases')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sheet-scale', type=int, default=1)
+    parser.add_argument('--word-scale', type=int, default=1)
+    parser.add_argument('--lines', type=int, default=0, help='synthetic line count (0 = lines detected on the page)')
+    parser.add_argument('--template-crops', type=int, default=5, help='tendon crops per find_template_and_match run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='allowed slowdown of a case median before --compare fails')
+    args = parser.parse_args()
+
+    # find_template_and_match loads img_templates/ relative to the working directory
+    os.chdir(ROOT)
+    fixtures = Fixtures(args)
+    names = args.only or list(CASES)
+
+    results = {
+        'params': {
+            'sheet_scale': args.sheet_scale,
+            'word_scale': args.word_scale,
+            'lines': args.lines,
+            'template_crops': args.template_crops,
+            'seed': args.seed,
+        },
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'cases': {},
+    }
+    for name in names:
+        fn = CASES[name](fixtures)
+        results['cases'][name] = time_case(fn, args.repeat)
+        r = results['cases'][name]
+        print(f"{name:<28}median {r['median_seconds']:.6f}s  min {r['min_seconds']:.6f}s  max {r['max_seconds']:.6f}s")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
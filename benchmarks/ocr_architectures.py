@@ -0,0 +1,149 @@
+"""
+Accuracy vs throughput of OCR architecture pairs on a sheet
+
+Every detection + recognition pair runs tile_ocr over the whole sheet in its
+own process (so peak RSS is per pair). The first pair is the reference
+(config.OCR_DET_ARCH + OCR_RECO_ARCH unless --pairs says otherwise), and the
+words get_tendons builds callouts from (TENDON, BANDED and the "(n)"
+indicator of every callout it finds) are looked up in each pair's output
+by text and page-normalized box.
+
+Reported per pair: tiles/second (model load and warm-up excluded), model load
+time, peak RSS, words, callouts found, and the recall of the reference
+callout words.
+
+Usage:
+    python benchmarks/ocr_architectures.py
+    python benchmarks/ocr_architectures.py --pairs db_resnet50:crnn_vgg16_bn db_mobilenet_v3_large:crnn_mobilenet_v3_small
+    python benchmarks/ocr_architectures.py --image data/original.png --batch-size 8 --save archs.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import config
+from benchmarks.ocr_compare import BOX_COLUMNS, compare
+
+DEFAULT_PAIRS = [
+    f'{config.OCR_DET_ARCH}:{config.OCR_RECO_ARCH}',
+    'db_mobilenet_v3_large:crnn_vgg16_bn',
+    'db_resnet50:crnn_mobilenet_v3_small',
+    'db_mobilenet_v3_large:crnn_mobilenet_v3_small',
+    'db_mobilenet_v3_large:crnn_mobilenet_v3_large',
+]
+
+
+def peak_rss_mb():
+    if resource is None:
+        # Windows: no lifetime peak, current RSS instead
+        from memory import rss_bytes, to_mb
+        return to_mb(rss_bytes())
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def batch_size_arg(value):
+    return value if value == 'auto' else int(value)
+
+
+def run_pair(args):
+    import cv2
+    from main import tile_ocr
+    from model_loader import warm_up
+    from ocr.backends import get_ocr
+    from ocr.extractor import TextExtractor
+
+    det_arch, reco_arch = args.pair.split(':')
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Cannot read {args.image}")
+
+    start = time.perf_counter()
+    ocr = get_ocr(gpu=False, det_arch=det_arch, reco_arch=reco_arch)
+    load_seconds = time.perf_counter() - start
+    warm_up(ocr)
+
+    stats = {}
+    start = time.perf_counter()
+    words = tile_ocr(image, gpu=False, batch_size=args.batch_size, stats=stats, det_arch=det_arch, reco_arch=reco_arch)
+    seconds = time.perf_counter() - start
+
+    tendons = TextExtractor(words).get_tendons()
+    return {
+        'pair': args.pair,
+        'tiles': stats['tiles'],
+        'tiles_per_second': round(stats['tiles'] / seconds, 3),
+        'load_seconds': round(load_seconds, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'words': stats['words'],
+        'callouts': len(tendons),
+        # Every word of every callout, as (value, page-normalized box)
+        'callout_words': [
+            (row.value, [getattr(row, c) for c in BOX_COLUMNS])
+            for tendon in tendons for row in tendon.itertuples()
+        ],
+        'all_words': [(row.value, [getattr(row, c) for c in BOX_COLUMNS]) for row in words.itertuples()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=os.path.join(ROOT, 'data', 'original.png'))
+    parser.add_argument('--pairs', nargs='+', default=DEFAULT_PAIRS, metavar='DET:RECO')
+    parser.add_argument('--batch-size', type=batch_size_arg, default=config.OCR_BATCH_SIZE, help="tiles per batch or 'auto'")
+    parser.add_argument('--max-box-delta', type=float, default=0.002,
+                        help='largest page-normalized box shift of a recalled word')
+    parser.add_argument('--pair', help='run a single pair in this process')
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    if args.pair:
+        print(json.dumps(run_pair(args)))
+        return
+
+    for pair in args.pairs:
+        det_arch, _, reco_arch = pair.partition(':')
+        if det_arch not in config.OCR_DET_ARCHS or reco_arch not in config.OCR_RECO_ARCHS:
+            raise SystemExit(f"Unknown pair {pair}: use DET:RECO from config.OCR_DET_ARCHS / OCR_RECO_ARCHS")
+
+    runs = []
+    for pair in args.pairs:
+        cmd = [sys.executable, os.path.abspath(__file__), '--pair', pair,
+               '--image', args.image, '--batch-size', str(args.batch_size)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    reference = runs[0]['callout_words']
+    report = []
+    for r in runs:
+        matched, _, _ = compare(reference, r.pop('all_words'), max_delta=args.max_box_delta)
+        r.pop('callout_words')
+        r['callout_word_recall'] = round(matched / len(reference), 4) if reference else 1.0
+        report.append(r)
+
+    print(f"Reference: {runs[0]['pair']} ({len(reference)} callout words in {runs[0]['callouts']} callouts)")
+    print(f"{'pair':<48}{'tiles/s':>9}{'load s':>8}{'peak MB':>9}{'words':>7}{'callouts':>10}{'recall':>9}")
+    for r in report:
+        print(f"{r['pair']:<48}{r['tiles_per_second']:>9.2f}{r['load_seconds']:>8.1f}{r['peak_rss_mb']:>9.0f}"
+              f"{r['words']:>7}{r['callouts']:>10}{r['callout_word_recall']:>9.2%}")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Shared helpers of the OCR benchmarks: a fixed tile set, timed batched runs
+and word/box parity of one OCR variant against a reference run.
+"""
+import time
+
+from main import crop_tiles
+
+BOX_COLUMNS = ['x1', 'y1', 'x2', 'y2']
+
+
+def sample_tiles(image, count):
+    """`count` tiles spread evenly over the sheet (skipping partial edge tiles)"""
+    tiles = [t for t in crop_tiles(image) if t['image'].shape[:2] == (1000, 1000)]
+    step = max(1, len(tiles) // count)
+    return [t['image'] for t in tiles[::step][:count]]
+
+
+def run(ocr, tiles, batch_size):
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(tiles), batch_size):
+        results.extend(ocr.from_image(tiles[i:i + batch_size]))
+    return results, time.perf_counter() - start
+
+
+def words(df):
+    if df is None:
+        return []
+    return [(row.value, [getattr(row, c) for c in BOX_COLUMNS]) for row in df.itertuples()]
+
+
+def box_delta(a, b):
+    return max(abs(p - q) for p, q in zip(a, b))
+
+
+def compare(reference, candidate, max_delta=None):
+    """
+    Greedy match of each reference word to the closest unused candidate word
+    with the same text (only within `max_delta` of its box, if given)
+    """
+    matched, deltas, unused = 0, [], list(candidate)
+    for value, box in reference:
+        same = [w for w in unused if w[0] == value and (max_delta is None or box_delta(box, w[1]) <= max_delta)]
+        if not same:
+            continue
+        best = min(same, key=lambda w: box_delta(box, w[1]))
+        unused.remove(best)
+        matched += 1
+        deltas.append(box_delta(box, best[1]))
+    return matched, deltas, len(unused)
+
+
+def parity(reference_words, candidate_words):
+    """Word match rate and largest box shift of a run against a reference run (per-tile words() lists)"""
+    total = matched = extra = 0
+    deltas = []
+    for reference, candidate in zip(reference_words, candidate_words):
+        tile_matched, tile_deltas, tile_extra = compare(reference, candidate)
+        total += len(reference)
+        matched += tile_matched
+        extra += tile_extra
+        deltas.extend(tile_deltas)
+    return {
+        'reference_words': total,
+        'matched_words': matched,
+        'match_rate': round(matched / total, 4) if total else 1.0,
+        'extra_words': extra,
+        'max_box_delta': round(max(deltas, default=0.0), 5),
+    }
@@ -0,0 +1,88 @@
+"""
+Parity of the onnx OCR backend with the torch (doctr) backend
+
+Runs both backends on the same tiles of a sheet and matches their words by
+text and box. Exits with status 1 when fewer than --min-match of the torch
+words have an identical word in the onnx output, or when a matched box moved
+by more than --max-box-delta (tile-normalized coordinates). Also prints the
+time per tile of each backend.
+
+Usage:
+    python benchmarks/onnx_parity.py
+    python benchmarks/onnx_parity.py --image data/original.png --tiles 12
+    python benchmarks/onnx_parity.py --threads 4 --save parity.json
+
+The first run exports the models to ONNX_CACHE_DIR. Needs torch, onnx and
+onnxruntime.
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.ocr_compare import parity, run, sample_tiles, words
+from ocr.doctr import OCR
+from ocr.onnx_backend import OnnxOCR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=os.path.join(ROOT, 'data', 'original.png'))
+    parser.add_argument('--tiles', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime intra-op threads (default: ONNX_THREADS)')
+    parser.add_argument('--min-match', type=float, default=0.98, help='minimum fraction of torch words found by onnx')
+    parser.add_argument('--max-box-delta', type=float, default=0.01)
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Cannot read {args.image}")
+    tiles = sample_tiles(image, args.tiles)
+
+    torch_ocr = OCR(gpu=False)
+    onnx_ocr = OnnxOCR(threads=args.threads)
+    # Warm up both so first-call allocations are not timed
+    run(torch_ocr, tiles[:1], 1)
+    run(onnx_ocr, tiles[:1], 1)
+
+    torch_results, torch_seconds = run(torch_ocr, tiles, args.batch_size)
+    onnx_results, onnx_seconds = run(onnx_ocr, tiles, args.batch_size)
+
+    summary = parity([words(r) for r in torch_results], [words(r) for r in onnx_results])
+    report = {
+        'tiles': len(tiles),
+        'torch_words': summary['reference_words'],
+        'matched_words': summary['matched_words'],
+        'match_rate': summary['match_rate'],
+        'extra_onnx_words': summary['extra_words'],
+        'max_box_delta': summary['max_box_delta'],
+        'torch_seconds_per_tile': round(torch_seconds / len(tiles), 4),
+        'onnx_seconds_per_tile': round(onnx_seconds / len(tiles), 4),
+        'onnx_models': onnx_ocr.paths,
+    }
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report['match_rate'] < args.min_match:
+        print(f"FAIL: {report['match_rate']:.2%} of the torch words matched (minimum {args.min_match:.2%})")
+        failed = True
+    if report['max_box_delta'] > args.max_box_delta:
+        print(f"FAIL: boxes moved by up to {report['max_box_delta']} (maximum {args.max_box_delta})")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Tile-free (page) OCR mode vs tiled OCR on a sheet
+
+Runs tile_ocr and page_ocr on the same sheet with the same model and
+reports, per mode: seconds (after a warm-up), pixels fed to the detector,
+words and TENDON callouts found. The recall of the page mode is measured
+against the tiled words, for all words and for the words get_tendons
+builds callouts from, by text and page-normalized box. Exits with status 1
+when the callout word recall is below --min-recall.
+
+Usage:
+    python benchmarks/page_ocr.py
+    python benchmarks/page_ocr.py --scale 0.6 --window 1024 --overlap 256
+    python benchmarks/page_ocr.py --image data/original.png --save page_ocr.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from benchmarks.ocr_compare import BOX_COLUMNS, compare
+from main import crop_tiles, page_ocr, tile_ocr
+from model_loader import warm_up
+from ocr.backends import get_ocr
+from ocr.extractor import TextExtractor
+
+
+def page_words(df):
+    return [(row.value, [getattr(row, c) for c in BOX_COLUMNS]) for row in df.itertuples()]
+
+
+def run_mode(ocr_page, image, batch_size):
+    stats = {}
+    start = time.perf_counter()
+    words = ocr_page(image, gpu=False, batch_size=batch_size, stats=stats)
+    seconds = time.perf_counter() - start
+    tendons = TextExtractor(words.copy()).get_tendons()
+    callout_words = [
+        (row.value, [getattr(row, c) for c in BOX_COLUMNS])
+        for tendon in tendons for row in tendon.itertuples()
+    ]
+    return {'seconds': round(seconds, 2), 'stats': stats, 'callouts': len(tendons)}, page_words(words), callout_words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=os.path.join(ROOT, 'data', 'original.png'))
+    parser.add_argument('--batch-size', default=config.OCR_BATCH_SIZE, type=lambda v: v if v == 'auto' else int(v))
+    parser.add_argument('--scale', type=float, default=config.OCR_PAGE_DETECTION_SCALE)
+    parser.add_argument('--window', type=int, default=config.OCR_DETECTION_WINDOW)
+    parser.add_argument('--overlap', type=int, default=config.OCR_DETECTION_OVERLAP)
+    parser.add_argument('--max-box-delta', type=float, default=0.002,
+                        help='largest page-normalized box shift of a recalled word')
+    parser.add_argument('--min-recall', type=float, default=1.0, help='minimum callout word recall')
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    config.OCR_PAGE_DETECTION_SCALE = args.scale
+    config.OCR_DETECTION_WINDOW = args.window
+    config.OCR_DETECTION_OVERLAP = args.overlap
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Cannot read {args.image}")
+    warm_up(get_ocr(gpu=False))
+
+    tiles, tile_words, tile_callouts = run_mode(tile_ocr, image, args.batch_size)
+    page, words, _ = run_mode(page_ocr, image, args.batch_size)
+
+    height, width = image.shape[:2]
+    small = (round(height * args.scale), round(width * args.scale))
+    tiles['detector_megapixels'] = round(sum(t['image'].size for t in crop_tiles(image[:, :, 0])) / 1e6, 1)
+    page['detector_megapixels'] = round(sum(
+        t['image'].size for t in crop_tiles(image[:small[0], :small[1], 0], tile_size=args.window, overlap=args.overlap)
+    ) / 1e6, 1)
+
+    matched, _, _ = compare(tile_words, words, max_delta=args.max_box_delta)
+    page['word_recall'] = round(matched / len(tile_words), 4) if tile_words else 1.0
+    matched, _, _ = compare(tile_callouts, words, max_delta=args.max_box_delta)
+    page['callout_word_recall'] = round(matched / len(tile_callouts), 4) if tile_callouts else 1.0
+
+    report = {'tiles': tiles, 'page': page}
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if page['callout_word_recall'] < args.min_recall:
+        print(f"FAIL: page mode recalled {page['callout_word_recall']:.2%} of the callout words "
+              f"(minimum {args.min_recall:.2%})")
+        sys.exit(1)
+    print(f"OK: {tiles['seconds'] / max(page['seconds'], 1e-9):.2f}x faster")
+
+
+if __name__ == '__main__':
+    main()
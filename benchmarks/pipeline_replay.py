@@ -0,0 +1,102 @@
+"""
+Offline end-to-end timing of the pipeline with the replay OCR backend
+
+Runs the real main.main() or server.process_pdf() flow on a PDF, with
+tile_ocr answered by ocr.replay.ReplayOCR (recorded words, optional synthetic
+latency per tile) instead of the doctr models. No model weights or network
+are needed; everything except model inference is measured.
+
+Usage:
+    python benchmarks/pipeline_replay.py
+    python benchmarks/pipeline_replay.py --flow server --latency 0.05
+    python benchmarks/pipeline_replay.py --pdf data/plan.pdf --words data/final.csv --save replay.json
+
+Rasterization needs poppler (pdftoppm / pdfinfo), as in production. The
+server flow imports server.py and therefore torch.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from metrics import StageTimings, collect
+
+
+def run_main_flow(pdf, output_dir):
+    import main
+
+    config.INPUT_PDF_PATH = pdf
+    config.OUTPUT_DIR = output_dir
+    config.AUTO_OPEN_RESULT = False
+    main.main()
+
+
+def run_server_flow(pdf, output_dir):
+    import server
+
+    server.OUTPUT_FOLDER = output_dir
+    job_id = str(uuid.uuid4())
+    server.jobs[job_id] = {
+        'status': 'queued', 'message': '', 'progress': 0,
+        'total_pages': 0, 'current_page': 0, 'results': [], 'metrics': None,
+    }
+    server.process_pdf(job_id, pdf)
+    job = server.jobs[job_id]
+    if job['status'] != 'completed':
+        raise SystemExit(f"process_pdf failed: {job['message']}")
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flow', choices=['main', 'server'], default='main')
+    parser.add_argument('--pdf', default=os.path.join(ROOT, 'data', 'plan.pdf'))
+    parser.add_argument('--words', default=os.path.join(ROOT, 'data', 'final.csv'), help='recorded word table to replay')
+    parser.add_argument('--latency', type=float, default=0.0, help='synthetic OCR seconds per tile')
+    parser.add_argument('--save', help='write the timings to this JSON file')
+    args = parser.parse_args()
+
+    config.OCR_BACKEND = 'replay'
+    config.OCR_REPLAY_PATH = os.path.abspath(args.words)
+    config.OCR_REPLAY_LATENCY = args.latency
+    pdf = os.path.abspath(args.pdf)
+    # find_template_and_match loads img_templates/ relative to the working directory
+    os.chdir(ROOT)
+
+    timings = StageTimings()
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        if args.flow == 'server':
+            # process_pdf collects its own per-job timings
+            job = run_server_flow(pdf, output_dir)
+            summary = job['metrics']
+        else:
+            with collect(timings):
+                run_main_flow(pdf, output_dir)
+            summary = timings.to_dict()
+        total = time.perf_counter() - start
+
+    print(f"\n{args.flow} flow on {os.path.basename(pdf)}: {total:.2f}s total "
+          f"(replay latency {args.latency}s/tile)")
+    print(f"{'stage':<22}{'count':>7}{'total s':>10}{'max s':>9}")
+    for name, s in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+        print(f"{name:<22}{s['count']:>7}{s['total_seconds']:>10.3f}{s['max_seconds']:>9.3f}")
+    if summary['counts']:
+        print(f"counts: {summary['counts']}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'flow': args.flow, 'pdf': pdf, 'latency': args.latency,
+                       'total_seconds': round(total, 3), **summary}, f, indent=2)
+        print(f"Saved timings to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+PDF text layer vs OCR on the pages of a plan set
+
+For every page: seconds of the text layer (pdftotext -bbox) and of run_ocr
+on the rasterized page (after a warm-up), words and TENDON callouts found by
+each, whether the text layer would be used or fall back to OCR, and the
+recall of the OCR callout words in the text layer words (by text and
+page-normalized box). Exits with status 1 when a page that would use its
+text layer recalls fewer callout words than --min-recall. With
+--record-baseline, the OCR timings are added to the stored baseline
+(OCR_BASELINE_FILE) the server estimates the OCR time saved from.
+
+Usage:
+    python benchmarks/text_layer.py
+    python benchmarks/text_layer.py --pdf plans.pdf --pages 0 3 --save text_layer.json
+    python benchmarks/text_layer.py --pdf plans.pdf --record-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from benchmarks.ocr_compare import BOX_COLUMNS, compare
+from main import run_ocr
+from model_loader import warm_up
+from ocr.backends import architectures, get_ocr
+from ocr.extractor import TextExtractor
+from text_layer import baseline_key, parse_bbox, record_ocr, run_pdftotext, usable
+
+
+def callout_words(words):
+    tendons = TextExtractor(words.copy()).get_tendons()
+    return len(tendons), [
+        (row.value, [getattr(row, c) for c in BOX_COLUMNS])
+        for tendon in tendons for row in tendon.itertuples()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdf', default=os.path.join(ROOT, 'data', 'plan.pdf'))
+    parser.add_argument('--pages', type=int, nargs='*', help='0-based pages (default: all)')
+    parser.add_argument('--dpi', type=int, default=config.PDF_DPI)
+    parser.add_argument('--max-box-delta', type=float, default=0.005,
+                        help='largest page-normalized box shift of a recalled word (font boxes are taller than OCR boxes)')
+    parser.add_argument('--min-recall', type=float, default=1.0, help='minimum callout word recall of used text layers')
+    parser.add_argument('--save', help='write the report as JSON')
+    parser.add_argument('--record-baseline', action='store_true',
+                        help='add the OCR timings (CPU) to the stored OCR baseline')
+    args = parser.parse_args()
+
+    pages = args.pages if args.pages else range(pdfinfo_from_path(args.pdf)['Pages'])
+    warm_up(get_ocr(gpu=False))
+
+    report, failed = [], []
+    for page in pages:
+        start = time.perf_counter()
+        words = parse_bbox(run_pdftotext(args.pdf, page))
+        text_seconds = time.perf_counter() - start
+        used, reason = usable(words)
+
+        image = np.asarray(convert_from_path(args.pdf, dpi=args.dpi, first_page=page + 1, last_page=page + 1)[0])
+        start = time.perf_counter()
+        ocr_words = run_ocr(image, gpu=False, batch_size=config.OCR_BATCH_SIZE)
+        ocr_seconds = time.perf_counter() - start
+        if args.record_baseline:
+            record_ocr(image.shape, ocr_seconds, baseline_key(*architectures(), gpu=False))
+
+        text_callouts, text_callout_words = callout_words(words) if len(words) else (0, [])
+        ocr_callouts, ocr_callout_words = callout_words(ocr_words)
+        matched, _, _ = compare(ocr_callout_words, [
+            (row.value, [getattr(row, c) for c in BOX_COLUMNS]) for row in words.itertuples()
+        ], max_delta=args.max_box_delta)
+        recall = round(matched / len(ocr_callout_words), 4) if ocr_callout_words else 1.0
+
+        report.append({
+            'page': page,
+            'text_layer': {'seconds': round(text_seconds, 3), 'words': len(words), 'callouts': text_callouts},
+            'ocr': {'seconds': round(ocr_seconds, 2), 'words': len(ocr_words), 'callouts': ocr_callouts},
+            'used': used,
+            'fallback': reason or None,
+            'callout_word_recall': recall,
+            'seconds_saved': round(ocr_seconds - text_seconds, 2) if used else 0.0,
+        })
+        if used and recall < args.min_recall:
+            failed.append(page)
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print(f"FAIL: text layer of pages {failed} recalls less than {args.min_recall:.2%} of the OCR callout words")
+        sys.exit(1)
+    print(f"OK: {sum(p['used'] for p in report)}/{len(report)} pages use the text layer, "
+          f"{sum(p['seconds_saved'] for p in report):.1f}s of OCR saved")
+
+
+if __name__ == '__main__':
+    main()
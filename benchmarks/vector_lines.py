@@ -0,0 +1,84 @@
+"""
+Vector lines from the PDF vs raster line detection on the pages of a plan set
+
+For every page: seconds of vector_lines.page_lines (pdftocairo -svg) and of
+the raster line stage of extract_tendons at full resolution, the merged line
+counts, whether the page would fall back to raster detection, and how well
+the vector lines match the raster lines (same matching as
+benchmarks/line_pyramid.py). Exits with status 1 when a page that would use
+its vector lines recalls fewer raster lines than --min-recall.
+
+Usage:
+    python benchmarks/vector_lines.py
+    python benchmarks/vector_lines.py --pdf plans.pdf --pages 0 3 --save vector_lines.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from benchmarks.line_pyramid import detect, recall
+from ocr.line_detector import merge_lines
+from vector_lines import page_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdf', default=os.path.join(ROOT, 'data', 'plan.pdf'))
+    parser.add_argument('--pages', type=int, nargs='*', help='0-based pages (default: all)')
+    parser.add_argument('--dpi', type=int, default=config.PDF_DPI)
+    parser.add_argument('--tolerance', type=float, default=8, help='px across the line')
+    parser.add_argument('--min-overlap', type=float, default=0.8)
+    parser.add_argument('--min-recall', type=float, default=0.95)
+    parser.add_argument('--save', help='write the report as JSON')
+    args = parser.parse_args()
+
+    pages = args.pages if args.pages else range(pdfinfo_from_path(args.pdf)['Pages'])
+    report, failed = [], []
+    for page in pages:
+        image = np.asarray(convert_from_path(
+            args.pdf, dpi=args.dpi, grayscale=True, first_page=page + 1, last_page=page + 1
+        )[0])
+        raster, raster_seconds = detect(image, 0)
+
+        stats = {}
+        start = time.perf_counter()
+        lines = page_lines(args.pdf, page, image.shape, stats=stats)
+        vector = merge_lines(lines) if lines is not None else []
+        vector_seconds = time.perf_counter() - start
+
+        result = {
+            'page': page,
+            'raster': {'lines': len(raster), 'seconds': round(raster_seconds, 3)},
+            'vector': {'lines': len(vector), 'seconds': round(vector_seconds, 3)},
+            'used': lines is not None,
+            'fallback': stats['vector_lines_fallback'],
+        }
+        if lines is not None:
+            result['speedup'] = round(raster_seconds / max(vector_seconds, 1e-9), 2)
+            result['recall'] = recall(raster, vector, args.tolerance, args.min_overlap)
+            result['precision'] = recall(vector, raster, args.tolerance, args.min_overlap)
+            if result['recall'] < args.min_recall:
+                failed.append(page)
+        report.append(result)
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print(f"FAIL: vector lines of pages {failed} recall less than {args.min_recall:.2%} of the raster lines")
+        sys.exit(1)
+    print(f"OK: {sum(p['used'] for p in report)}/{len(report)} pages use vector lines")
+
+
+if __name__ == '__main__':
+    main()
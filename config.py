@@ -17,10 +17,150 @@ import os
 PDF_DPI = 200
 
 # OCR batch size - number of tiles to process at once
-# Default: 24
-# Higher values = faster processing but more memory usage
-# Lower values = slower but uses less memory
-OCR_BATCH_SIZE = 24
+# Default: 'auto'
+# 'auto' picks the size from the free memory and the tile size, grows it while
+# throughput improves and halves it on out-of-memory errors (see ocr/batching.py)
+# A number fixes the size (still halved and retried on out-of-memory errors)
+OCR_BATCH_SIZE = 'auto'
+
+# Largest batch size 'auto' grows to
+OCR_MAX_BATCH_SIZE = 64
+
+# Working memory of one tile during inference, in MB per megapixel, and the
+# fraction of the free memory 'auto' may plan for
+OCR_BATCH_MEMORY_PER_MPIX = 400
+OCR_BATCH_MEMORY_FRACTION = 0.5
+
+# Grayscale processing mode
+# Default: False
+# When True, pages are rasterized as single-channel images and stay grayscale
+# through tiling, OCR input and template matching (about 1/3 of the memory of
+# RGB). Tiles are expanded to 3 channels only when handed to the OCR model, and
+# color is only created for the final annotated output image.
+GRAYSCALE_MODE = False
+
+# Pooled OCR: detect words on all tiles of a page first, then recognize the
+# word crops of the whole page together, sorted by aspect ratio, in batches of
+# OCR_RECO_BATCH_SIZE crops (doctr and onnx backends). Sparse tiles no longer
+# produce tiny recognition batches, and detection runs once per tile
+OCR_POOLED_RECOGNITION = False
+OCR_RECO_BATCH_SIZE = 256
+
+# How a page is OCRed (doctr and onnx backends)
+# 'tiles' - overlapping 1000 px tiles, detection + recognition per tile, then
+#           deduplication of the words seen by several tiles (default)
+# 'page'  - tile-free: detection on the page downscaled by
+#           OCR_PAGE_DETECTION_SCALE, in OCR_DETECTION_WINDOW windows, and
+#           recognition of the word crops cut from the full-resolution page.
+#           No tile overlap and no deduplication; check its recall on your
+#           sheets with benchmarks/page_ocr.py first
+OCR_MODE = 'tiles'
+OCR_PAGE_DETECTION_SCALE = 0.5
+# Detection window size and overlap, in downscaled pixels. Words longer than
+# the overlap can be cut at a window edge
+OCR_DETECTION_WINDOW = 1024
+OCR_DETECTION_OVERLAP = 200
+
+# Use the PDF's embedded text layer (poppler's pdftotext -bbox) instead of OCR
+# Default: False (compare with OCR on your plan sets with benchmarks/text_layer.py first)
+# Sheets exported from CAD carry their words with exact positions; such pages
+# skip OCR. A page is OCRed as usual when its layer has fewer than
+# TEXT_LAYER_MIN_WORDS words or more than TEXT_LAYER_MAX_UNMAPPED (fraction)
+# of its words have characters without a Unicode mapping
+USE_TEXT_LAYER = False
+TEXT_LAYER_MIN_WORDS = 25
+TEXT_LAYER_MAX_UNMAPPED = 0.2
+# Seconds per megapixel of OCR'd pages, per OCR configuration, kept across
+# restarts to estimate the OCR time a text-layer page saved
+OCR_BASELINE_FILE = 'cache/ocr_baseline.json'
+
+# Pyramid level of the page that tendon line detection runs on
+# 0 = full resolution (default), 1 = half, 2 = quarter
+# The lines searched for are over 100 px long at full resolution, so they
+# survive downscaling; kernels and length filters are scaled to the level and
+# line coordinates are mapped back to full resolution. Compare the levels on
+# your sheets with benchmarks/line_pyramid.py
+LINE_DETECTION_LEVEL = 0
+
+# Read tendon and grid lines from the PDF's drawing operators (poppler's
+# pdftocairo -svg) instead of detecting them in the rasterized page
+# Default: False (compare with raster detection on your plan sets with
+# benchmarks/vector_lines.py first)
+# Dark horizontal/vertical stroked segments are mapped to page pixels and
+# joined/filtered like the raster detector's lines. Scanned pages, and pages
+# with fewer than VECTOR_LINES_MIN_SEGMENTS such lines, use raster detection
+USE_VECTOR_LINES = False
+VECTOR_LINES_MIN_SEGMENTS = 10
+
+# OCR backend used by tile_ocr
+# 'doctr'  - run the doctr detection + recognition models (default)
+# 'onnx'   - the same doctr models, with detection and recognition run by
+#            ONNX Runtime on the CPU (needs the onnx and onnxruntime packages)
+# 'replay' - return the words recorded in OCR_REPLAY_PATH instead of running
+#            the models, to time the rest of the pipeline offline
+OCR_BACKEND = 'doctr'
+
+# OCR model architectures (doctr and onnx backends); a job can override them
+# with the det_arch / reco_arch upload fields
+# Lighter pairs (e.g. db_mobilenet_v3_large + crnn_mobilenet_v3_small) are much
+# faster on CPU; compare them on your sheets with benchmarks/ocr_architectures.py
+OCR_DET_ARCH = 'db_resnet50'
+OCR_RECO_ARCH = 'crnn_vgg16_bn'
+
+# Architectures accepted in config and per job (pretrained doctr models)
+OCR_DET_ARCHS = (
+    'db_resnet50', 'db_mobilenet_v3_large',
+    'linknet_resnet18', 'linknet_resnet34', 'linknet_resnet50',
+    'fast_tiny', 'fast_small', 'fast_base',
+)
+OCR_RECO_ARCHS = (
+    'crnn_vgg16_bn', 'crnn_mobilenet_v3_small', 'crnn_mobilenet_v3_large',
+    'sar_resnet31', 'master', 'vitstr_small', 'vitstr_base', 'parseq',
+)
+
+# CPU inference mode of the doctr backend (ignored when the models run on a GPU)
+# Default: False
+# When True, the torch thread pools are sized below and the models run with
+# channels-last weights and inputs; OCR_QUANTIZE adds int8 quantization
+OCR_CPU_OPTIMIZE = False
+
+# torch intra-op / inter-op threads (0 = torch default)
+OCR_INTRA_OP_THREADS = 0
+OCR_INTER_OP_THREADS = 0
+
+# int8 quantization in CPU mode
+# 'none'        - float32 models (default)
+# 'recognition' - dynamic int8 quantization of the recognition model
+# 'all'         - also static int8 quantization of the detection backbone,
+#                 calibrated on tiles of OCR_CALIBRATION_IMAGE
+# Check accuracy and speed with benchmarks/cpu_inference.py before enabling
+OCR_QUANTIZE = 'none'
+OCR_CALIBRATION_IMAGE = 'data/original.png'
+
+# Where the onnx backend keeps the exported models (one file per architecture
+# and doctr version, exported on first use)
+ONNX_CACHE_DIR = 'models/onnx'
+
+# ONNX Runtime intra-op threads per session (0 = ONNX Runtime default, one per core)
+ONNX_THREADS = 0
+
+# Persistent cache of per-tile OCR results (doctr and onnx backends, tiles mode)
+# Default: False
+# Tiles repeated across sheets and jobs (title block, general notes, legend)
+# are looked up by a hash of their pixels and the OCR models instead of being
+# OCRed again. The store in OCR_CACHE_DIR is kept under OCR_CACHE_MAX_MB by
+# removing the least recently used entries. A relative OCR_CACHE_DIR is
+# resolved against the server's working directory
+OCR_CACHE = False
+OCR_CACHE_DIR = 'cache/ocr_tiles'
+OCR_CACHE_MAX_MB = 512
+
+# Recorded word table for the replay backend (tile_ocr output, e.g. data/final.csv).
+# Coordinates are page-normalized, so it is replayed for every page of any size
+OCR_REPLAY_PATH = 'data/final.csv'
+
+# Synthetic inference latency of the replay backend, in seconds per tile
+OCR_REPLAY_LATENCY = 0.0
 
 # ============================================================
 # MAIN.PY CONFIGURATION (Command Line Processing)
@@ -44,6 +184,34 @@ OUTPUT_FILENAME_PATTERN = 'tendons-{i}.png'
 # Set to False if you don't want images to open automatically
 AUTO_OPEN_RESULT = True
 
+# ============================================================
+# OUTPUT IMAGE CONFIGURATION
+# ============================================================
+
+# Format of the annotated page images written by the server: 'png', 'jpeg' or 'webp'
+OUTPUT_FORMAT = 'png'
+
+# PNG compression level (0-9), OpenCV default is 1
+# Higher values = smaller files but slower encoding
+OUTPUT_PNG_COMPRESSION = 1
+
+# JPEG quality (0-100)
+OUTPUT_JPEG_QUALITY = 90
+
+# WebP quality (1-100, 101 = lossless)
+OUTPUT_WEBP_QUALITY = 90
+
+# Generate a deep-zoom (DZI) tile pyramid and a low-res preview for each page
+# so the frontend can pan/zoom large sheets without fetching the full image
+OUTPUT_TILE_PYRAMID = True
+
+# Pyramid tile size in pixels and tile format ('png', 'jpeg' or 'webp')
+OUTPUT_TILE_SIZE = 256
+OUTPUT_TILE_FORMAT = 'jpeg'
+
+# Longest side of the preview image in pixels
+OUTPUT_PREVIEW_MAX_SIZE = 1024
+
 # ============================================================
 # SERVER CONFIGURATION
 # ============================================================
@@ -58,6 +226,23 @@ UPLOAD_FOLDER = 'uploads'
 # Output folder for processed results
 SERVER_OUTPUT_FOLDER = 'outputs'
 
+# Build output of the React frontend (npm run build), served at /app and /assets
+FRONTEND_DIST_DIR = 'frontend/dist'
+
+# Job progress event stream (/api/events/<job_id>)
+# Minimum seconds between two events to one client; updates in between are coalesced
+SSE_MIN_INTERVAL = 0.5
+# Seconds without updates before a keep-alive comment is sent
+SSE_HEARTBEAT_SECONDS = 15
+
+# Start loading the OCR models in the background when server.py starts, instead
+# of on the first upload (/readyz turns 200 once they are loaded). Under a WSGI
+# server, loading starts on the first /readyz probe or upload
+PRELOAD_MODELS = True
+
+# Run one warm-up inference after loading the models
+WARMUP_MODELS = True
+
 # Allowed file extensions for upload
 ALLOWED_EXTENSIONS = {'pdf'}
 
@@ -65,6 +250,20 @@ ALLOWED_EXTENSIONS = {'pdf'}
 # Default: 50MB
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 
+# Pages processed at the same time, across all jobs
+# Default: 2
+# Jobs and the child jobs of a batch (/api/batch) take a slot per page, so
+# pages from all of them are scheduled through the same worker capacity
+PAGE_WORKERS = 2
+
+# Most PDFs one batch submission (/api/batch) may contain, zip archives included;
+# each of them (uploaded or extracted) is limited to MAX_FILE_SIZE
+BATCH_MAX_FILES = 100
+
+# Largest batch submission request body (in bytes), files and archives together
+# Default: 500MB
+BATCH_MAX_REQUEST_SIZE = 500 * 1024 * 1024  # 500 MB
+
 # ============================================================
 # GPU CONFIGURATION
 # ============================================================
@@ -83,9 +282,45 @@ LOG_FILE = 'server.log'
 # Log level: DEBUG, INFO, WARNING, ERROR, CRITICAL
 LOG_LEVEL = 'INFO'
 
+# Log record format: 'text' (human readable) or 'json' (one JSON object per
+# line with job_id / page / stage fields, for log aggregation)
+LOG_FORMAT = 'text'
+
 # Enable detailed debug logging
 DEBUG_MODE = True
 
+# ============================================================
+# MEMORY TRACKING CONFIGURATION
+# ============================================================
+
+# Record RSS before/after each processing stage, the peak RSS of every page and
+# the sizes of the page's large arrays; reported in the job status and logs.
+# Starts a sampling thread per job; a job can opt in with memory=1 on upload
+MEMORY_TRACKING = False
+
+# Seconds between two background RSS samples (catches peaks inside stages)
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+# Number of top tracemalloc allocation sites to keep per page; 0 disables
+# tracemalloc, which slows down every Python allocation while it is on
+MEMORY_TRACEMALLOC_TOP = 0
+
+# ============================================================
+# PROFILING CONFIGURATION
+# ============================================================
+
+# Profile every server job (a single job can also be profiled with the
+# 'profile' field of the upload form). Profiles are written to
+# <SERVER_OUTPUT_FOLDER>/<job_id>/; disabled jobs run without any profiler
+PROFILE_JOBS = False
+
+# 'sampling' - stack samples of the worker thread (low overhead)
+# 'cprofile' - deterministic cProfile, plus stack samples for the flame graph
+PROFILE_MODE = 'sampling'
+
+# Seconds between two stack samples
+PROFILE_SAMPLE_INTERVAL = 0.005
+
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
@@ -105,9 +340,108 @@ def validate_config():
         errors.append("PDF_DPI must be an integer between 72 and 600")
     
     # Validate batch size
-    if not isinstance(OCR_BATCH_SIZE, int) or OCR_BATCH_SIZE < 1 or OCR_BATCH_SIZE > 100:
-        errors.append("OCR_BATCH_SIZE must be an integer between 1 and 100")
+    if OCR_BATCH_SIZE != 'auto' and (not isinstance(OCR_BATCH_SIZE, int) or OCR_BATCH_SIZE < 1 or OCR_BATCH_SIZE > 100):
+        errors.append("OCR_BATCH_SIZE must be 'auto' or an integer between 1 and 100")
+    if not isinstance(OCR_MAX_BATCH_SIZE, int) or OCR_MAX_BATCH_SIZE < 1:
+        errors.append("OCR_MAX_BATCH_SIZE must be a positive integer")
+    if not isinstance(OCR_BATCH_MEMORY_PER_MPIX, (int, float)) or OCR_BATCH_MEMORY_PER_MPIX <= 0:
+        errors.append("OCR_BATCH_MEMORY_PER_MPIX must be a positive number")
+    if not isinstance(OCR_BATCH_MEMORY_FRACTION, (int, float)) or not 0 < OCR_BATCH_MEMORY_FRACTION <= 1:
+        errors.append("OCR_BATCH_MEMORY_FRACTION must be between 0 and 1")
+    if not isinstance(OCR_RECO_BATCH_SIZE, int) or OCR_RECO_BATCH_SIZE < 1:
+        errors.append("OCR_RECO_BATCH_SIZE must be a positive integer")
     
+    # Validate OCR mode
+    if OCR_MODE not in ('tiles', 'page'):
+        errors.append("OCR_MODE must be 'tiles' or 'page'")
+    if not isinstance(OCR_PAGE_DETECTION_SCALE, (int, float)) or not 0 < OCR_PAGE_DETECTION_SCALE <= 1:
+        errors.append("OCR_PAGE_DETECTION_SCALE must be between 0 and 1")
+    if not isinstance(OCR_DETECTION_WINDOW, int) or OCR_DETECTION_WINDOW < 256:
+        errors.append("OCR_DETECTION_WINDOW must be an integer of at least 256")
+    if not isinstance(OCR_DETECTION_OVERLAP, int) or not 0 <= OCR_DETECTION_OVERLAP < OCR_DETECTION_WINDOW // 2:
+        errors.append("OCR_DETECTION_OVERLAP must be an integer below half of OCR_DETECTION_WINDOW")
+
+    # Validate text layer
+    if not isinstance(USE_TEXT_LAYER, bool):
+        errors.append("USE_TEXT_LAYER must be True or False")
+    if not isinstance(TEXT_LAYER_MIN_WORDS, int) or TEXT_LAYER_MIN_WORDS < 1:
+        errors.append("TEXT_LAYER_MIN_WORDS must be a positive integer")
+    if not isinstance(TEXT_LAYER_MAX_UNMAPPED, (int, float)) or not 0 <= TEXT_LAYER_MAX_UNMAPPED <= 1:
+        errors.append("TEXT_LAYER_MAX_UNMAPPED must be between 0 and 1")
+    if not isinstance(OCR_BASELINE_FILE, str) or not OCR_BASELINE_FILE:
+        errors.append("OCR_BASELINE_FILE must be a file path")
+
+    # Validate line detection
+    if LINE_DETECTION_LEVEL not in (0, 1, 2):
+        errors.append("LINE_DETECTION_LEVEL must be 0, 1 or 2")
+    if not isinstance(USE_VECTOR_LINES, bool):
+        errors.append("USE_VECTOR_LINES must be True or False")
+    if not isinstance(VECTOR_LINES_MIN_SEGMENTS, int) or VECTOR_LINES_MIN_SEGMENTS < 1:
+        errors.append("VECTOR_LINES_MIN_SEGMENTS must be a positive integer")
+
+    # Validate job scheduling
+    if not isinstance(PAGE_WORKERS, int) or PAGE_WORKERS < 1:
+        errors.append("PAGE_WORKERS must be a positive integer")
+    if not isinstance(BATCH_MAX_FILES, int) or BATCH_MAX_FILES < 1:
+        errors.append("BATCH_MAX_FILES must be a positive integer")
+    if not isinstance(MAX_FILE_SIZE, int) or MAX_FILE_SIZE < 1:
+        errors.append("MAX_FILE_SIZE must be a positive integer")
+    if not isinstance(BATCH_MAX_REQUEST_SIZE, int) or BATCH_MAX_REQUEST_SIZE < 1:
+        errors.append("BATCH_MAX_REQUEST_SIZE must be a positive integer")
+
+    # Validate OCR backend
+    if OCR_BACKEND not in ('doctr', 'onnx', 'replay'):
+        errors.append("OCR_BACKEND must be 'doctr', 'onnx' or 'replay'")
+    if OCR_DET_ARCH not in OCR_DET_ARCHS:
+        errors.append(f"OCR_DET_ARCH must be one of {', '.join(OCR_DET_ARCHS)}")
+    if OCR_RECO_ARCH not in OCR_RECO_ARCHS:
+        errors.append(f"OCR_RECO_ARCH must be one of {', '.join(OCR_RECO_ARCHS)}")
+    if not isinstance(OCR_INTRA_OP_THREADS, int) or OCR_INTRA_OP_THREADS < 0:
+        errors.append("OCR_INTRA_OP_THREADS must be a non-negative integer")
+    if not isinstance(OCR_INTER_OP_THREADS, int) or OCR_INTER_OP_THREADS < 0:
+        errors.append("OCR_INTER_OP_THREADS must be a non-negative integer")
+    if OCR_QUANTIZE not in ('none', 'recognition', 'all'):
+        errors.append("OCR_QUANTIZE must be 'none', 'recognition' or 'all'")
+    if not isinstance(ONNX_THREADS, int) or ONNX_THREADS < 0:
+        errors.append("ONNX_THREADS must be a non-negative integer")
+    if not isinstance(OCR_CACHE, bool):
+        errors.append("OCR_CACHE must be True or False")
+    if not isinstance(OCR_CACHE_MAX_MB, (int, float)) or OCR_CACHE_MAX_MB <= 0:
+        errors.append("OCR_CACHE_MAX_MB must be a positive number")
+    if not isinstance(OCR_REPLAY_LATENCY, (int, float)) or OCR_REPLAY_LATENCY < 0:
+        errors.append("OCR_REPLAY_LATENCY must be a non-negative number")
+
+    # Validate output encoders
+    output_formats = ('png', 'jpeg', 'webp')
+    if OUTPUT_FORMAT not in output_formats or OUTPUT_TILE_FORMAT not in output_formats:
+        errors.append(f"OUTPUT_FORMAT and OUTPUT_TILE_FORMAT must be one of {output_formats}")
+    if not isinstance(OUTPUT_PNG_COMPRESSION, int) or not 0 <= OUTPUT_PNG_COMPRESSION <= 9:
+        errors.append("OUTPUT_PNG_COMPRESSION must be an integer between 0 and 9")
+    if not isinstance(OUTPUT_JPEG_QUALITY, int) or not 0 <= OUTPUT_JPEG_QUALITY <= 100:
+        errors.append("OUTPUT_JPEG_QUALITY must be an integer between 0 and 100")
+    if not isinstance(OUTPUT_WEBP_QUALITY, int) or not 1 <= OUTPUT_WEBP_QUALITY <= 101:
+        errors.append("OUTPUT_WEBP_QUALITY must be an integer between 1 and 101")
+    if not isinstance(OUTPUT_TILE_SIZE, int) or OUTPUT_TILE_SIZE < 64:
+        errors.append("OUTPUT_TILE_SIZE must be an integer of at least 64")
+
+    # Validate logging
+    if LOG_LEVEL not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+        errors.append("LOG_LEVEL must be one of DEBUG, INFO, WARNING, ERROR, CRITICAL")
+    if LOG_FORMAT not in ('text', 'json'):
+        errors.append("LOG_FORMAT must be 'text' or 'json'")
+
+    # Validate memory tracking
+    if not isinstance(MEMORY_SAMPLE_INTERVAL, (int, float)) or MEMORY_SAMPLE_INTERVAL <= 0:
+        errors.append("MEMORY_SAMPLE_INTERVAL must be a positive number")
+    if not isinstance(MEMORY_TRACEMALLOC_TOP, int) or MEMORY_TRACEMALLOC_TOP < 0:
+        errors.append("MEMORY_TRACEMALLOC_TOP must be a non-negative integer")
+
+    # Validate profiling
+    if PROFILE_MODE not in ('sampling', 'cprofile'):
+        errors.append("PROFILE_MODE must be 'sampling' or 'cprofile'")
+    if not isinstance(PROFILE_SAMPLE_INTERVAL, (int, float)) or PROFILE_SAMPLE_INTERVAL <= 0:
+        errors.append("PROFILE_SAMPLE_INTERVAL must be a positive number")
+
     # Validate port
     if not isinstance(SERVER_PORT, int) or SERVER_PORT < 1024 or SERVER_PORT > 65535:
         errors.append("SERVER_PORT must be an integer between 1024 and 65535")
@@ -131,9 +465,19 @@ def print_config():
     print("=" * 60)
     print(f"PDF DPI:              {PDF_DPI}")
     print(f"OCR Batch Size:       {OCR_BATCH_SIZE}")
+    print(f"Grayscale Mode:       {GRAYSCALE_MODE}")
+    print(f"OCR Backend:          {OCR_BACKEND}")
+    print(f"OCR Mode:             {OCR_MODE}")
+    print(f"OCR Tile Cache:       {OCR_CACHE_DIR if OCR_CACHE else 'off'}")
+    print(f"Use Text Layer:       {USE_TEXT_LAYER}")
+    print(f"Use Vector Lines:     {USE_VECTOR_LINES}")
+    print(f"OCR Models:           {OCR_DET_ARCH} + {OCR_RECO_ARCH}")
+    print(f"CPU Optimize:         {OCR_CPU_OPTIMIZE} (quantize: {OCR_QUANTIZE})")
     print(f"Input PDF:            {INPUT_PDF_PATH}")
     print(f"Output Directory:     {OUTPUT_DIR}")
     print(f"Auto-open Result:     {AUTO_OPEN_RESULT}")
+    print(f"Output Format:        {OUTPUT_FORMAT}")
+    print(f"Tile Pyramid:         {OUTPUT_TILE_PYRAMID}")
     print(f"Server Host:          {SERVER_HOST}")
     print(f"Server Port:          {SERVER_PORT}")
     print(f"Use GPU:              {USE_GPU}")
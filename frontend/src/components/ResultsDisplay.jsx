@@ -122,7 +122,7 @@ const ResultsDisplay = ({ jobId, onNewUpload }) => {
               >
                 <div className="aspect-video bg-gradient-to-br from-industrial-100 to-steel-100 flex items-center justify-center relative overflow-hidden">
                   <img
-                    src={`/api/download/${jobId}/${result.filename}`}
+                    src={`/api/download/${jobId}/${result.preview || result.filename}`}
                     alt={`Page ${result.page + 1}`}
                     className="w-full h-full object-contain group-hover:scale-105 transition-transform duration-200"
                   />
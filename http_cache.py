@@ -0,0 +1,106 @@
+"""
+HTTP caching and compression helpers for the Flask server
+
+- Strong, content-based ETags for files (hashed once per file version)
+- Long-lived immutable caching for job outputs and content-hashed assets
+- gzip / brotli compression of text responses (HTML, JSON, XML, CSV, ...)
+- Conditional GET (304) for in-memory responses that carry an ETag
+
+Range requests for files are handled by Flask's send_file, which honours
+Range / If-Range against the ETags set here.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used when brotli is not installed
+    brotli = None
+
+# Job outputs never change once written and Vite emits content-hashed asset names
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain',
+    'application/json', 'application/javascript', 'application/xml',
+}
+# Bodies smaller than this are not worth a compression round trip
+MIN_COMPRESS_SIZE = 512
+
+_etag_cache = {}
+_etag_lock = threading.Lock()
+
+
+def file_etag(path):
+    """Content hash of a file, cached per (path, mtime, size)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+    if etag is None:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        with _etag_lock:
+            _etag_cache[key] = etag
+    return etag
+
+
+def send_immutable(directory, filename, mimetype=None):
+    """Serve a file that never changes under its URL (job outputs, hashed assets)"""
+    response = send_from_directory(
+        directory, filename,
+        mimetype=mimetype,
+        etag=file_etag(os.path.join(directory, filename)),
+        max_age=IMMUTABLE_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def choose_encoding():
+    """Best content coding the client accepts: 'br', 'gzip' or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook: compress text bodies, then answer conditional GETs"""
+    if (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+    ):
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding()
+        data = response.get_data()
+        if encoding is not None and len(data) >= MIN_COMPRESS_SIZE:
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=5))
+            else:
+                response.set_data(gzip.compress(data, compresslevel=6))
+            response.headers['Content-Encoding'] = encoding
+
+            # each representation needs its own strong ETag
+            etag, weak = response.get_etag()
+            if etag:
+                response.set_etag(f"{etag}-{encoding}", weak=weak)
+
+    # send_file responses (direct passthrough) were already made conditional
+    if request.method in ('GET', 'HEAD') and not response.direct_passthrough and response.get_etag()[0]:
+        response.make_conditional(request)
+
+    return response
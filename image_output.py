@@ -0,0 +1,111 @@
+"""
+Encoding of annotated output pages
+
+Writes the full-resolution page with the configured encoder settings, plus an
+optional low-res preview and a deep-zoom (DZI) tile pyramid so the frontend
+can pan and zoom large sheets without downloading the full image.
+
+Pyramid layout (compatible with OpenSeadragon and other DZI viewers):
+    <name>.dzi
+    <name>_files/<level>/<col>_<row>.<ext>
+Level 0 is 1x1 px and the highest level is the full-resolution page; each
+level halves the one above it.
+"""
+import math
+import os
+
+import cv2
+
+import config
+
+EXTENSIONS = {
+    'png': 'png',
+    'jpeg': 'jpg',
+    'webp': 'webp',
+}
+
+DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" Overlap="0" Format="{ext}">\n'
+    '  <Size Width="{width}" Height="{height}"/>\n'
+    '</Image>\n'
+)
+
+
+def encode_params(fmt):
+    """cv2.imwrite/imencode parameters for an output format"""
+    if fmt == 'png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, config.OUTPUT_PNG_COMPRESSION]
+    if fmt == 'jpeg':
+        return [cv2.IMWRITE_JPEG_QUALITY, config.OUTPUT_JPEG_QUALITY]
+    if fmt == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, config.OUTPUT_WEBP_QUALITY]
+    raise ValueError(f"Unsupported output format: {fmt}")
+
+
+def format_from_path(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    for fmt, fmt_ext in EXTENSIONS.items():
+        if ext in (fmt, fmt_ext):
+            return fmt
+    raise ValueError(f"Unsupported output file extension: {path}")
+
+
+def write_image(path, image):
+    """Write an image with the configured encoder settings for its extension"""
+    if not cv2.imwrite(path, image, encode_params(format_from_path(path))):
+        raise Exception(f"cv2.imwrite failed to save {path}")
+    return path
+
+
+def downscale(image):
+    """Halve an image (rounding up), the step between two pyramid levels"""
+    height, width = image.shape[:2]
+    size = (max(1, math.ceil(width / 2)), max(1, math.ceil(height / 2)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def write_preview(path, image, max_size=None):
+    """Write a low-res preview whose longest side is at most max_size px"""
+    max_size = max_size or config.OUTPUT_PREVIEW_MAX_SIZE
+    height, width = image.shape[:2]
+    scale = min(1.0, max_size / max(height, width))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return write_image(path, cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+
+
+def write_pyramid(dzi_path, image, tile_size=None, fmt=None):
+    """
+    Write a deep-zoom pyramid for the image next to dzi_path.
+    Returns the number of levels.
+    """
+    tile_size = tile_size or config.OUTPUT_TILE_SIZE
+    fmt = fmt or config.OUTPUT_TILE_FORMAT
+    ext = EXTENSIONS[fmt]
+    params = encode_params(fmt)
+    height, width = image.shape[:2]
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    tiles_dir = os.path.splitext(dzi_path)[0] + '_files'
+
+    level_image = image
+    for level in range(max_level, -1, -1):
+        level_dir = os.path.join(tiles_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        level_h, level_w = level_image.shape[:2]
+
+        for row in range(math.ceil(level_h / tile_size)):
+            for col in range(math.ceil(level_w / tile_size)):
+                y, x = row * tile_size, col * tile_size
+                tile = level_image[y:y + tile_size, x:x + tile_size]
+                ok, encoded = cv2.imencode(f'.{ext}', tile, params)
+                if not ok:
+                    raise Exception(f"Failed to encode tile {level}/{col}_{row}")
+                encoded.tofile(os.path.join(level_dir, f"{col}_{row}.{ext}"))
+
+        if level > 0:
+            level_image = downscale(level_image)
+
+    with open(dzi_path, 'w') as f:
+        f.write(DZI_TEMPLATE.format(tile_size=tile_size, ext=ext, width=width, height=height))
+
+    return max_level + 1
@@ -0,0 +1,139 @@
+"""
+Incremental reprocessing of revised drawing sets
+
+A completed job stores, next to its tendon records, one entry per page
+(PAGES_FILENAME): a fingerprint of the rasterized page, its page result and
+its tendon records, plus the settings the job ran with. An update job
+(previous_job_id on upload) rasterizes every page of the new PDF, and a page
+whose fingerprint appears in the previous job is not processed again: its
+output files are linked (or copied) from the previous job and its results
+are taken over. Pages are matched by fingerprint, not position, so sheets
+inserted or removed in the reissued set don't invalidate the pages after
+them.
+
+The fingerprint hashes the page raster the pipeline actually sees, so a page
+is only reused when it would be processed identically; if the settings that
+shape the results differ from the previous job's, nothing is reused.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import config
+from results_export import COLUMNS
+
+PAGES_FILENAME = 'pages.json'
+
+
+def processing_settings(det_arch, reco_arch, gpu):
+    """
+    Every setting a page's words, tendon records or output files depend on
+    besides its pixels; `gpu`: whether the models run on the GPU
+    """
+    quantized = config.OCR_BACKEND == 'doctr' and config.OCR_CPU_OPTIMIZE and not gpu
+    return {
+        # rasterization
+        'pdf_dpi': config.PDF_DPI,
+        'grayscale': config.GRAYSCALE_MODE,
+        # words
+        'ocr_backend': config.OCR_BACKEND,
+        'det_arch': det_arch,
+        'reco_arch': reco_arch,
+        'gpu': bool(gpu),
+        'ocr_quantize': config.OCR_QUANTIZE if quantized else 'none',
+        'ocr_calibration_image': config.OCR_CALIBRATION_IMAGE if quantized and config.OCR_QUANTIZE == 'all' else None,
+        'ocr_replay_path': config.OCR_REPLAY_PATH if config.OCR_BACKEND == 'replay' else None,
+        'ocr_pooled_recognition': config.OCR_POOLED_RECOGNITION,
+        'ocr_mode': config.OCR_MODE,
+        'ocr_page_detection_scale': config.OCR_PAGE_DETECTION_SCALE,
+        'ocr_detection_window': config.OCR_DETECTION_WINDOW,
+        'ocr_detection_overlap': config.OCR_DETECTION_OVERLAP,
+        'text_layer': config.USE_TEXT_LAYER,
+        'text_layer_min_words': config.TEXT_LAYER_MIN_WORDS,
+        'text_layer_max_unmapped': config.TEXT_LAYER_MAX_UNMAPPED,
+        # lines and tendon records
+        'vector_lines': config.USE_VECTOR_LINES,
+        'vector_lines_min_segments': config.VECTOR_LINES_MIN_SEGMENTS,
+        'line_detection_level': config.LINE_DETECTION_LEVEL,
+        'record_columns': COLUMNS,
+        # output files
+        'output_format': config.OUTPUT_FORMAT,
+        'png_compression': config.OUTPUT_PNG_COMPRESSION,
+        'jpeg_quality': config.OUTPUT_JPEG_QUALITY,
+        'webp_quality': config.OUTPUT_WEBP_QUALITY,
+        'tile_pyramid': config.OUTPUT_TILE_PYRAMID,
+        'tile_size': config.OUTPUT_TILE_SIZE,
+        'tile_format': config.OUTPUT_TILE_FORMAT,
+        'preview_max_size': config.OUTPUT_PREVIEW_MAX_SIZE,
+    }
+
+
+def page_fingerprint(image, strip_rows=1024):
+    """Hash of a rasterized page (shape, dtype and pixels), read one strip of rows at a time"""
+    import numpy as np
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype}".encode())
+    for y in range(0, image.shape[0], strip_rows):
+        digest.update(memoryview(np.ascontiguousarray(image[y:y + strip_rows])))
+    return digest.hexdigest()
+
+
+def save_pages(job_folder, settings, pages):
+    """`pages`: one {'fingerprint', 'result', 'tendons'} entry per page, in page order"""
+    with open(os.path.join(job_folder, PAGES_FILENAME), 'w') as f:
+        json.dump({'settings': settings, 'pages': pages}, f)
+
+
+def load_pages(job_folder):
+    with open(os.path.join(job_folder, PAGES_FILENAME)) as f:
+        return json.load(f)
+
+
+def previous_pages(job_folder, settings):
+    """
+    Pages of a previous job by fingerprint, or None when they can't be
+    reused because the job ran with other settings
+    """
+    stored = load_pages(job_folder)
+    if stored['settings'] != settings:
+        return None
+    return {page['fingerprint']: page for page in stored['pages']}
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def reuse_page(previous_folder, previous_job_id, page, job_folder, job_id, page_num):
+    """
+    Take over a previous job's page as page `page_num` of this job: its
+    output image, preview and tile pyramid are linked into `job_folder`
+    under this job's names. Returns the page result and tendon records.
+    """
+    result = dict(page['result'])
+    old_name = f"{previous_job_id}_page_{result['page']}"
+    new_name = f"{job_id}_page_{page_num}"
+    os.makedirs(job_folder, exist_ok=True)
+
+    for key in ('filename', 'preview', 'dzi'):
+        if key not in result:
+            continue
+        name = result[key].replace(old_name, new_name, 1)
+        link_or_copy(os.path.join(previous_folder, result[key]), os.path.join(job_folder, name))
+        if key == 'dzi':
+            shutil.copytree(
+                os.path.join(previous_folder, result[key][:-len('.dzi')] + '_files'),
+                os.path.join(job_folder, name[:-len('.dzi')] + '_files'),
+                copy_function=link_or_copy,
+            )
+        result[key] = name
+
+    result['reused_from'] = {'job_id': previous_job_id, 'page': result['page']}
+    result['page'] = page_num
+    tendons = [dict(record, page=page_num) for record in page['tendons']]
+    return result, tendons
@@ -0,0 +1,123 @@
+"""
+Non-blocking, structured logging for the server
+
+configure_logging() routes every record through a QueueHandler: the worker
+thread only enqueues, and a QueueListener thread formats and writes to the
+log file and console. Records carry the job/page of the current log_context
+and the current metrics.stage, which the JSON format (LOG_FORMAT = 'json')
+emits as fields:
+
+    {"time": "...", "level": "INFO", "logger": "server", "message": "...",
+     "job_id": "...", "page": 3, "stage": "ocr"}
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import config
+from metrics import current_stage
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ('job_id', 'page', 'stage')
+
+_log_context = ContextVar('log_context', default={})
+_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (job_id, page, ...) to the records logged in this block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def bind_log_context(**fields):
+    """Add fields to the enclosing log_context, until that block exits"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copies the log context onto records, in the thread that logs them"""
+
+    def filter(self, record):
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        if record.stage is None:
+            record.stage = current_stage()
+        return True
+
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare formats the traceback into the message and drops
+    exc_info, which left the JSON `exception` field empty. Here the message
+    is only merged with its args, and the traceback travels as exc_text
+    (picklable, rendered by both formatters).
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging():
+    """Install the queue handler on the root logger and start the listener thread (once)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if config.LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.FileHandler(config.LOG_FILE), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, config.LOG_LEVEL))
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
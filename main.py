@@ -1,15 +1,22 @@
 import os
 import subprocess
 import platform
+import time
 
 import numpy as np
 import tqdm
 from pdf2image import convert_from_path
-from ocr.doctr import OCR
+from ocr.backends import architectures, get_ocr
+from ocr.batching import BatchSizer, recognize_crops
+from ocr.tile_cache import get_tile_cache, model_identity, tile_key
 import pandas as pd
 import cv2
 
 from test_extractor import extract_tendons
+from text_layer import page_words
+from vector_lines import page_lines
+from image_output import write_image
+from metrics import stage
 import config
 
 
@@ -123,54 +130,252 @@ def deduplicate_ocr(df, iou_thresh=0.6):
     return df.loc[keep].reset_index(drop=True)
 
 
-def tile_ocr(drawing, gpu, batch_size=2, progress_callback=None) -> pd.DataFrame:
+def tile_ocr(drawing, gpu, batch_size=2, progress_callback=None, stats=None, det_arch=None, reco_arch=None) -> pd.DataFrame:
+    """
+    OCR a full page by tiles. Returns the page's word DataFrame (value,
+    confidence, x1..y2 normalized to the page, tile_id, word_idx).
+    `batch_size` is a number of tiles or 'auto' (see ocr.batching), and
+    `progress_callback(done, total)` is called after every batch (units of
+    work: tiles, and in OCR_POOLED_RECOGNITION mode as many again for the
+    recognition of the pooled word crops).
+    If `stats` is a dict, per-page counts and batch sizes are written into it.
+    `det_arch` / `reco_arch` override config.OCR_DET_ARCH / OCR_RECO_ARCH.
+    With config.OCR_CACHE, tiles found in the tile cache (ocr.tile_cache) are
+    not OCRed again, and only the others count as units of work.
+    """
     full_h, full_w = drawing.shape[:2]
-    tiles = crop_tiles(drawing)
-    docs = [tile["image"] for tile in tiles]
-    ocr = OCR(gpu=gpu)
+    with stage('crop_tiles'):
+        tiles = crop_tiles(drawing)
+    with stage('model_load'):
+        ocr = get_ocr(gpu=gpu, det_arch=det_arch, reco_arch=reco_arch)
+    ocr.start_page(drawing.shape, tiles)
+
+    # Pooled mode: detect on all tiles first, then recognize the page's word crops together
+    pooled = config.OCR_POOLED_RECOGNITION and hasattr(ocr, 'detect')
+
+    # Tiles seen before (title block, notes, legend) come from the tile cache
+    cache = get_tile_cache()
+    identity = None
+    if cache:
+        device = getattr(ocr, 'device', None)
+        identity = model_identity(
+            config.OCR_BACKEND, *architectures(det_arch, reco_arch), pooled, device.type if device else 'cpu'
+        )
+    cached = {}
+    keys = []
+    if identity is not None:
+        with stage('ocr_cache'):
+            keys = [tile_key(tile["image"], identity) for tile in tiles]
+            for i, key in enumerate(keys):
+                hit, words = cache.get(key)
+                if hit:
+                    cached[i] = words
+    missed = [i for i in range(len(tiles)) if i not in cached]
+    docs = [tiles[i]["image"] for i in missed]
     results = []
 
-    batches = list(batched(docs, batch_size))
-    total_batches = len(batches)
-
-    for batch_idx, batch in enumerate(batches):
-        if len(batch) == 0:
-            break
-
-        results.extend(ocr.from_image(list(batch)))
+    run_batch = ocr.detect if pooled else ocr.from_image
+    # Progress units: tiles, plus as many again for the recognition phase in pooled mode
+    total_units = len(docs) * (2 if pooled else 1)
+
+    # Adaptive ('auto') or fixed batch size; out-of-memory batches are retried smaller
+    sizer = BatchSizer(ocr, docs[0].shape if docs else (0, 0), batch_size)
+    # Tiles are views of the page; the model input of a batch is a 3-channel copy
+    max_batch_bytes = 0
+    done = 0
+
+    while done < len(docs):
+        batch = docs[done:done + sizer.size]
+        start = time.perf_counter()
+        try:
+            batch_results = run_batch(list(batch))
+        except Exception as e:
+            if sizer.out_of_memory(e):
+                continue
+            raise
+        sizer.observe(len(batch), time.perf_counter() - start)
+        results.extend(batch_results)
+        max_batch_bytes = max(max_batch_bytes, sum(t.nbytes * (3 if t.ndim == 2 else 1) for t in batch))
+        done += len(batch)
 
         # Call progress callback if provided
         if progress_callback:
-            progress_callback(batch_idx + 1, total_batches)
+            progress_callback(done, total_units)
+
+    if pooled:
+        def recognition_progress(done_crops, total_crops):
+            if progress_callback:
+                progress_callback(len(docs) + len(docs) * done_crops // total_crops, total_units)
+
+        word_crops = sum(len(crops) for _, crops in results)
+        results, reco_batch_size = recognize_crops(ocr, results, config.OCR_RECO_BATCH_SIZE, recognition_progress)
+
+    if identity is not None:
+        with stage('ocr_cache'):
+            for i, words in zip(missed, results):
+                cache.put(keys[i], words)
+    if cached:
+        by_tile = {**dict(zip(missed, results)), **cached}
+        results = [by_tile[i] for i in range(len(tiles))]
+        if progress_callback and not docs:
+            progress_callback(1, 1)
+
+    with stage('projection'):
+        all_dfs = []
+        for i in range(len(tiles)):
+            df_tile = results[i]
+            tile = tiles[i]
+
+            if df_tile is None or df_tile.empty:
+                continue
 
-    all_dfs = []
-    for i in range(len(tiles)):
-        df_tile = results[i]
-        tile = tiles[i]
+            df_global = project_tile_df_to_global(
+                df_tile,
+                tile["x_offset"],
+                tile["y_offset"],
+                tile["image"].shape[1],
+                tile["image"].shape[0],
+                full_w=full_w,
+                full_h=full_h,
+                tile_id=tile["tile_id"]
+            )
 
-        if df_tile is None or df_tile.empty:
-            continue
+            all_dfs.append(df_global)
 
-        df_global = project_tile_df_to_global(
-            df_tile,
-            tile["x_offset"],
-            tile["y_offset"],
-            tile["image"].shape[1],
-            tile["image"].shape[0],
-            full_w=full_w,
-            full_h=full_h,
-            tile_id=tile["tile_id"]
-        )
+        df_final = pd.concat(all_dfs, ignore_index=True)
+
+    with stage('deduplicate_ocr'):
+        df_final = deduplicate_ocr(df_final, iou_thresh=0.6)
+    df_final["word_idx"] = range(len(df_final))
+
+    if stats is not None:
+        stats['tiles'] = len(tiles)
+        stats['text_tiles'] = len(all_dfs)
+        stats['words'] = len(df_final)
+        stats['max_batch_bytes'] = max_batch_bytes
+        stats.update(sizer.stats())
+        if identity is not None:
+            stats['cache_hits'] = len(cached)
+            stats['cache_misses'] = len(missed)
+        if pooled:
+            stats['word_crops'] = word_crops
+            stats['recognition_batch_size'] = reco_batch_size
+
+    return df_final
+
+
+def window_boxes_to_page(boxes, window, page_w, page_h, overlap):
+    """
+    Boxes normalized to a detection window -> normalized to the page, keeping
+    only those centered in the window's core: the window minus half the
+    overlap on every edge shared with another window. The cores of the
+    crop_tiles windows partition the page, so each word is kept once.
+    """
+    win_h, win_w = window["image"].shape[:2]
+    x0, y0 = window["x_offset"], window["y_offset"]
+    xs = boxes[:, [0, 2]] * win_w + x0
+    ys = boxes[:, [1, 3]] * win_h + y0
+    cx, cy = xs.mean(axis=1), ys.mean(axis=1)
+
+    half = overlap / 2
+    left = x0 + half if x0 > 0 else 0
+    right = x0 + win_w - half if x0 + win_w < page_w else page_w
+    top = y0 + half if y0 > 0 else 0
+    bottom = y0 + win_h - half if y0 + win_h < page_h else page_h
+    core = (cx >= left) & (cx < right) & (cy >= top) & (cy < bottom)
+
+    page_boxes = np.stack([xs[:, 0] / page_w, ys[:, 0] / page_h, xs[:, 1] / page_w, ys[:, 1] / page_h], axis=1)
+    return page_boxes[core]
 
-        all_dfs.append(df_global)
 
-    df_final = pd.concat(all_dfs, ignore_index=True)
-    df_final = deduplicate_ocr(df_final, iou_thresh=0.6)
+def page_ocr(drawing, gpu, batch_size=2, progress_callback=None, stats=None, det_arch=None, reco_arch=None) -> pd.DataFrame:
+    """
+    Tile-free OCR of a page. The text detector runs on the page downscaled by
+    OCR_PAGE_DETECTION_SCALE, cut into a few OCR_DETECTION_WINDOW windows;
+    the word boxes are mapped back to the page and cropped from the
+    full-resolution page for pooled recognition. Every word comes from
+    exactly one window (see window_boxes_to_page), so there is no tile
+    overlap to re-process and no deduplication.
+    Same arguments, output and stats as tile_ocr; backends without a
+    separate detector (replay) fall back to tile_ocr.
+    """
+    with stage('model_load'):
+        ocr = get_ocr(gpu=gpu, det_arch=det_arch, reco_arch=reco_arch)
+    if not hasattr(ocr, 'detect_boxes'):
+        return tile_ocr(drawing, gpu, batch_size, progress_callback, stats, det_arch, reco_arch)
+
+    full_h, full_w = drawing.shape[:2]
+    scale = config.OCR_PAGE_DETECTION_SCALE
+    small_w, small_h = max(1, round(full_w * scale)), max(1, round(full_h * scale))
+    overlap = config.OCR_DETECTION_OVERLAP
+    with stage('downscale'):
+        small = drawing if scale == 1 else cv2.resize(drawing, (small_w, small_h), interpolation=cv2.INTER_AREA)
+    with stage('crop_tiles'):
+        windows = crop_tiles(small, tile_size=config.OCR_DETECTION_WINDOW, overlap=overlap)
+    docs = [window["image"] for window in windows]
+    # Progress units: windows, plus as many again for recognition
+    total_units = len(docs) * 2
+
+    sizer = BatchSizer(ocr, docs[0].shape if docs else (0, 0), batch_size)
+    max_batch_bytes = 0
+    page_boxes, window_ids = [], []
+    done = 0
+
+    while done < len(docs):
+        batch = docs[done:done + sizer.size]
+        start = time.perf_counter()
+        try:
+            batch_boxes = ocr.detect_boxes(list(batch))
+        except Exception as e:
+            if sizer.out_of_memory(e):
+                continue
+            raise
+        sizer.observe(len(batch), time.perf_counter() - start)
+        for window, boxes in zip(windows[done:done + len(batch)], batch_boxes):
+            boxes = window_boxes_to_page(boxes, window, small_w, small_h, overlap)
+            page_boxes.append(boxes)
+            window_ids.append(np.full(len(boxes), window["tile_id"]))
+        max_batch_bytes = max(max_batch_bytes, sum(t.nbytes * (3 if t.ndim == 2 else 1) for t in batch))
+        done += len(batch)
+
+        if progress_callback:
+            progress_callback(done, total_units)
+
+    boxes = np.concatenate(page_boxes) if page_boxes else np.zeros((0, 4))
+    window_ids = np.concatenate(window_ids) if window_ids else np.zeros(0, dtype=int)
+    with stage('crop_words'):
+        kept, crops = ocr.crop_words(drawing, boxes)
+
+    def recognition_progress(done_crops, total_crops):
+        if progress_callback:
+            progress_callback(len(docs) + len(docs) * done_crops // total_crops, total_units)
+
+    (df_final,), reco_batch_size = recognize_crops(
+        ocr, [(boxes[kept], crops)], config.OCR_RECO_BATCH_SIZE, recognition_progress
+    )
+    if df_final is None:
+        df_final = pd.DataFrame(columns=["value", "confidence", "x1", "y1", "x2", "y2"])
+    df_final["tile_id"] = window_ids[kept]
     df_final["word_idx"] = range(len(df_final))
 
+    if stats is not None:
+        stats['tiles'] = len(windows)
+        stats['text_tiles'] = len(set(window_ids[kept].tolist()))
+        stats['words'] = len(df_final)
+        stats['max_batch_bytes'] = max_batch_bytes
+        stats.update(sizer.stats())
+        stats['word_crops'] = len(crops)
+        stats['recognition_batch_size'] = reco_batch_size
+
     return df_final
 
 
+def run_ocr(drawing, gpu, batch_size=2, progress_callback=None, stats=None, det_arch=None, reco_arch=None) -> pd.DataFrame:
+    """OCR a page in config.OCR_MODE: 'tiles' (tile_ocr) or 'page' (page_ocr)"""
+    ocr_page = page_ocr if config.OCR_MODE == 'page' else tile_ocr
+    return ocr_page(drawing, gpu, batch_size, progress_callback, stats, det_arch, reco_arch)
+
+
 def draw_boxes(image, df, color=(0, 255, 0), thickness=2):
     """
     image: original image (H, W, 3)
@@ -244,10 +449,11 @@ def main():
     print()
 
     # Convert PDF to images using configured DPI
-    if config.PDF_DPI == 200:  # Default DPI
-        images = convert_from_path(input_path)
-    else:
-        images = convert_from_path(input_path, dpi=config.PDF_DPI)
+    with stage('rasterize'):
+        if config.PDF_DPI == 200:  # Default DPI
+            images = convert_from_path(input_path, grayscale=config.GRAYSCALE_MODE)
+        else:
+            images = convert_from_path(input_path, dpi=config.PDF_DPI, grayscale=config.GRAYSCALE_MODE)
 
     print(f"✅ Converted to {len(images)} image(s) at {config.PDF_DPI} DPI")
     print()
@@ -259,10 +465,24 @@ def main():
 
     for i, drawing in enumerate(images):
         drawing = np.asarray(drawing)
-        df_final = tile_ocr(drawing, batch_size=config.OCR_BATCH_SIZE, gpu=gpu)
-        vis = extract_tendons(df_final, drawing)
+        # Words from the PDF's text layer when it has them, OCR otherwise
+        df_final = None
+        if config.USE_TEXT_LAYER:
+            with stage('text_layer'):
+                df_final = page_words(input_path, i)
+        if df_final is None:
+            with stage('ocr'):
+                df_final = run_ocr(drawing, batch_size=config.OCR_BATCH_SIZE, gpu=gpu)
+        # Lines from the PDF's drawing operators when it has them, raster detection otherwise
+        lines = None
+        if config.USE_VECTOR_LINES:
+            with stage('vector_lines'):
+                lines = page_lines(input_path, i, drawing.shape)
+        with stage('extract_tendons'):
+            vis, tendons = extract_tendons(df_final, drawing, lines=lines)
         output_path = config.get_output_path(i)
-        cv2.imwrite(output_path, vis)
+        with stage('encode'):
+            write_image(output_path, vis)
         output_files.append(output_path)
         progress.update(1)
 
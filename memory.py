@@ -0,0 +1,225 @@
+"""
+Process memory tracking for processing jobs
+
+A MemoryTracker attached to a job's StageTimings records RSS before and
+after every metrics.stage, samples RSS in the background to catch the peak
+of each page, and keeps the sizes of the large arrays of the page (page,
+OCR batch input, annotated copy). With tracemalloc enabled it also keeps the
+top allocation sites of each page.
+
+RSS includes the page memmaps' resident file pages, so it reflects what a
+container memory limit sees. tracemalloc is process-wide: with several jobs
+running, its numbers cover all of them.
+"""
+import os
+import sys
+import threading
+import tracemalloc
+
+import config
+
+try:
+    import psutil
+except ImportError:  # optional, /proc is read directly on Linux
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+_page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_process = psutil.Process() if psutil is not None else None
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _page_size
+    except OSError:
+        pass
+    if _process is not None:
+        return _process.memory_info().rss
+    if resource is not None:
+        # Lifetime peak as a last resort (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    # Windows without psutil: Python allocations only, when tracemalloc is on
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _cgroup_headroom():
+    """Bytes left under a cgroup v2 memory limit (containers), None without one"""
+    try:
+        with open('/sys/fs/cgroup/memory.max') as f:
+            limit = f.read().strip()
+        if limit == 'max':
+            return None
+        with open('/sys/fs/cgroup/memory.current') as f:
+            return int(limit) - int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def available_bytes():
+    """Memory this process can still allocate: MemAvailable, capped by the cgroup limit"""
+    available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    if available is None and psutil is not None:
+        available = psutil.virtual_memory().available
+    if available is None and hasattr(os, 'sysconf'):
+        available = os.sysconf('SC_AVPHYS_PAGES') * _page_size
+    headroom = _cgroup_headroom()
+    if headroom is not None:
+        available = headroom if available is None else min(available, headroom)
+    return max(available or 0, 0)
+
+
+def to_mb(value):
+    return round(value / MB, 1)
+
+
+class PeakSampler:
+    """Background thread keeping the highest RSS seen since the last reset"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.peak = rss_bytes()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="rss-sampler", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.observe(rss_bytes())
+
+    def observe(self, value):
+        with self.lock:
+            self.peak = max(self.peak, value)
+
+    def reset(self):
+        with self.lock:
+            self.peak = rss_bytes()
+            return self.peak
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def top_allocations(limit):
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    return [
+        {'site': str(stat.traceback[0]), 'size_mb': to_mb(stat.size), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+class MemoryTracker:
+    """Per-job memory record: RSS around stages, peak and array sizes per page"""
+
+    def __init__(self, sample_interval=None, tracemalloc_top=None):
+        self.sampler = PeakSampler(sample_interval or config.MEMORY_SAMPLE_INTERVAL)
+        self.tracemalloc_top = config.MEMORY_TRACEMALLOC_TOP if tracemalloc_top is None else tracemalloc_top
+        if self.tracemalloc_top:
+            start_tracemalloc()
+        self.stages = {}
+        self.pages = []
+        self.open_stages = []
+        self.page = None
+        self.lock = threading.Lock()
+
+    def stage_started(self, name):
+        self.open_stages.append(rss_bytes())
+
+    def stage_finished(self, name):
+        before, after = self.open_stages.pop(), rss_bytes()
+        self.sampler.observe(after)
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'max_rss_before': 0, 'max_rss_after': 0, 'max_growth': 0})
+            stage['count'] += 1
+            stage['max_rss_before'] = max(stage['max_rss_before'], before)
+            stage['max_rss_after'] = max(stage['max_rss_after'], after)
+            stage['max_growth'] = max(stage['max_growth'], after - before)
+
+    def page_started(self, page):
+        self.page = {'page': page, 'rss_start_mb': to_mb(self.sampler.reset()), 'arrays_mb': {}}
+        if self.tracemalloc_top:
+            tracemalloc.reset_peak()
+
+    def record_array(self, name, nbytes):
+        """Size of one of the page's large arrays (largest value kept per name)"""
+        if self.page is not None:
+            self.page['arrays_mb'][name] = max(self.page['arrays_mb'].get(name, 0), to_mb(nbytes))
+
+    def capture_allocations(self):
+        """Keep the top tracemalloc sites; call while the page's data is still alive"""
+        if self.tracemalloc_top and self.page is not None:
+            self.page['top_allocations'] = top_allocations(self.tracemalloc_top)
+
+    def page_finished(self):
+        page, self.page = self.page, None
+        end = rss_bytes()
+        self.sampler.observe(end)
+        page['rss_end_mb'] = to_mb(end)
+        page['peak_rss_mb'] = to_mb(self.sampler.peak)
+        if self.tracemalloc_top:
+            page['tracemalloc_peak_mb'] = to_mb(tracemalloc.get_traced_memory()[1])
+        with self.lock:
+            self.pages.append(page)
+        return page
+
+    def close(self):
+        self.sampler.stop()
+        if self.tracemalloc_top:
+            stop_tracemalloc()
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'rss_mb': to_mb(rss_bytes()),
+                'peak_rss_mb': max((p['peak_rss_mb'] for p in self.pages), default=None),
+                'stages': {
+                    name: {
+                        'count': s['count'],
+                        'max_rss_before_mb': to_mb(s['max_rss_before']),
+                        'max_rss_after_mb': to_mb(s['max_rss_after']),
+                        'max_growth_mb': to_mb(s['max_growth']),
+                    }
+                    for name, s in self.stages.items()
+                },
+                'pages': list(self.pages),
+            }
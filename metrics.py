@@ -0,0 +1,201 @@
+"""
+Lightweight stage timing and counters with Prometheus text exposition
+
+Usage:
+    with metrics.stage('recognition'):
+        ...
+
+Every stage observation goes into the process-wide `pts_stage_seconds`
+histogram (served at /metrics). While a StageTimings collector is active in
+the current thread (`with metrics.collect(timings):`), observations are also
+summarized there, which is how each job gets its own per-stage breakdown.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_registry = []
+_current_timings = ContextVar('stage_timings', default=None)
+_current_stage = ContextVar('stage', default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.series = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                labels = list(zip(self.label_names, key))
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']!r}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """
+    Gauge whose values are either set directly or read from a callback at
+    scrape time (callback returns {label value tuple: value}).
+    """
+
+    def __init__(self, name, help_text, label_names=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(labels.get(name, '') for name in self.label_names)] = value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        with self.lock:
+            values = dict(self.values)
+        if self.callback is not None:
+            values.update(self.callback())
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, key)))} {_format_value(value)}")
+        return lines
+
+
+stage_seconds = Histogram(
+    'pts_stage_seconds', 'Wall time spent in each processing stage', ('stage',)
+)
+page_items = Histogram(
+    'pts_page_items', 'Tiles, OCR words and tendons per processed page', ('kind',), buckets=COUNT_BUCKETS
+)
+
+
+class StageTimings:
+    """
+    Per-job summary of stage timings and page counts. An optional
+    memory.MemoryTracker is told when each stage starts and finishes.
+    """
+
+    def __init__(self, memory=None):
+        self.stages = {}
+        self.counts = {}
+        self.memory = memory
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stage['count'] += 1
+            stage['total_seconds'] += seconds
+            stage['max_seconds'] = max(stage['max_seconds'], seconds)
+
+    def count(self, **counts):
+        with self.lock:
+            for kind, value in counts.items():
+                self.counts[kind] = self.counts.get(kind, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'stages': {
+                    name: {
+                        'count': s['count'],
+                        'total_seconds': round(s['total_seconds'], 4),
+                        'max_seconds': round(s['max_seconds'], 4),
+                    }
+                    for name, s in self.stages.items()
+                },
+                'counts': dict(self.counts),
+            }
+
+
+@contextmanager
+def collect(timings):
+    """Also record stages observed in this thread into `timings`"""
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def current_stage():
+    """Innermost stage running in this thread, or None"""
+    return _current_stage.get()
+
+
+@contextmanager
+def stage(name):
+    timings = _current_timings.get()
+    memory = timings.memory if timings is not None else None
+    if memory is not None:
+        memory.stage_started(name)
+    stage_token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(stage_token)
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=name)
+        if timings is not None:
+            timings.add(name, elapsed)
+        if memory is not None:
+            memory.stage_finished(name)
+
+
+def observe_page(**counts):
+    """Record per-page counts, e.g. observe_page(tiles=96, words=640, tendons=20)"""
+    for kind, value in counts.items():
+        page_items.observe(value, kind=kind)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.count(**counts)
+
+
+def render_prometheus():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,122 @@
+"""
+Background initialization of the processing pipeline
+
+Importing the server only pulls in Flask and light modules. ModelLoader then
+imports the pipeline (cv2, pandas, numpy), probes CUDA/MPS (torch), builds
+the shared OCR model and runs one warm-up inference in a background thread,
+so the first upload doesn't pay for any of it. /readyz reports its state.
+"""
+import logging
+import threading
+import time
+import traceback
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 1000  # crop_tiles default
+
+
+def detect_gpu():
+    """Detect if GPU is available (CUDA or MPS for Apple Silicon)"""
+    if not config.USE_GPU:
+        logger.info("GPU disabled in config - Using CPU")
+        return False
+
+    import torch
+
+    if torch.cuda.is_available():
+        logger.info("Using CUDA GPU")
+        return True
+    elif torch.backends.mps.is_available() and torch.backends.mps.is_built():
+        logger.info("Using MPS (Apple Silicon GPU)")
+        return True
+    else:
+        logger.info("No GPU available - Using CPU")
+        return False
+
+
+def warm_up(ocr):
+    """One detection + recognition pass on a synthetic tile (first-call allocations, kernel selection)"""
+    import cv2
+    import numpy as np
+
+    image = np.full((TILE_SIZE, TILE_SIZE, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "TENDON (3) BANDED", (50, 500), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    ocr.start_page(image.shape, [{"tile_id": 0, "x_offset": 0, "y_offset": 0, "image": image}])
+    ocr.from_image([image])
+
+
+class ModelLoader:
+    def __init__(self):
+        self.state = 'pending'
+        self.error = None
+        self.gpu = False
+        self.timings = {}
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """
+        Start initializing in the background (no-op while loading or ready).
+        After a failed load, starts again: a failed model download or
+        device init doesn't have to last until the process restarts.
+        """
+        with self.lock:
+            if self.thread is None or self.state == 'failed':
+                self.state = 'loading'
+                self.error = None
+                self.done.clear()
+                self.thread = threading.Thread(target=self.run, name="model-loader", daemon=True)
+                self.thread.start()
+
+    def timed(self, name, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.timings[name] = round(time.perf_counter() - start, 3)
+        return result
+
+    def import_pipeline(self):
+        import main  # noqa: F401 - cv2, pandas, pdf2image
+        import test_extractor  # noqa: F401
+        import page_store  # noqa: F401
+        import image_output  # noqa: F401
+
+    def run(self):
+        try:
+            from ocr.backends import get_ocr
+
+            self.timed('imports_seconds', self.import_pipeline)
+            self.gpu = self.timed('gpu_probe_seconds', detect_gpu)
+            ocr = self.timed('model_load_seconds', lambda: get_ocr(gpu=self.gpu))
+            if config.WARMUP_MODELS:
+                self.timed('warmup_seconds', lambda: warm_up(ocr))
+            self.state = 'ready'
+            logger.info(f"Models ready ({config.OCR_BACKEND}, GPU={self.gpu}): {self.timings}")
+        except Exception as e:
+            logger.error(f"Model initialization failed: {str(e)}")
+            logger.error(f"Model initialization traceback:\n{traceback.format_exc()}")
+            # Under the lock: a retry (start) only begins once this attempt is over
+            with self.lock:
+                self.state = 'failed'
+                self.error = str(e)
+                self.done.set()
+        else:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """Block until initialization finished; True when the models are ready"""
+        self.start()
+        self.done.wait(timeout)
+        return self.state == 'ready'
+
+    def status(self):
+        return {
+            'status': self.state,
+            'error': self.error,
+            'backend': config.OCR_BACKEND,
+            'gpu': self.gpu,
+            'timings': dict(self.timings),
+        }
@@ -0,0 +1,72 @@
+import threading
+
+import config
+
+_models = {}
+_models_lock = threading.Lock()
+_key_locks = {}
+
+
+def architectures(det_arch=None, reco_arch=None):
+    """Detection / recognition architecture pair, defaulting to config.OCR_DET_ARCH / OCR_RECO_ARCH"""
+    return det_arch or config.OCR_DET_ARCH, reco_arch or config.OCR_RECO_ARCH
+
+
+def create_ocr(gpu=False, backend=None, det_arch=None, reco_arch=None):
+    """
+    OCR backend selected by config.OCR_BACKEND (or `backend`). Imported lazily
+    so the replay backend runs without torch / doctr weights.
+    """
+    backend = backend or config.OCR_BACKEND
+    det_arch, reco_arch = architectures(det_arch, reco_arch)
+    if backend == 'doctr':
+        from ocr.doctr import OCR
+        if not config.OCR_CPU_OPTIMIZE:
+            return OCR(det_arch=det_arch, reco_arch=reco_arch, gpu=gpu)
+        calibration_images = None
+        if config.OCR_QUANTIZE == 'all':
+            from ocr.cpu_accel import calibration_tiles
+            calibration_images = calibration_tiles(config.OCR_CALIBRATION_IMAGE)
+        return OCR(
+            det_arch=det_arch, reco_arch=reco_arch, gpu=gpu, cpu_optimize=True,
+            intra_op_threads=config.OCR_INTRA_OP_THREADS,
+            inter_op_threads=config.OCR_INTER_OP_THREADS,
+            quantize=config.OCR_QUANTIZE,
+            calibration_images=calibration_images,
+        )
+    if backend == 'onnx':
+        from ocr.onnx_backend import OnnxOCR
+        return OnnxOCR(det_arch=det_arch, reco_arch=reco_arch)
+    if backend == 'replay':
+        from ocr.replay import ReplayOCR
+        return ReplayOCR(config.OCR_REPLAY_PATH, latency=config.OCR_REPLAY_LATENCY)
+    raise ValueError(f"Unknown OCR backend: {backend}")
+
+
+def get_ocr(gpu=False, backend=None, det_arch=None, reco_arch=None):
+    """
+    Process-wide OCR instance per backend and architecture pair, built on first
+    use and shared by later pages and jobs. The replay backend keeps per-page
+    state and is cheap to build, so every call gets its own.
+    """
+    backend = backend or config.OCR_BACKEND
+    if backend == 'replay':
+        return create_ocr(gpu=gpu, backend=backend)
+    det_arch, reco_arch = architectures(det_arch, reco_arch)
+    key = (backend, gpu, det_arch, reco_arch)
+    # The global lock only hands out per-key locks: building one pair
+    # (weights download, export, quantization) doesn't hold up the others
+    with _models_lock:
+        if key in _models:
+            return _models[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _models:
+            _models[key] = create_ocr(gpu=gpu, backend=backend, det_arch=det_arch, reco_arch=reco_arch)
+        return _models[key]
+
+
+def is_loaded(gpu=False, backend=None, det_arch=None, reco_arch=None):
+    """Whether get_ocr already holds a built instance for these arguments"""
+    backend = backend or config.OCR_BACKEND
+    return (backend, gpu, *architectures(det_arch, reco_arch)) in _models
@@ -0,0 +1,183 @@
+"""
+Adaptive OCR batch sizing
+
+BatchSizer picks the number of tiles per from_image call for tile_ocr:
+  - the first batch size comes from the free memory of the model's device
+    (host memory for CPU and the replay backend) and the tile size, using
+    OCR_BATCH_MEMORY_PER_MPIX as the working memory of one tile
+  - the size doubles while tiles/second improves, up to the memory estimate
+    and OCR_MAX_BATCH_SIZE, and stays at the best size once it doesn't
+  - an allocation error halves the size and the same tiles are retried; the
+    failing size becomes the ceiling for the rest of the process
+
+What was learned is kept per OCR instance, so later pages and jobs sharing
+the model (ocr.backends.get_ocr) start from the settled size. Concurrent
+jobs merge into it under a lock, keeping the lowest ceiling.
+
+recognize_crops is the second phase of pooled OCR (OCR_POOLED_RECOGNITION):
+the word crops of all tiles of a page are recognized together, in batches of
+OCR_RECO_BATCH_SIZE crops sorted by aspect ratio, instead of a few tiles'
+worth of crops per recognition call.
+"""
+import logging
+import threading
+import weakref
+
+import config
+from memory import MB, available_bytes
+
+logger = logging.getLogger(__name__)
+
+START_BATCH_SIZE = 4
+# A larger batch must be this much faster (tiles/second) to keep growing
+MIN_SPEEDUP = 1.05
+
+OOM_MESSAGES = ('out of memory', "can't allocate memory", 'not enough memory', 'failed to allocate')
+
+# OCR instance -> {tile shape: (batch size, ceiling, settled)}, shared by concurrent jobs
+_learned = weakref.WeakKeyDictionary()
+_learned_lock = threading.Lock()
+
+
+def is_out_of_memory(error):
+    if isinstance(error, MemoryError):
+        return True
+    return isinstance(error, RuntimeError) and any(m in str(error).lower() for m in OOM_MESSAGES)
+
+
+def memory_batch_size(ocr, tile_shape):
+    """Tiles per batch that fit in OCR_BATCH_MEMORY_FRACTION of the free memory"""
+    available = getattr(ocr, 'available_memory', lambda: None)()
+    if available is None:
+        available = available_bytes()
+    megapixels = tile_shape[0] * tile_shape[1] / 1e6
+    per_tile = max(megapixels, 0.01) * config.OCR_BATCH_MEMORY_PER_MPIX * MB
+    return int(available * config.OCR_BATCH_MEMORY_FRACTION // per_tile)
+
+
+class BatchSizer:
+    def __init__(self, ocr, tile_shape, batch_size='auto'):
+        self.ocr = ocr
+        self.key = tuple(tile_shape[:2])
+        self.oom_retries = 0
+        self.best_rate = 0.0
+        self.adaptive = batch_size == 'auto'
+
+        with _learned_lock:
+            learned = _learned.get(ocr, {}).get(self.key)
+        if not self.adaptive:
+            # Fixed size: no growth, only the out-of-memory backoff
+            self.size, self.ceiling, self.settled = batch_size, batch_size, True
+            if learned is not None:
+                self.size = self.ceiling = min(batch_size, learned[1])
+        elif learned is not None:
+            self.size, self.ceiling, self.settled = learned
+        else:
+            self.ceiling = max(1, min(config.OCR_MAX_BATCH_SIZE, memory_batch_size(ocr, tile_shape)))
+            self.size = min(START_BATCH_SIZE, self.ceiling)
+            self.settled = self.size == self.ceiling
+        self.initial_size = self.size
+        self.candidate = None  # size being tried, with the best size to fall back to
+
+    def observe(self, tiles, seconds):
+        """Record a completed batch; may grow the next one"""
+        if self.settled or seconds <= 0:
+            return
+        rate = tiles / seconds
+        if tiles < self.size:
+            # Last partial batch of a page says nothing about this size
+            return
+        if self.candidate is not None:
+            if rate < self.best_rate * MIN_SPEEDUP:
+                self.size, self.settled = self.candidate, True
+                self.remember()
+                return
+            self.candidate = None
+        self.best_rate = max(self.best_rate, rate)
+        if self.size >= self.ceiling:
+            self.settled = True
+        else:
+            self.candidate = self.size
+            self.size = min(self.size * 2, self.ceiling)
+        self.remember()
+
+    def out_of_memory(self, error):
+        """
+        Handle a failed batch: True when it was an allocation error and the
+        batch should be retried at the new, halved size.
+        """
+        if not is_out_of_memory(error) or self.size == 1:
+            return False
+        free_memory = getattr(self.ocr, 'free_memory', None)
+        if free_memory is not None:
+            free_memory()
+        self.oom_retries += 1
+        self.ceiling = self.size - 1
+        self.size = max(1, self.size // 2)
+        self.candidate, self.settled = None, True
+        logger.warning(f"OCR batch out of memory, retrying with batch size {self.size}: {error}")
+        self.remember()
+        return True
+
+    def remember(self):
+        """
+        Merge what this sizer learned into the shared entry. Ceilings only go
+        down (the lowest out-of-memory size any job hit wins), and a settled
+        size isn't reopened by a job that is still growing its batches.
+        """
+        with _learned_lock:
+            learned = _learned.setdefault(self.ocr, {})
+            size, ceiling, settled = self.size, self.ceiling, self.settled
+            previous = learned.get(self.key)
+            if previous is not None:
+                ceiling = min(ceiling, previous[1])
+                if previous[2] and not settled:
+                    size, settled = previous[0], True
+                size = min(size, ceiling)
+            learned[self.key] = (size, ceiling, settled)
+
+    def stats(self):
+        return {
+            'initial_batch_size': self.initial_size,
+            'batch_size': self.size,
+            'oom_retries': self.oom_retries,
+        }
+
+
+
+def recognize_crops(ocr, detections, batch_size, progress_callback=None):
+    """
+    Recognize the pooled crops of `detections` (OCR.detect output, one
+    (boxes, crops) pair per tile) and scatter the words back. Returns one
+    word DataFrame (or None) per tile and the batch size that was used last;
+    batches halve on out-of-memory errors.
+    `progress_callback(done_crops, total_crops)` is called after every batch.
+    """
+    crops = [crop for _, tile_crops in detections for crop in tile_crops]
+    # Similar aspect ratios share a batch: same padding, long words split alike
+    order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / max(crops[i].shape[0], 1))
+    preds = [None] * len(crops)
+
+    done = 0
+    while done < len(order):
+        indices = order[done:done + batch_size]
+        try:
+            batch_preds = ocr.recognize([crops[i] for i in indices], batch_size=batch_size)
+        except Exception as e:
+            if not is_out_of_memory(e) or batch_size == 1:
+                raise
+            ocr.free_memory()
+            batch_size = max(1, batch_size // 2)
+            logger.warning(f"Recognition batch out of memory, retrying with {batch_size} crops: {e}")
+            continue
+        for i, pred in zip(indices, batch_preds):
+            preds[i] = pred
+        done += len(indices)
+        if progress_callback:
+            progress_callback(done, len(order))
+
+    results, start = [], 0
+    for boxes, tile_crops in detections:
+        results.append(ocr.words_to_dataframe(boxes, preds[start:start + len(tile_crops)]))
+        start += len(tile_crops)
+    return results, batch_size
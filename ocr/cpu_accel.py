@@ -0,0 +1,91 @@
+"""
+CPU inference tuning for the doctr (torch) OCR backend
+
+- thread counts of the torch intra-op and inter-op pools
+- channels-last memory format for the convolutional networks (the oneDNN
+  convolution kernels run on NHWC without reordering every layer)
+- dynamic int8 quantization of the recognition model (LSTM + Linear layers)
+- static int8 quantization of the detection backbone, calibrated on tiles of
+  a sample sheet; the FPN and probability head stay float32
+
+Quantized kernels only exist on the CPU; none of this is applied on a GPU.
+Compare accuracy and speed of each setting with benchmarks/cpu_inference.py.
+"""
+import logging
+
+import numpy as np
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+QUANTIZE_OPTIONS = ('none', 'recognition', 'all')
+
+
+def configure_threads(intra_op=0, inter_op=0):
+    """Size torch's thread pools (0 keeps the torch default)"""
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Only allowed before the first inter-op parallel work of the process
+            logger.warning(f"Inter-op threads already started, keeping {torch.get_num_interop_threads()}")
+    logger.info(f"torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def _channels_last_input(module, args):
+    x = args[0]
+    if isinstance(x, torch.Tensor) and x.ndim == 4:
+        return (x.contiguous(memory_format=torch.channels_last), *args[1:])
+    return None
+
+
+def to_channels_last(model):
+    """Move a model's weights and its input batches to channels-last"""
+    model.to(memory_format=torch.channels_last)
+    model.register_forward_pre_hook(_channels_last_input)
+    return model
+
+
+def quantize_recognition(model):
+    """Dynamic int8 quantization of the recurrent decoder and classifier"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_detection(predictor, calibration_images):
+    """
+    Static int8 quantization of the detection backbone. Observers are
+    inserted into the feature extractor, the whole predictor runs once on
+    `calibration_images` to record activation ranges, then the backbone is
+    converted to quantized kernels.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    model = predictor.model
+    example = torch.rand((1, *model.cfg['input_shape']))
+    qconfig = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    model.feat_extractor = prepare_fx(model.feat_extractor, qconfig, (example,))
+    predictor(calibration_images)
+    model.feat_extractor = convert_fx(model.feat_extractor)
+
+
+def calibration_tiles(path, count=8, tile_size=1000):
+    """`count` full tiles spread over the sheet at `path` (detection calibration set)"""
+    import cv2
+
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"Cannot read calibration image {path}")
+    height, width = image.shape[:2]
+    tiles = [
+        np.ascontiguousarray(image[y:y + tile_size, x:x + tile_size])
+        for y in range(0, height - tile_size + 1, tile_size)
+        for x in range(0, width - tile_size + 1, tile_size)
+    ]
+    if not tiles:
+        raise ValueError(f"Calibration image {path} is smaller than one {tile_size}px tile")
+    step = max(1, len(tiles) // count)
+    return tiles[::step][:count]
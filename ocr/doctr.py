@@ -2,10 +2,15 @@ import itertools
 
 import torch
 from doctr import models
+from doctr.models.recognition.predictor._utils import remap_preds, split_crops
+from doctr.utils.geometry import extract_crops
+from doctr.utils.multithreading import multithread_exec
 import numpy as np
 import pandas as pd
 import warnings
 
+from metrics import stage
+
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
@@ -13,10 +18,13 @@ class OCR:
     def __init__(
         self,
         det_arch='db_resnet50', reco_arch='crnn_vgg16_bn',
-        pretrained=True, straighten_pages=False, debug=False, gpu=False
+        pretrained=True, straighten_pages=False, debug=False, gpu=False,
+        cpu_optimize=False, intra_op_threads=0, inter_op_threads=0,
+        quantize='none', calibration_images=None
     ):
         super().__init__()
         self.debug = debug
+        self.device = torch.device("cpu")
 
         self.model = models.ocr_predictor(
             det_arch=det_arch,
@@ -29,13 +37,13 @@ class OCR:
             if torch.cuda.is_available():
                 if self.debug:
                     print("Using CUDA GPU")
-                device = torch.device("cuda:0")
-                self.model.to(device)
+                self.device = torch.device("cuda:0")
+                self.model.to(self.device)
             elif torch.backends.mps.is_available():
                 if self.debug:
                     print("Using MPS (Apple Silicon GPU)")
-                device = torch.device("mps")
-                self.model.to(device)
+                self.device = torch.device("mps")
+                self.model.to(self.device)
             else:
                 if self.debug:
                     print("GPU requested but not available, using CPU")
@@ -45,6 +53,24 @@ class OCR:
 
         self.model.eval()
 
+        if cpu_optimize and self.device.type == "cpu":
+            self.optimize_for_cpu(intra_op_threads, inter_op_threads, quantize, calibration_images)
+
+    def optimize_for_cpu(self, intra_op_threads=0, inter_op_threads=0, quantize='none', calibration_images=None):
+        """Thread tuning, optional int8 quantization and channels-last (see ocr.cpu_accel)"""
+        from ocr import cpu_accel
+
+        det_predictor, reco_predictor = self.model.det_predictor, self.model.reco_predictor
+        cpu_accel.configure_threads(intra_op_threads, inter_op_threads)
+        if quantize in ('recognition', 'all'):
+            reco_predictor.model = cpu_accel.quantize_recognition(reco_predictor.model)
+        if quantize == 'all':
+            if not calibration_images:
+                raise ValueError("Detection quantization needs calibration images")
+            cpu_accel.quantize_detection(det_predictor, calibration_images)
+        cpu_accel.to_channels_last(det_predictor.model)
+        cpu_accel.to_channels_last(reco_predictor.model)
+
     @staticmethod
     def json_to_dataframe(result):
         pages = pd.DataFrame.from_dict(pd.json_normalize(result.export()))
@@ -78,16 +104,38 @@ class OCR:
 
         return words
 
+    @staticmethod
+    def to_model_input(image):
+        """
+        Replicate a single-channel tile to the 3 channels the models expect.
+        Tiles may be strided views of a memory-mapped page, so they are made
+        contiguous here, one batch at a time.
+        """
+        if image.ndim == 2:
+            return np.repeat(image[:, :, None], 3, axis=2)
+        return np.ascontiguousarray(image)
+
+    def start_page(self, shape, tiles):
+        """Called by tile_ocr before a page's batches; the models need no page state"""
+        pass
+
     def has_text_detector(self, images):
         out = self.model.det_predictor(images)
         return [len(o["words"]) > 0 for o in out]
 
+    @torch.inference_mode()
     def from_image(self, doc):
         results = []
-        det = self.has_text_detector(doc)
+        doc = [self.to_model_input(image) for image in doc]
+        with stage('has_text_detector'):
+            det = self.has_text_detector(doc)
         filtered_doc = list(itertools.compress(doc, det))
-        try:
+        if not filtered_doc:
+            return [None] * len(doc)
+        # Errors propagate: tile_ocr retries out-of-memory batches at a smaller size
+        with stage('recognition'):
             document = self.model(filtered_doc)
+        with stage('json_to_dataframe'):
             i = 0
             for d in det:
                 if d:
@@ -96,8 +144,100 @@ class OCR:
                     i += 1
                 else:
                     results.append(None)
-        except Exception as e:
-            if self.debug:
-                print(e)
 
         return results
+
+    @torch.inference_mode()
+    def detect_boxes(self, doc):
+        """Word boxes of each image as rows of normalized x1, y1, x2, y2"""
+        doc = [self.to_model_input(image) for image in doc]
+        with stage('detection'):
+            loc_preds = self.model.det_predictor(doc)
+        return [next(iter(pred.values()))[:, :4] for pred in loc_preds]
+
+    @staticmethod
+    def crop_words(image, boxes):
+        """
+        Crops of `boxes` (normalized to `image`) ready for recognize, with the
+        indices of the boxes they belong to
+        """
+        if not len(boxes):
+            return [], []
+        crops = extract_crops(image, boxes)
+        # Boxes collapsed to an empty crop can't be recognized (the predictor drops them too)
+        kept = [i for i, crop in enumerate(crops) if all(side > 0 for side in crop.shape)]
+        return kept, [OCR.to_model_input(crops[i]) for i in kept]
+
+    def detect(self, doc):
+        """
+        Phase 1 of pooled OCR: word boxes of each tile and their crops.
+        Returns one (boxes, crops) pair per tile, boxes as tile-normalized
+        x1, y1, x2, y2 rows; tiles without text get empty ones.
+        """
+        detections = []
+        all_boxes = self.detect_boxes(doc)
+        with stage('crop_words'):
+            for image, boxes in zip(doc, all_boxes):
+                kept, crops = self.crop_words(image, boxes)
+                detections.append((boxes[kept], crops))
+        return detections
+
+    @torch.inference_mode()
+    def recognize(self, crops, batch_size=None):
+        """
+        Phase 2 of pooled OCR: (value, confidence) of word crops from any
+        number of tiles, `batch_size` crops per forward pass (default: the
+        predictor's). Runs the steps of the recognition predictor with its
+        own batching instead of setting pre_processor.batch_size, which is
+        shared by every page recognizing concurrently and by from_image.
+        """
+        if not crops:
+            return []
+        predictor = self.model.reco_predictor
+        pre_processor = predictor.pre_processor
+        batch_size = batch_size or pre_processor.batch_size
+        with stage('recognition'):
+            remapped = False
+            if predictor.split_wide_crops:
+                new_crops, crop_map, remapped = split_crops(
+                    crops, predictor.critical_ar, predictor.target_ar, predictor.dil_factor,
+                    isinstance(crops[0], np.ndarray),
+                )
+                if remapped:
+                    crops = new_crops
+            samples = list(multithread_exec(pre_processor.sample_transforms, crops))
+            params = next(predictor.model.parameters())
+            preds = []
+            for start in range(0, len(samples), batch_size):
+                batch = pre_processor.normalize(torch.stack(samples[start:start + batch_size], dim=0))
+                batch = batch.to(device=params.device, dtype=params.dtype)
+                preds.extend(predictor.model(batch, return_preds=True)['preds'])
+            if remapped:
+                preds = remap_preds(preds, crop_map, predictor.dil_factor)
+            return preds
+
+    @staticmethod
+    def words_to_dataframe(boxes, preds):
+        """Word table of one tile from its boxes and recognized (value, confidence) pairs"""
+        if not len(boxes):
+            return None
+        return pd.DataFrame({
+            'value': [value for value, _ in preds],
+            'confidence': [float(confidence) for _, confidence in preds],
+            'x1': boxes[:, 0], 'y1': boxes[:, 1], 'x2': boxes[:, 2], 'y2': boxes[:, 3],
+        })
+
+    def free_memory(self):
+        """Release cached accelerator memory after an out-of-memory error"""
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+        elif self.device.type == "mps":
+            torch.mps.empty_cache()
+
+    def available_memory(self):
+        """Free memory on the model's device, in bytes (None: host memory)"""
+        if self.device.type == "cuda":
+            return torch.cuda.mem_get_info(self.device)[0]
+        if self.device.type == "mps":
+            return torch.mps.recommended_max_memory() - torch.mps.driver_allocated_memory()
+        return None
@@ -5,9 +5,14 @@ import cv2
 import numpy as np
 
 
+def to_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
 def find_template_location(image, template):
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+    image = to_gray(image)
+    template = to_gray(template)
     best = None
 
     for scale in np.linspace(0.6, 1.4, 20):
@@ -37,6 +42,13 @@ def is_horizontal(l):
 def is_vertical(l):
     return abs(l[0] - l[2]) < 10
 
+def px(length, scale, odd=False):
+    """A full-resolution pixel length at `scale` (at least 1, odd if asked for)"""
+    n = max(1, int(round(length * scale)))
+    if odd and n % 2 == 0:
+        n += 1
+    return n
+
 def tile_image(img, tile_size=500, overlap=100):
     h, w = img.shape[:2]
     step = tile_size - overlap
@@ -51,16 +63,16 @@ def tile_image(img, tile_size=500, overlap=100):
 
     return tiles
 
-def detect_vertical_lines(tile):
-    bw = cv2.adaptiveThreshold(tile, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 3)
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
+def detect_vertical_lines(tile, scale=1.0):
+    bw = cv2.adaptiveThreshold(tile, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, px(15, scale, odd=True), 3)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, px(40, scale)))
     vertical = cv2.morphologyEx(bw, cv2.MORPH_OPEN, kernel)
-    vertical = cv2.morphologyEx(vertical, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 5)))
-    bridge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 100))
+    vertical = cv2.morphologyEx(vertical, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, px(5, scale))))
+    bridge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (px(3, scale), px(100, scale)))
     vertical = cv2.morphologyEx(vertical, cv2.MORPH_CLOSE, bridge_kernel)
-    extract_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 60))
+    extract_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, px(60, scale)))
     vertical = cv2.morphologyEx(vertical, cv2.MORPH_OPEN, extract_kernel)
-    kernel = np.ones((5, 5), np.uint8)
+    kernel = np.ones((px(5, scale), px(5, scale)), np.uint8)
     vertical = cv2.dilate(vertical, kernel)
     vertical = cv2.erode(vertical, kernel, iterations=3)
     contours, _ = cv2.findContours(
@@ -72,22 +84,22 @@ def detect_vertical_lines(tile):
     final_lines = []
     for cnt in contours:
         x, y, w, h = cv2.boundingRect(cnt)
-        if h > 100 and w < 15:
+        if h > 100 * scale and w < 15 * scale:
             final_lines.append((x + w // 2, y, x + w // 2, y + h))
 
     return final_lines
 
-def detect_horizontal_lines(tile):
-    bw = cv2.adaptiveThreshold(tile, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 3)
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
+def detect_horizontal_lines(tile, scale=1.0):
+    bw = cv2.adaptiveThreshold(tile, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, px(15, scale, odd=True), 3)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (px(40, scale), 1))
 
     horizontal = cv2.morphologyEx(bw, cv2.MORPH_OPEN, kernel)
-    horizontal = cv2.morphologyEx(horizontal, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 1)))
-    bridge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (100, 3))
+    horizontal = cv2.morphologyEx(horizontal, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (px(5, scale), 1)))
+    bridge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (px(100, scale), px(3, scale)))
     horizontal = cv2.morphologyEx(horizontal, cv2.MORPH_CLOSE, bridge_kernel)
-    extract_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (60, 1))
+    extract_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (px(60, scale), 1))
     horizontal = cv2.morphologyEx(horizontal, cv2.MORPH_OPEN, extract_kernel)
-    kernel = np.ones((5, 5), np.uint8)
+    kernel = np.ones((px(5, scale), px(5, scale)), np.uint8)
     horizontal = cv2.dilate(horizontal, kernel)
     horizontal = cv2.erode(horizontal, kernel, iterations=3)
     contours, _ = cv2.findContours(horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -95,27 +107,34 @@ def detect_horizontal_lines(tile):
     final_lines = []
     for cnt in contours:
         x, y, w, h = cv2.boundingRect(cnt)
-        if w > 100 and h < 15:
+        if w > 100 * scale and h < 15 * scale:
             final_lines.append((x, y + h // 2, x + w, y + h // 2))
 
     return final_lines
 
-def detect_lines(tile):
-    return detect_horizontal_lines(tile) + detect_vertical_lines(tile)
-
-def detect_lines_global(img):
-
-    tiles = tile_image(img)
+def detect_lines(tile, scale=1.0):
+    return detect_horizontal_lines(tile, scale) + detect_vertical_lines(tile, scale)
+
+def detect_lines_global(img, level=0):
+    """
+    Lines of the eroded page `img`, which may be pyramid level `level` of
+    the page (downscaled by 2**level, see test_extractor.threshold_lines):
+    tiles, kernels and length filters are scaled to that level and the lines
+    are returned in full-resolution coordinates.
+    """
+    factor = 2 ** level
+    scale = 1 / factor
+    tiles = tile_image(img, tile_size=px(500, scale), overlap=px(100, scale))
     global_lines = []
 
     for tile, offset_x, offset_y in tiles:
-        lines = detect_lines(tile)
+        lines = detect_lines(tile, scale)
         for x1, y1, x2, y2 in lines:
             global_lines.append((
-                x1 + offset_x,
-                y1 + offset_y,
-                x2 + offset_x,
-                y2 + offset_y
+                (x1 + offset_x) * factor,
+                (y1 + offset_y) * factor,
+                (x2 + offset_x) * factor,
+                (y2 + offset_y) * factor
             ))
 
     return global_lines
@@ -156,7 +175,7 @@ def merge_lines(lines, dist_thresh=15):
     return merged
 
 def find_contours(image_cropped):
-    gray = cv2.cvtColor(image_cropped, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(image_cropped)
     inverted_image = cv2.bitwise_not(gray)
     _, thresh = cv2.threshold(inverted_image, 100, 255, 0)
     contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
@@ -197,8 +216,7 @@ def find_matched(image, template, template_val):
     return None
 
 
-def find_template_and_match(source_image):
-    image = source_image.copy()
+def find_template_and_match(image):
     template_vals = {
         "1.png": [3, 100],
         "2.png": [6, 100],
@@ -220,6 +238,7 @@ def find_template_and_match(source_image):
     bboxes = []
     scores = []
     vals = []
+    names = []
     for template in os.listdir("img_templates"):
         r = find_matched(image, f"img_templates/{template}", template_vals[template])
         if r is not None:
@@ -227,15 +246,16 @@ def find_template_and_match(source_image):
             bboxes.append(bbox)
             scores.append(score)
             vals.append(val)
+            names.append(template)
 
     if len(scores) > 0:
         index = np.argmin(scores)
         # # cv2.drawContours(image, [cnt_s[2]], -1, (0, 255, 0), 3)
         # # os.makedirs("data/output", exist_ok=True)
         # # cv2.imwrite(f"data/output/{uuid.uuid4()}.png", image_r)
-        return True, bboxes[index], vals[index]
+        return True, bboxes[index], vals[index], names[index], scores[index]
     else:
-        return False, None, None
+        return False, None, None, None, None
 
 
 def point_inside_bbox(x, y, bbox):
@@ -0,0 +1,133 @@
+"""
+doctr OCR with the detection and recognition networks run by ONNX Runtime
+
+The doctr predictor is built as usual (pre-processing, box and CTC
+post-processing, document builder); only the two network forward passes are
+swapped for onnxruntime sessions on the CPU execution provider. The networks
+are exported once per architecture and doctr version to ONNX_CACHE_DIR and
+reused from there by later processes.
+
+Needs the optional onnx (export) and onnxruntime packages:
+    pip install onnx onnxruntime
+"""
+import logging
+import os
+
+import numpy as np
+import torch
+from torch import nn
+
+import config
+from ocr.doctr import OCR
+
+logger = logging.getLogger(__name__)
+
+OPSET_VERSION = 17
+
+
+def model_path(arch, cache_dir=None):
+    """Cached export of one architecture (the pretrained weights follow the doctr version)"""
+    import doctr
+
+    cache_dir = cache_dir or config.ONNX_CACHE_DIR
+    return os.path.join(cache_dir, f"{arch}-doctr{doctr.__version__}-opset{OPSET_VERSION}.onnx")
+
+
+def export_model(model, input_shape, path):
+    """Export a doctr model's network (input -> logits, dynamic batch size) to `path`"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    model.exportable = True  # forward() returns the raw logits only
+    try:
+        torch.onnx.export(
+            model,
+            torch.rand((1, *input_shape)),
+            tmp_path,
+            input_names=['input'],
+            output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch_size'}, 'logits': {0: 'batch_size'}},
+            opset_version=OPSET_VERSION,
+            export_params=True,
+            dynamo=False,
+        )
+        # Concurrent exports of the same model end with one complete file
+        os.replace(tmp_path, path)
+    finally:
+        model.exportable = False
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Exported {type(model).__name__} to {path}")
+
+
+def create_session(path, threads=None):
+    import onnxruntime as ort
+
+    threads = config.ONNX_THREADS if threads is None else threads
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class OnnxModel(nn.Module):
+    """
+    Stands in for a doctr model inside its predictor. The predictor reads the
+    device/dtype from the first parameter and moves batches there, so a float32
+    CPU placeholder parameter is kept; the post-processing is the torch model's.
+    """
+
+    def __init__(self, session, model):
+        super().__init__()
+        self.session = session
+        self.postprocessor = model.postprocessor
+        self.cfg = getattr(model, 'cfg', None)
+        self.register_parameter('placeholder', nn.Parameter(torch.zeros(1), requires_grad=False))
+
+    def logits(self, x):
+        return self.session.run(['logits'], {'input': x.detach().cpu().numpy()})[0]
+
+
+class OnnxDetectionModel(OnnxModel):
+    def __init__(self, session, model):
+        super().__init__(session, model)
+        self.class_names = model.class_names
+        self.assume_straight_pages = model.assume_straight_pages
+
+    def forward(self, x, return_model_output=False, return_preds=False, **kwargs):
+        prob_map = 1 / (1 + np.exp(-self.logits(x)))
+        out = {}
+        if return_model_output:
+            out['out_map'] = torch.from_numpy(prob_map)
+        out['preds'] = [
+            dict(zip(self.class_names, preds))
+            for preds in self.postprocessor(prob_map.transpose(0, 2, 3, 1))
+        ]
+        return out
+
+
+class OnnxRecognitionModel(OnnxModel):
+    def forward(self, x, return_model_output=False, return_preds=False, **kwargs):
+        logits = torch.from_numpy(self.logits(x))
+        out = {'preds': self.postprocessor(logits)}
+        if return_model_output:
+            out['out_map'] = logits
+        return out
+
+
+class OnnxOCR(OCR):
+    def __init__(self, det_arch='db_resnet50', reco_arch='crnn_vgg16_bn', debug=False, cache_dir=None, threads=None):
+        # The torch predictor provides pre/post-processing and the weights to export; inference stays on CPU
+        super().__init__(det_arch=det_arch, reco_arch=reco_arch, pretrained=True, debug=debug, gpu=False)
+        self.paths = {}
+
+        for name, predictor, arch, wrapper in (
+            ('det', self.model.det_predictor, det_arch, OnnxDetectionModel),
+            ('reco', self.model.reco_predictor, reco_arch, OnnxRecognitionModel),
+        ):
+            path = model_path(arch, cache_dir)
+            if not os.path.exists(path):
+                export_model(predictor.model, predictor.model.cfg['input_shape'], path)
+            self.paths[name] = path
+            # Drops the torch network; only its post-processor is kept
+            predictor.model = wrapper(create_session(path, threads), predictor.model)
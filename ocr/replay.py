@@ -0,0 +1,70 @@
+import time
+
+import pandas as pd
+
+from metrics import stage
+
+
+class ReplayOCR:
+    """
+    Stand-in for ocr.doctr.OCR that replays a recorded word table instead of
+    running the models, so everything around inference can be timed offline.
+
+    The table is tile_ocr output (value, confidence and page-normalized
+    x1, y1, x2, y2, e.g. data/final.csv). For every tile, the words lying
+    fully inside it are returned in tile-normalized coordinates, the way the
+    doctr predictor reports them; tiles without words return None, as the
+    text detector filter does. Overlapping tiles see the same word twice, so
+    deduplicate_ocr does its usual work.
+    """
+
+    def __init__(self, path, latency=0.0, debug=False):
+        self.debug = debug
+        self.latency = latency
+        # OCR values such as "NA" are words, not missing data
+        self.words = pd.read_csv(path, keep_default_na=False, dtype={'value': str})
+        self.tiles = []
+        self.next_tile = 0
+        self.page_words = None
+
+    def start_page(self, shape, tiles):
+        """Called by tile_ocr with the page shape and its tiles, in from_image order"""
+        height, width = shape[:2]
+        self.tiles = tiles
+        self.next_tile = 0
+        self.page_words = pd.DataFrame({
+            'value': self.words['value'],
+            'confidence': self.words['confidence'],
+            'x1': self.words['x1'] * width,
+            'y1': self.words['y1'] * height,
+            'x2': self.words['x2'] * width,
+            'y2': self.words['y2'] * height,
+        })
+
+    def tile_words(self, tile):
+        x, y = tile["x_offset"], tile["y_offset"]
+        tile_h, tile_w = tile["image"].shape[:2]
+        words = self.page_words
+        inside = (
+            (words.x1 >= x) & (words.x2 <= x + tile_w) &
+            (words.y1 >= y) & (words.y2 <= y + tile_h)
+        )
+        if not inside.any():
+            return None
+
+        df = words.loc[inside].reset_index(drop=True)
+        df['x1'] = (df['x1'] - x) / tile_w
+        df['x2'] = (df['x2'] - x) / tile_w
+        df['y1'] = (df['y1'] - y) / tile_h
+        df['y2'] = (df['y2'] - y) / tile_h
+        return df
+
+    def from_image(self, doc):
+        if self.page_words is None:
+            raise Exception("ReplayOCR.start_page must be called before from_image")
+        with stage('recognition'):
+            if self.latency:
+                time.sleep(self.latency * len(doc))
+            tiles = self.tiles[self.next_tile:self.next_tile + len(doc)]
+            self.next_tile += len(doc)
+            return [self.tile_words(tile) for tile in tiles]
@@ -0,0 +1,146 @@
+"""
+Persistent cache of per-tile OCR results
+
+Every sheet of a set repeats its title block, general notes and legend, so
+tile_ocr sees the same tiles page after page and job after job. A tile's
+word table (or None: no text) is stored on disk under a hash of the tile's
+pixels and the identity of the OCR models (model_identity), and a tile that
+hits skips from_image / detect entirely.
+
+Entries are small JSON files, sharded by the first two hex digits of the
+key. The store is bounded by OCR_CACHE_MAX_MB: once it grows past the limit,
+the least recently used entries are removed until it is back under 90% of
+it. Recency is kept in memory (seeded from the file mtimes, which every hit
+refreshes, when the cache opens), so eviction doesn't rescan the directory.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from importlib import metadata
+
+import config
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['value', 'confidence', 'x1', 'y1', 'x2', 'y2']
+# Eviction brings the store down to this fraction of OCR_CACHE_MAX_MB
+EVICT_TO = 0.9
+
+
+def model_identity(backend, det_arch, reco_arch, pooled, device):
+    """
+    What the words of a tile depend on besides its pixels, None for
+    backends whose results are not cacheable (replay). `pooled`: words
+    come from pooled recognition (detect + recognize) instead of
+    from_image; `device`: type of the device the models run on (cpu,
+    cuda, mps), whose kernels round differently.
+    """
+    if backend == 'replay':
+        return None
+    quantize = config.OCR_QUANTIZE if backend == 'doctr' and config.OCR_CPU_OPTIMIZE and device == 'cpu' else 'none'
+    mode = 'pooled' if pooled else 'tile'
+    return f"{backend}:{det_arch}:{reco_arch}:{quantize}:{mode}:{device}:doctr-{metadata.version('python-doctr')}"
+
+
+def tile_key(tile, identity):
+    import numpy as np
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{identity}|{tile.shape}|{tile.dtype}|".encode())
+    digest.update(memoryview(np.ascontiguousarray(tile)))
+    return digest.hexdigest()
+
+
+class TileCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # key -> entry size, least recently used first; the directory is only scanned here
+        entries = sorted((e.stat().st_mtime, e.name[:-len('.json')], e.stat().st_size) for e in self.entries())
+        self.index = OrderedDict((key, size) for _, key, size in entries)
+        self.size = sum(self.index.values())
+
+    def entries(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                yield from (e for e in os.scandir(shard.path) if e.name.endswith('.json'))
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """(True, word DataFrame or None) on a hit, (False, None) on a miss"""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                words = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed behind the index's back (another process, an eviction race)
+            with self.lock:
+                self.size -= self.index.pop(key, 0)
+            return False, None
+        with self.lock:
+            if key in self.index:
+                self.index.move_to_end(key)
+        if words is None:
+            return True, None
+        import pandas as pd
+
+        return True, pd.DataFrame(words, columns=COLUMNS)
+
+    def put(self, key, words):
+        """Store a tile's word DataFrame (or None) from from_image"""
+        data = None if words is None or words.empty else words[COLUMNS].to_dict('list')
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        size = os.path.getsize(tmp_path)
+        with self.lock:
+            os.replace(tmp_path, path)
+            # An overwritten entry (same tile from concurrent pages) no longer counts
+            self.size += size - self.index.pop(key, 0)
+            self.index[key] = size
+            evicted = self.evict() if self.size > self.max_bytes else []
+        for old_key in evicted:
+            try:
+                os.remove(self.path(old_key))
+            except OSError:
+                pass
+        if evicted:
+            logger.info(f"OCR tile cache: evicted {len(evicted)} entries, {self.size / 2**20:.1f} MB left")
+
+    def evict(self):
+        """
+        Drop least recently used entries from the index down to EVICT_TO of
+        the limit (lock held); returns their keys, for the caller to delete
+        the files outside the lock
+        """
+        evicted = []
+        while self.index and self.size > self.max_bytes * EVICT_TO:
+            key, size = self.index.popitem(last=False)
+            self.size -= size
+            evicted.append(key)
+        return evicted
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tile_cache():
+    """Process-wide tile cache, None when config.OCR_CACHE is off"""
+    global _cache
+    if not config.OCR_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TileCache(config.OCR_CACHE_DIR, config.OCR_CACHE_MAX_MB * 2**20)
+        return _cache
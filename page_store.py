@@ -0,0 +1,99 @@
+"""
+Memory-mapped page store for large sheets
+
+Pages are rasterized one at a time by poppler straight into PPM/PGM files in
+the job directory and opened as read-only np.memmap arrays. Tiles, crops and
+line-detection strips are then views of those files, and working images
+(line mask, annotated output) are allocated as .npy memmaps next to them, so
+the OS page cache decides what stays resident instead of the worker's heap.
+"""
+import os
+import shutil
+
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+
+def read_netpbm_header(path):
+    """Parse a binary PGM (P5) / PPM (P6) header -> (width, height, channels, data offset)"""
+    with open(path, 'rb') as f:
+        head = f.read(512)
+
+    tokens = []
+    pos = 0
+    while len(tokens) < 4:
+        # skip whitespace and comments between header tokens
+        while pos < len(head) and head[pos:pos + 1].isspace():
+            pos += 1
+        if head[pos:pos + 1] == b'#':
+            pos = head.index(b'\n', pos) + 1
+            continue
+        start = pos
+        while pos < len(head) and not head[pos:pos + 1].isspace():
+            pos += 1
+        if start == pos:
+            raise ValueError(f"Truncated netpbm header: {path}")
+        tokens.append(head[start:pos])
+
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    if magic not in (b'P5', b'P6') or maxval > 255:
+        raise ValueError(f"Unsupported netpbm file {path}: {magic!r} maxval={maxval}")
+
+    # a single whitespace byte separates the header from the pixel data
+    return width, height, 3 if magic == b'P6' else 1, pos + 1
+
+
+def open_page(path):
+    """Open a rasterized page as a read-only (H, W) or (H, W, 3) uint8 memmap"""
+    width, height, channels, offset = read_netpbm_header(path)
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=shape)
+
+
+class PageStore:
+    """Disk-backed page rasters and working images of one job"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def page_count(pdf_path):
+        return pdfinfo_from_path(pdf_path)["Pages"]
+
+    def rasterize_page(self, pdf_path, page_number, dpi=200, grayscale=False):
+        """Render one page (0-based) of the PDF into the store, returns the page file path"""
+        paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            grayscale=grayscale,
+            first_page=page_number + 1,
+            last_page=page_number + 1,
+            output_folder=self.directory,
+            output_file=f"page{page_number:05d}",
+            paths_only=True,
+        )
+        if not paths:
+            raise RuntimeError(f"pdftoppm produced no output for page {page_number + 1} of {pdf_path}")
+        return paths[0]
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def allocate(self, name, shape, dtype=np.uint8):
+        """Create a writable array backed by a .npy file in the store"""
+        return np.lib.format.open_memmap(self.path(name), mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def remove(self, name):
+        """Delete an allocated array"""
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+    @staticmethod
+    def remove_page(path):
+        """Delete a rasterized page once it has been processed"""
+        if os.path.exists(path):
+            os.remove(path)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,144 @@
+"""
+Opt-in per-job profiling
+
+    with profile_job(job_folder, 'sampling'):
+        ...
+
+Samples the calling thread's Python stack every PROFILE_SAMPLE_INTERVAL
+seconds from a background thread and, in 'cprofile' mode, also runs cProfile
+on it. Files written to the output folder:
+    profile.collapsed  one "frame;frame;frame count" line per unique stack
+                       (flamegraph.pl, speedscope, inferno, ...)
+    profile.txt        top functions by samples (and the cProfile table)
+    profile.pstats     cProfile stats, for pstats / snakeviz ('cprofile' mode)
+
+Callers skip profile_job entirely when profiling is off, so disabled jobs
+carry no profiler at all.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sampling', 'cprofile')
+
+COLLAPSED_FILENAME = 'profile.collapsed'
+SUMMARY_FILENAME = 'profile.txt'
+PSTATS_FILENAME = 'profile.pstats'
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Periodically records the Python stack of one thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"stack-sampler-{thread_id}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    @property
+    def sample_count(self):
+        return sum(self.stacks.values())
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def summary(self, limit=30):
+        """Top functions by self and total (inclusive) samples"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+
+        samples = self.sample_count or 1
+        lines = [f"{self.sample_count} samples every {self.interval * 1000:g} ms", ""]
+        for title, counter in (("self", own), ("total", total)):
+            lines.append(f"{'samples':>8} {'%':>6}  function ({title})")
+            for label, count in counter.most_common(limit):
+                lines.append(f"{count:>8} {100 * count / samples:>5.1f}%  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_job(output_dir, mode=None, interval=None):
+    """
+    Profile the current thread for the duration of the block. Yields a dict
+    that is filled with a summary (mode, samples, file names) on exit.
+    """
+    mode = mode or config.PROFILE_MODE
+    interval = interval or config.PROFILE_SAMPLE_INTERVAL
+    os.makedirs(output_dir, exist_ok=True)
+    info = {'mode': mode, 'samples': 0, 'files': []}
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    profiler = None
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as profiler_error:
+            # Only one deterministic profiler can be active at a time (Python 3.12+)
+            logger.warning(f"cProfile unavailable, sampling only: {profiler_error}")
+            info['mode'] = 'sampling'
+            profiler = None
+
+    sampler.start()
+    try:
+        yield info
+    finally:
+        sampler.stop()
+        if profiler is not None:
+            profiler.disable()
+
+        sampler.write_collapsed(os.path.join(output_dir, COLLAPSED_FILENAME))
+        summary = sampler.summary()
+        info['files'].append(COLLAPSED_FILENAME)
+
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(output_dir, PSTATS_FILENAME))
+            info['files'].append(PSTATS_FILENAME)
+            table = io.StringIO()
+            pstats.Stats(profiler, stream=table).sort_stats('cumulative').print_stats(40)
+            summary += "\ncProfile (sorted by cumulative time)\n" + table.getvalue()
+
+        with open(os.path.join(output_dir, SUMMARY_FILENAME), 'w') as f:
+            f.write(summary)
+        info['files'].append(SUMMARY_FILENAME)
+        info['samples'] = sampler.sample_count
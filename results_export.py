@@ -0,0 +1,77 @@
+"""
+Structured tendon results export
+
+extract_tendons returns one record per TENDON callout. The server stores a
+job's records as JSON in its output folder, and this module turns them into
+flat rows for CSV (streamed) and Parquet downloads.
+"""
+import csv
+import io
+import json
+import os
+
+TENDONS_FILENAME = 'tendons.json'
+PARQUET_FILENAME = 'tendons.parquet'
+
+# One column per scalar, bboxes and line endpoints split into x1..y2
+COLUMNS = [
+    'page', 'tendon_idx', 'text', 'banded',
+    'indicator_x1', 'indicator_y1', 'indicator_x2', 'indicator_y2',
+    'template', 'contour_score', 'template_match_score',
+    'template_x1', 'template_y1', 'template_x2', 'template_y2',
+    'line_x1', 'line_y1', 'line_x2', 'line_y2',
+]
+
+
+def flatten_record(record):
+    row = {
+        'page': record['page'],
+        'tendon_idx': record['tendon_idx'],
+        'text': record['text'],
+        'banded': record['banded'],
+        'template': record['template'],
+        'contour_score': record['contour_score'],
+        'template_match_score': record['template_match_score'],
+    }
+    for prefix, key in (('indicator', 'indicator_bbox'), ('template', 'template_bbox'), ('line', 'line')):
+        values = record[key] or [None] * 4
+        for name, value in zip(('x1', 'y1', 'x2', 'y2'), values):
+            row[f'{prefix}_{name}'] = value
+    return row
+
+
+def save_records(job_folder, records):
+    with open(os.path.join(job_folder, TENDONS_FILENAME), 'w') as f:
+        json.dump(records, f)
+
+
+def load_records(job_folder):
+    with open(os.path.join(job_folder, TENDONS_FILENAME)) as f:
+        return json.load(f)
+
+
+def iter_csv(records, rows_per_chunk=500):
+    """Yield the CSV export in chunks so large result sets stream to the client"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for i, record in enumerate(records, start=1):
+        writer.writerow(flatten_record(record))
+        if i % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_parquet(job_folder, records):
+    """Write the Parquet export once per job (needs pyarrow or fastparquet)"""
+    path = os.path.join(job_folder, PARQUET_FILENAME)
+    if not os.path.exists(path):
+        import pandas as pd
+
+        df = pd.DataFrame([flatten_record(r) for r in records], columns=COLUMNS)
+        tmp_path = path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
@@ -3,53 +3,43 @@ Combined server that serves both the HTML frontend and the API backend
 This eliminates CORS issues by serving everything from the same origin
 """
 import os
+import json
+import time
 import uuid
 import threading
 import logging
+import queue
 import traceback
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import zipfile
+from contextlib import contextmanager, nullcontext
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-import numpy as np
-from pdf2image import convert_from_path
-import cv2
-import torch
-from main import tile_ocr
-from test_extractor import extract_tendons
+from http_cache import compress_response, file_etag, send_immutable
+from results_export import save_records, load_records, iter_csv, write_parquet
+from incremental import PAGES_FILENAME
+from metrics import Gauge, StageTimings, collect, stage, observe_page, render_prometheus
+from profiling import MODES as PROFILE_MODES, profile_job
+from memory import MemoryTracker, rss_bytes
+from logging_setup import configure_logging, log_context, bind_log_context
+from model_loader import ModelLoader
 import config
 
-# Configure logging using config values
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config.LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging using config values (queued: worker threads never block on log I/O)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Detect GPU availability
-def detect_gpu():
-    """Detect if GPU is available (CUDA or MPS for Apple Silicon)"""
-    if not config.USE_GPU:
-        logger.info("GPU disabled in config - Using CPU")
-        return False
-
-    if torch.cuda.is_available():
-        logger.info("Using CUDA GPU")
-        return True
-    elif torch.backends.mps.is_available() and torch.backends.mps.is_built():
-        logger.info("Using MPS (Apple Silicon GPU)")
-        return True
-    else:
-        logger.info("No GPU available - Using CPU")
-        return False
-
-GPU_AVAILABLE = detect_gpu()
+# torch, doctr, cv2 and pandas are imported by the model loader thread, not here,
+# so the server starts serving (and answering /healthz) right away
+model_loader = ModelLoader()
 
 app = Flask(__name__, static_folder='.')
 CORS(app)
+app.after_request(compress_response)
+# Request bodies are rejected (413) past one PDF and its form; /api/batch raises its own limit
+FORM_OVERHEAD = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_FILE_SIZE + FORM_OVERHEAD
 
 # Use configuration values
 UPLOAD_FOLDER = config.UPLOAD_FOLDER
@@ -61,197 +51,601 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 # Store job status in memory (use Redis/DB for production)
 jobs = {}
+# Batch submissions: their child job ids, by batch id
+batches = {}
+# Child jobs of all batches, run PAGE_WORKERS at a time by daemon threads started with the first batch
+batch_queue = queue.SimpleQueue()
+batch_workers = []
+batch_workers_lock = threading.Lock()
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Bumped on every job update; event streams wait on the condition instead of clients polling
+job_versions = {}
+job_updated = threading.Condition()
+
+def update_job(job_id, **fields):
+    """Update a job's status fields and wake up its event streams"""
+    with job_updated:
+        jobs[job_id].update(fields)
+        job_versions[job_id] = job_versions.get(job_id, 0) + 1
+        job_updated.notify_all()
 
-def process_pdf(job_id, filepath):
-    """Background task to process PDF"""
+# Processing slots shared by the pages of all jobs: batch children and single
+# uploads interleave page by page instead of each job taking its own worker
+page_slots = threading.BoundedSemaphore(config.PAGE_WORKERS)
+
+@contextmanager
+def page_slot(job_id):
+    """Hold one processing slot while a page is processed"""
+    if not page_slots.acquire(blocking=False):
+        update_job(job_id, message='Waiting for a free worker...')
+        page_slots.acquire()
     try:
-        logger.info(f"[Job {job_id}] ========== STARTING PDF PROCESSING ==========")
-        logger.info(f"[Job {job_id}] File path: {filepath}")
-        logger.info(f"[Job {job_id}] File exists: {os.path.exists(filepath)}")
-        logger.info(f"[Job {job_id}] File size: {os.path.getsize(filepath)} bytes")
+        yield
+    finally:
+        page_slots.release()
+
+def count_jobs_by_status():
+    counts = {(status,): 0 for status in ('queued', 'processing', 'completed', 'failed')}
+    for job in list(jobs.values()):
+        counts[(job['status'],)] = counts.get((job['status'],), 0) + 1
+    return counts
 
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['message'] = 'Converting PDF to images...'
+# Queue depth, read from the in-memory job table at scrape time
+Gauge('pts_jobs', 'Jobs by status', ('status',), callback=count_jobs_by_status)
+Gauge('pts_process_rss_bytes', 'Resident memory of the server process', callback=lambda: {(): rss_bytes()})
 
-        # Convert PDF to images using configured DPI
-        logger.info(f"[Job {job_id}] STEP 1: Converting PDF to images at {config.PDF_DPI} DPI...")
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def process_pdf(job_id, filepath, profile=None, det_arch=None, reco_arch=None, previous_job_id=None, track_memory=None):
+    """
+    Background task to process PDF, profiled when `profile` names a profiling
+    mode. `det_arch` / `reco_arch` select the OCR models (config defaults otherwise).
+    With `previous_job_id` (update job), pages unchanged since that job reuse its results.
+    `track_memory` overrides config.MEMORY_TRACKING for this job.
+    """
+    # Per-stage timings for this job, also feeding the process-wide /metrics histograms
+    memory = MemoryTracker() if (config.MEMORY_TRACKING if track_memory is None else track_memory) else None
+    timings = StageTimings(memory=memory)
+    # Profiling is opt-in; unprofiled jobs don't start a profiler at all
+    profiler = profile_job(os.path.join(OUTPUT_FOLDER, job_id), profile) if profile else nullcontext()
+    with collect(timings), profiler as profile_info, log_context(job_id=job_id):
+        store = None
         try:
-            if config.PDF_DPI == 200:  # Default DPI
-                images = convert_from_path(filepath)
-            else:
-                images = convert_from_path(filepath, dpi=config.PDF_DPI)
-            total_pages = len(images)
-            logger.info(f"[Job {job_id}] ✅ PDF converted successfully to {total_pages} images")
-            logger.info(f"[Job {job_id}] First image type: {type(images[0])}")
-            logger.info(f"[Job {job_id}] First image size: {images[0].size}")
-            logger.info(f"[Job {job_id}] First image mode: {images[0].mode}")
-        except Exception as pdf_error:
-            logger.error(f"[Job {job_id}] ❌ PDF conversion failed: {str(pdf_error)}")
-            logger.error(f"[Job {job_id}] PDF conversion traceback: {traceback.format_exc()}")
-            raise
-
-        jobs[job_id]['total_pages'] = total_pages
-
-        results = []
-
-        for page_num, image in enumerate(images):
-            logger.info(f"[Job {job_id}] ========== PROCESSING PAGE {page_num + 1}/{total_pages} ==========")
-            jobs[job_id]['current_page'] = page_num + 1
-
-            # Calculate base progress for this page (each page gets equal share)
-            page_base_progress = (page_num / total_pages) * 100
-            page_progress_range = 100 / total_pages
-
-            # Step 1: PDF to image conversion (already done, 5% of page progress)
-            jobs[job_id]['message'] = f'Converting page {page_num + 1} to image...'
-            jobs[job_id]['progress'] = page_base_progress + (page_progress_range * 0.05)
-
-            # Convert PIL image to numpy array
-            logger.info(f"[Job {job_id}] STEP 2: Converting PIL image to numpy array...")
-            try:
-                img_array = np.array(image)
-                logger.info(f"[Job {job_id}] ✅ Image converted to numpy array")
-                logger.info(f"[Job {job_id}] Array shape: {img_array.shape}")
-                logger.info(f"[Job {job_id}] Array dtype: {img_array.dtype}")
-                logger.info(f"[Job {job_id}] Array min/max values: {img_array.min()}/{img_array.max()}")
-            except Exception as array_error:
-                logger.error(f"[Job {job_id}] ❌ Array conversion failed: {str(array_error)}")
-                logger.error(f"[Job {job_id}] Array conversion traceback: {traceback.format_exc()}")
-                raise
+            logger.info(f"[Job {job_id}] ========== STARTING PDF PROCESSING ==========")
+            logger.info(f"[Job {job_id}] File path: {filepath}")
+            logger.debug(f"[Job {job_id}] File size: {os.path.getsize(filepath)} bytes")
 
-            # Step 2: Run OCR with progress tracking (10% to 80% of page progress)
-            jobs[job_id]['message'] = f'Running OCR on page {page_num + 1}...'
-            jobs[job_id]['progress'] = page_base_progress + (page_progress_range * 0.10)
+            if not model_loader.done.is_set():
+                update_job(job_id, message='Waiting for models to load...')
+            if not model_loader.wait():
+                raise Exception(f"Model initialization failed: {model_loader.error}")
 
-            logger.info(f"[Job {job_id}] STEP 3: Running OCR...")
-            logger.info(f"[Job {job_id}] OCR parameters: GPU={GPU_AVAILABLE}, batch_size={config.OCR_BATCH_SIZE}")
+            # Already imported by the model loader
+            from main import run_ocr
+            from text_layer import baseline_key, page_words, record_ocr, estimated_ocr_seconds
+            from ocr.backends import is_loaded
+            from vector_lines import page_lines
+            from incremental import page_fingerprint, previous_pages, processing_settings, reuse_page, save_pages
+            from test_extractor import extract_tendons
+            from page_store import PageStore, open_page
+            from image_output import EXTENSIONS, write_image, write_preview, write_pyramid
 
-            def ocr_progress_callback(current_batch, total_batches):
-                """Update progress during OCR processing"""
-                ocr_progress = (current_batch / total_batches) * 0.70  # OCR takes 70% of page progress
-                jobs[job_id]['progress'] = page_base_progress + (page_progress_range * (0.10 + ocr_progress))
-                jobs[job_id]['message'] = f'Running OCR on page {page_num + 1} (batch {current_batch}/{total_batches})...'
-                logger.info(f"[Job {job_id}] OCR progress: {current_batch}/{total_batches} batches")
+            # Pages and working images live as memmaps in the job directory
+            store = PageStore(os.path.join(OUTPUT_FOLDER, job_id, 'pages'))
 
+            update_job(job_id, status='processing', message='Reading PDF...')
+
+            logger.info(f"[Job {job_id}] STEP 1: Reading PDF page count...")
             try:
-                ocr_result = tile_ocr(img_array, gpu=GPU_AVAILABLE, batch_size=config.OCR_BATCH_SIZE, progress_callback=ocr_progress_callback)
-                logger.info(f"[Job {job_id}] ✅ OCR completed successfully")
-                logger.info(f"[Job {job_id}] OCR result type: {type(ocr_result)}")
-
-                # Check if it's a DataFrame
-                if hasattr(ocr_result, 'shape'):
-                    logger.info(f"[Job {job_id}] OCR result shape: {ocr_result.shape}")
-                if hasattr(ocr_result, 'columns'):
-                    logger.info(f"[Job {job_id}] OCR result columns: {list(ocr_result.columns)}")
-                if hasattr(ocr_result, '__len__'):
-                    logger.info(f"[Job {job_id}] OCR result length: {len(ocr_result)}")
-
-                # Log first few rows if it's a DataFrame
-                if hasattr(ocr_result, 'head'):
-                    logger.info(f"[Job {job_id}] OCR result preview:\n{ocr_result.head()}")
-
-            except Exception as ocr_error:
-                logger.error(f"[Job {job_id}] ❌ OCR failed: {str(ocr_error)}")
-                logger.error(f"[Job {job_id}] OCR error type: {type(ocr_error).__name__}")
-                logger.error(f"[Job {job_id}] OCR traceback:\n{traceback.format_exc()}")
+                total_pages = store.page_count(filepath)
+                logger.info(f"[Job {job_id}] ✅ PDF has {total_pages} pages")
+            except Exception as pdf_error:
+                logger.error(f"[Job {job_id}] ❌ PDF info failed: {str(pdf_error)}")
+                logger.error(f"[Job {job_id}] PDF info traceback: {traceback.format_exc()}")
                 raise
 
-            # Step 3: Extract tendons and draw annotations (80% to 95% of page progress)
-            jobs[job_id]['message'] = f'Extracting tendons from page {page_num + 1}...'
-            jobs[job_id]['progress'] = page_base_progress + (page_progress_range * 0.80)
+            update_job(job_id, total_pages=total_pages)
 
-            # NOTE: Passing img_array directly (RGB format) to match main.py behavior
-            logger.info(f"[Job {job_id}] STEP 4: Extracting tendons and drawing annotations...")
-            logger.info(f"[Job {job_id}] Calling extract_tendons(ocr_result, img_array)...")
-            logger.info(f"[Job {job_id}] Parameter 1 (ocr_result) type: {type(ocr_result)}")
-            logger.info(f"[Job {job_id}] Parameter 2 (img_array) type: {type(img_array)}, shape: {img_array.shape}")
+            job_folder = os.path.join(OUTPUT_FOLDER, job_id)
+            settings = processing_settings(
+                det_arch or config.OCR_DET_ARCH, reco_arch or config.OCR_RECO_ARCH, model_loader.gpu
+            )
+            ocr_baseline = baseline_key(settings['det_arch'], settings['reco_arch'], model_loader.gpu)
+            # Update job: pages of the previous job by fingerprint
+            reusable = {}
+            if previous_job_id:
+                reusable = previous_pages(os.path.join(OUTPUT_FOLDER, previous_job_id), settings)
+                if reusable is None:
+                    logger.warning(f"[Job {job_id}] Job {previous_job_id} ran with other settings, reprocessing all pages")
+                    reusable = {}
+                else:
+                    logger.info(f"[Job {job_id}] Update of job {previous_job_id}: {len(reusable)} pages can be reused")
 
-            try:
-                output_img = extract_tendons(ocr_result, img_array)
-                logger.info(f"[Job {job_id}] ✅ Tendon extraction completed successfully")
-                logger.info(f"[Job {job_id}] Output image type: {type(output_img)}")
-                logger.info(f"[Job {job_id}] Output image shape: {output_img.shape if hasattr(output_img, 'shape') else 'N/A'}")
-            except Exception as extract_error:
-                logger.error(f"[Job {job_id}] ❌ Tendon extraction failed: {str(extract_error)}")
-                logger.error(f"[Job {job_id}] Error type: {type(extract_error).__name__}")
-                logger.error(f"[Job {job_id}] Error message: {str(extract_error)}")
-                logger.error(f"[Job {job_id}] Full traceback:\n{traceback.format_exc()}")
-                raise
+            results = []
+            tendons = []
+            # Fingerprint, result and tendons of every page, stored for later update jobs
+            pages = []
+            reused_pages = []
+            # Batch size run_ocr started with and settled on, per page
+            ocr_batching = []
+            # Where each page's words came from, and the OCR time the text layer saved
+            text_layer = []
+            ocr_seconds_saved = 0.0
+            # Tiles answered by the OCR tile cache over the job
+            ocr_cache = {'hits': 0, 'misses': 0, 'hit_rate': None}
 
-            # Step 4: Save output image (95% to 100% of page progress)
-            jobs[job_id]['message'] = f'Saving results for page {page_num + 1}...'
-            jobs[job_id]['progress'] = page_base_progress + (page_progress_range * 0.95)
-            logger.info(f"[Job {job_id}] STEP 5: Saving output image...")
-            output_filename = f"{job_id}_page_{page_num}.png"
-            output_path = os.path.join(OUTPUT_FOLDER, job_id, output_filename)
+            for page_num in range(total_pages):
+                # Pages of all jobs (and batches) share PAGE_WORKERS processing slots
+                with page_slot(job_id):
+                    bind_log_context(page=page_num + 1)
+                    logger.info(f"[Job {job_id}] ========== PROCESSING PAGE {page_num + 1}/{total_pages} ==========")
+                    update_job(job_id, current_page=page_num + 1)
+                    if memory is not None:
+                        memory.page_started(page_num)
 
-            logger.info(f"[Job {job_id}] Output filename: {output_filename}")
-            logger.info(f"[Job {job_id}] Output path: {output_path}")
-            logger.info(f"[Job {job_id}] Creating output directory...")
+                    # Calculate base progress for this page (each page gets equal share)
+                    page_base_progress = (page_num / total_pages) * 100
+                    page_progress_range = 100 / total_pages
 
-            try:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                logger.info(f"[Job {job_id}] ✅ Output directory created/verified")
-            except Exception as dir_error:
-                logger.error(f"[Job {job_id}] ❌ Directory creation failed: {str(dir_error)}")
-                logger.error(f"[Job {job_id}] Directory creation traceback: {traceback.format_exc()}")
-                raise
+                    # Step 1: PDF to image conversion (5% of page progress)
+                    update_job(
+                        job_id,
+                        message=f'Converting page {page_num + 1} to image...',
+                        progress=page_base_progress + (page_progress_range * 0.05)
+                    )
 
-            logger.info(f"[Job {job_id}] Writing image file...")
-            try:
-                # output_img is already in BGR format from extract_tendons
-                success = cv2.imwrite(output_path, output_img)
-                if success:
-                    logger.info(f"[Job {job_id}] ✅ Image saved successfully")
-                    logger.info(f"[Job {job_id}] Saved file size: {os.path.getsize(output_path)} bytes")
-                else:
-                    logger.error(f"[Job {job_id}] ❌ cv2.imwrite returned False")
-                    raise Exception("cv2.imwrite failed to save image")
-            except Exception as save_error:
-                logger.error(f"[Job {job_id}] ❌ Save failed: {str(save_error)}")
-                logger.error(f"[Job {job_id}] Save traceback: {traceback.format_exc()}")
-                raise
+                    # Rasterize the page into the page store and map it as a numpy array
+                    logger.info(f"[Job {job_id}] STEP 2: Rasterizing page at {config.PDF_DPI} DPI into the page store...")
+                    try:
+                        with stage('rasterize'):
+                            page_path = store.rasterize_page(filepath, page_num, dpi=config.PDF_DPI, grayscale=config.GRAYSCALE_MODE)
+                            img_array = open_page(page_path)
+                        logger.info(f"[Job {job_id}] ✅ Page rasterized to {page_path}, shape {img_array.shape}")
+                        if memory is not None:
+                            memory.record_array('page', img_array.nbytes)
+                        # Full scans of the page: only when DEBUG is enabled
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"[Job {job_id}] Array dtype: {img_array.dtype}")
+                            logger.debug(f"[Job {job_id}] Array min/max values: {img_array.min()}/{img_array.max()}")
+                    except Exception as array_error:
+                        logger.error(f"[Job {job_id}] ❌ Page rasterization failed: {str(array_error)}")
+                        logger.error(f"[Job {job_id}] Page rasterization traceback: {traceback.format_exc()}")
+                        raise
+
+                    with stage('fingerprint'):
+                        fingerprint = page_fingerprint(img_array)
+                    previous_page = reusable.get(fingerprint)
+                    if previous_page is not None:
+                        # Unchanged since the previous job: take over its output files and results
+                        with stage('reuse_page'):
+                            page_result, page_tendons = reuse_page(
+                                os.path.join(OUTPUT_FOLDER, previous_job_id), previous_job_id, previous_page,
+                                job_folder, job_id, page_num
+                            )
+                        del img_array
+                        store.remove_page(page_path)
+                        results.append(page_result)
+                        tendons.extend(page_tendons)
+                        pages.append({'fingerprint': fingerprint, 'result': page_result, 'tendons': page_tendons})
+                        reused_pages.append({'page': page_num + 1, 'from_page': page_result['reused_from']['page'] + 1})
+                        update_job(job_id, reused_pages=list(reused_pages), metrics=timings.to_dict())
+                        if memory is not None:
+                            memory.page_finished()
+                        logger.info(
+                            f"[Job {job_id}] ✅ Page unchanged since job {previous_job_id} "
+                            f"(page {page_result['reused_from']['page'] + 1}), results reused"
+                        )
+                        logger.info(f"[Job {job_id}] ========== PAGE {page_num + 1} COMPLETE ==========")
+                        continue
+
+                    # Pages exported from CAD: words straight from the PDF's text layer, no OCR
+                    ocr_result = None
+                    text_stats = {}
+                    if config.USE_TEXT_LAYER:
+                        text_start = time.perf_counter()
+                        with stage('text_layer'):
+                            ocr_result = page_words(filepath, page_num, stats=text_stats)
+                        text_seconds = time.perf_counter() - text_start
+
+                    if ocr_result is not None:
+                        source = 'text_layer'
+                        ocr_stats = {'tiles': 0, 'words': len(ocr_result)}
+                        # OCR time this page would have taken, from the stored baseline of this OCR configuration
+                        estimate = estimated_ocr_seconds(img_array.shape, ocr_baseline)
+                        seconds_saved = None if estimate is None else round(max(0.0, estimate - text_seconds), 2)
+                        if seconds_saved is not None:
+                            ocr_seconds_saved += seconds_saved
+                        logger.info(
+                            f"[Job {job_id}] ✅ Text layer used instead of OCR: {len(ocr_result)} words in {text_seconds:.2f}s"
+                            f" (OCR time saved: {'unknown, no OCR baseline yet' if seconds_saved is None else f'~{seconds_saved}s'})"
+                        )
+                    else:
+                        if config.USE_TEXT_LAYER:
+                            logger.info(f"[Job {job_id}] Text layer not usable ({text_stats['text_layer_fallback']}), running OCR")
+                        source, seconds_saved = 'ocr', None
+                        # Step 2: Run OCR with progress tracking (10% to 80% of page progress)
+                        update_job(
+                            job_id,
+                            message=f'Running OCR on page {page_num + 1}...',
+                            progress=page_base_progress + (page_progress_range * 0.10)
+                        )
+
+                        logger.info(f"[Job {job_id}] STEP 3: Running OCR...")
+                        logger.info(f"[Job {job_id}] OCR parameters: GPU={model_loader.gpu}, batch_size={config.OCR_BATCH_SIZE}, models={det_arch}+{reco_arch}")
+
+                        def ocr_progress_callback(done, total):
+                            """Update progress during OCR processing"""
+                            ocr_progress = (done / total) * 0.70  # OCR takes 70% of page progress
+                            update_job(
+                                job_id,
+                                progress=page_base_progress + (page_progress_range * (0.10 + ocr_progress)),
+                                message=f'Running OCR on page {page_num + 1} ({done * 100 // total}%)...'
+                            )
+                            logger.debug(f"[Job {job_id}] OCR progress: {done}/{total}")
+
+                        try:
+                            ocr_stats = {}
+                            # Only timings of loaded models feed the text layer's OCR baseline (not a lazy load)
+                            record_baseline = config.USE_TEXT_LAYER and model_loader.state == 'ready' and is_loaded(
+                                gpu=model_loader.gpu, det_arch=det_arch, reco_arch=reco_arch
+                            )
+                            ocr_start = time.perf_counter()
+                            with stage('ocr'):
+                                ocr_result = run_ocr(
+                                    img_array,
+                                    gpu=model_loader.gpu,
+                                    batch_size=config.OCR_BATCH_SIZE,
+                                    progress_callback=ocr_progress_callback,
+                                    stats=ocr_stats,
+                                    det_arch=det_arch,
+                                    reco_arch=reco_arch
+                                )
+                            # Pages partly served by the tile cache would understate the OCR time
+                            if record_baseline and not ocr_stats.get('cache_hits'):
+                                record_ocr(img_array.shape, time.perf_counter() - ocr_start, ocr_baseline)
+                            logger.info(f"[Job {job_id}] ✅ OCR completed successfully: {ocr_stats['words']} words from {ocr_stats['tiles']} tiles")
+                            logger.info(
+                                f"[Job {job_id}] OCR batch size: {ocr_stats['initial_batch_size']} -> {ocr_stats['batch_size']}"
+                                f" ({ocr_stats['oom_retries']} out-of-memory retries)"
+                            )
+                            ocr_batching.append({
+                                'page': page_num + 1,
+                                'initial_batch_size': ocr_stats['initial_batch_size'],
+                                'batch_size': ocr_stats['batch_size'],
+                                'oom_retries': ocr_stats['oom_retries'],
+                            })
+                            update_job(job_id, ocr_batching=list(ocr_batching))
+                            if 'cache_hits' in ocr_stats:
+                                ocr_cache['hits'] += ocr_stats['cache_hits']
+                                ocr_cache['misses'] += ocr_stats['cache_misses']
+                                ocr_cache['hit_rate'] = round(ocr_cache['hits'] / max(ocr_cache['hits'] + ocr_cache['misses'], 1), 4)
+                                logger.info(
+                                    f"[Job {job_id}] OCR tile cache: {ocr_stats['cache_hits']} hits, {ocr_stats['cache_misses']} misses"
+                                    f" (job hit rate {ocr_cache['hit_rate']:.1%})"
+                                )
+                                update_job(job_id, ocr_cache=dict(ocr_cache))
+                            if memory is not None:
+                                memory.record_array('ocr_batch', ocr_stats['max_batch_bytes'])
+
+                            # DataFrame formatting is not free: only when DEBUG is enabled
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug(f"[Job {job_id}] OCR result shape: {ocr_result.shape}")
+                                logger.debug(f"[Job {job_id}] OCR result columns: {list(ocr_result.columns)}")
+                                logger.debug(f"[Job {job_id}] OCR result preview:\n{ocr_result.head()}")
+
+                        except Exception as ocr_error:
+                            logger.error(f"[Job {job_id}] ❌ OCR failed: {str(ocr_error)}")
+                            logger.error(f"[Job {job_id}] OCR error type: {type(ocr_error).__name__}")
+                            logger.error(f"[Job {job_id}] OCR traceback:\n{traceback.format_exc()}")
+                            raise
+
+                    text_layer.append({
+                        'page': page_num + 1,
+                        'source': source,
+                        'text_layer_words': text_stats.get('text_layer_words'),
+                        'fallback': text_stats.get('text_layer_fallback'),
+                        'ocr_seconds_saved': seconds_saved,
+                    })
+                    update_job(job_id, text_layer=list(text_layer), ocr_seconds_saved=round(ocr_seconds_saved, 2))
+
+                    # Step 3: Extract tendons and draw annotations (80% to 95% of page progress)
+                    update_job(
+                        job_id,
+                        message=f'Extracting tendons from page {page_num + 1}...',
+                        progress=page_base_progress + (page_progress_range * 0.80)
+                    )
+
+                    # NOTE: Passing img_array directly (RGB, or single-channel in GRAYSCALE_MODE) to match main.py behavior
+                    logger.info(f"[Job {job_id}] STEP 4: Extracting tendons and drawing annotations...")
+
+                    # Vector pages: lines straight from the PDF's drawing operators, no raster detection
+                    vector_stats = {}
+                    lines = None
+                    if config.USE_VECTOR_LINES:
+                        with stage('vector_lines'):
+                            lines = page_lines(filepath, page_num, img_array.shape, stats=vector_stats)
+                        if lines is not None:
+                            logger.info(f"[Job {job_id}] ✅ {len(lines)} vector lines read from the PDF")
+                        else:
+                            logger.info(f"[Job {job_id}] Vector lines not usable ({vector_stats['vector_lines_fallback']}), detecting lines in the raster")
 
-            results.append({
-                'page': page_num,
-                'filename': output_filename,
-                'tendon_count': 0  # extract_tendons doesn't return count, just annotated image
-            })
-            logger.info(f"[Job {job_id}] ✅ Page {page_num + 1} completed successfully")
-            logger.info(f"[Job {job_id}] ========== PAGE {page_num + 1} COMPLETE ==========\n")
-
-        logger.info(f"[Job {job_id}] ========== ALL PAGES PROCESSED ==========")
-        jobs[job_id]['status'] = 'completed'
-        jobs[job_id]['message'] = 'Processing complete!'
-        jobs[job_id]['progress'] = 100
-        jobs[job_id]['results'] = results
-        logger.info(f"[Job {job_id}] ✅ SUCCESS: All {len(results)} pages processed successfully")
-        logger.info(f"[Job {job_id}] Results: {results}")
-
-    except Exception as e:
-        error_msg = str(e)
-        error_type = type(e).__name__
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['message'] = f'Error: {error_msg}'
-        logger.error(f"[Job {job_id}] ========== PROCESSING FAILED ==========")
-        logger.error(f"[Job {job_id}] ❌ Error type: {error_type}")
-        logger.error(f"[Job {job_id}] ❌ Error message: {error_msg}")
-        logger.error(f"[Job {job_id}] ❌ Full traceback:\n{traceback.format_exc()}")
-        logger.error(f"[Job {job_id}] ========== END ERROR LOG ==========\n")
+                    try:
+                        with stage('extract_tendons'):
+                            output_img, page_tendons = extract_tendons(ocr_result, img_array, store=store, lines=lines)
+                        for record in page_tendons:
+                            record['page'] = page_num
+                        tendons.extend(page_tendons)
+                        if memory is not None:
+                            memory.record_array('vis', output_img.nbytes)
+                        logger.info(f"[Job {job_id}] ✅ Tendon extraction completed successfully: {len(page_tendons)} tendons")
+                        logger.debug(f"[Job {job_id}] Output image shape: {output_img.shape}")
+                    except Exception as extract_error:
+                        logger.error(f"[Job {job_id}] ❌ Tendon extraction failed: {str(extract_error)}")
+                        logger.error(f"[Job {job_id}] Error type: {type(extract_error).__name__}")
+                        logger.error(f"[Job {job_id}] Error message: {str(extract_error)}")
+                        logger.error(f"[Job {job_id}] Full traceback:\n{traceback.format_exc()}")
+                        raise
+
+                    # Step 4: Save output image (95% to 100% of page progress)
+                    update_job(
+                        job_id,
+                        message=f'Saving results for page {page_num + 1}...',
+                        progress=page_base_progress + (page_progress_range * 0.95)
+                    )
+                    logger.info(f"[Job {job_id}] STEP 5: Saving output image...")
+                    page_name = f"{job_id}_page_{page_num}"
+                    output_filename = f"{page_name}.{EXTENSIONS[config.OUTPUT_FORMAT]}"
+                    output_path = os.path.join(OUTPUT_FOLDER, job_id, output_filename)
+
+                    logger.debug(f"[Job {job_id}] Output path: {output_path}")
+
+                    try:
+                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    except Exception as dir_error:
+                        logger.error(f"[Job {job_id}] ❌ Directory creation failed: {str(dir_error)}")
+                        logger.error(f"[Job {job_id}] Directory creation traceback: {traceback.format_exc()}")
+                        raise
+
+                    try:
+                        # output_img is already in BGR format from extract_tendons
+                        with stage('encode'):
+                            write_image(output_path, output_img)
+                        logger.info(f"[Job {job_id}] ✅ Image saved successfully: {output_filename}")
+                        logger.debug(f"[Job {job_id}] Saved file size: {os.path.getsize(output_path)} bytes")
+                    except Exception as save_error:
+                        logger.error(f"[Job {job_id}] ❌ Save failed: {str(save_error)}")
+                        logger.error(f"[Job {job_id}] Save traceback: {traceback.format_exc()}")
+                        raise
+
+                    page_result = {
+                        'page': page_num,
+                        'filename': output_filename,
+                        'width': output_img.shape[1],
+                        'height': output_img.shape[0],
+                        'tendon_count': len(page_tendons),
+                        'tile_count': ocr_stats['tiles'],
+                        'word_count': ocr_stats['words'],
+                        'text_source': source,
+                        'line_source': 'raster' if lines is None else 'vector'
+                    }
+
+                    if config.OUTPUT_TILE_PYRAMID:
+                        logger.info(f"[Job {job_id}] Writing preview and tile pyramid...")
+                        try:
+                            page_result['preview'] = f"{page_name}_preview.jpg"
+                            page_result['dzi'] = f"{page_name}.dzi"
+                            with stage('pyramid'):
+                                write_preview(os.path.join(job_folder, page_result['preview']), output_img)
+                                levels = write_pyramid(os.path.join(job_folder, page_result['dzi']), output_img)
+                            logger.info(f"[Job {job_id}] ✅ Tile pyramid saved ({levels} levels)")
+                        except Exception as pyramid_error:
+                            logger.error(f"[Job {job_id}] ❌ Tile pyramid failed: {str(pyramid_error)}")
+                            logger.error(f"[Job {job_id}] Tile pyramid traceback: {traceback.format_exc()}")
+                            raise
+
+                    if memory is not None:
+                        memory.capture_allocations()
+
+                    # Drop this page's memmaps before the next page is rasterized
+                    del img_array, output_img
+                    store.remove('vis')
+                    store.remove_page(page_path)
+
+                    results.append(page_result)
+                    pages.append({'fingerprint': fingerprint, 'result': page_result, 'tendons': page_tendons})
+                    observe_page(tiles=ocr_stats['tiles'], words=ocr_stats['words'], tendons=len(page_tendons))
+                    update_job(job_id, metrics=timings.to_dict())
+                    if memory is not None:
+                        page_memory = memory.page_finished()
+                        logger.info(
+                            f"[Job {job_id}] Memory page {page_num + 1}: peak RSS {page_memory['peak_rss_mb']} MB "
+                            f"(start {page_memory['rss_start_mb']} MB, end {page_memory['rss_end_mb']} MB), "
+                            f"arrays MB: {page_memory['arrays_mb']}"
+                        )
+                        for allocation in page_memory.get('top_allocations', []):
+                            logger.info(f"[Job {job_id}]   {allocation['size_mb']} MB in {allocation['count']} blocks at {allocation['site']}")
+                        update_job(job_id, memory=memory.to_dict())
+                    logger.info(f"[Job {job_id}] ========== PAGE {page_num + 1} COMPLETE ==========")
+
+            logger.info(f"[Job {job_id}] ========== ALL PAGES PROCESSED ==========")
+            os.makedirs(job_folder, exist_ok=True)
+            save_records(job_folder, tendons)
+            save_pages(job_folder, settings, pages)
+            logger.info(f"[Job {job_id}] ✅ Saved {len(tendons)} tendon records")
+            if previous_job_id:
+                logger.info(f"[Job {job_id}] Reused {len(reused_pages)} of {total_pages} pages from job {previous_job_id}")
+            update_job(
+                job_id,
+                status='completed',
+                message='Processing complete!',
+                progress=100,
+                results=results,
+                metrics=timings.to_dict()
+            )
+            logger.info(f"[Job {job_id}] ✅ SUCCESS: All {len(results)} pages processed successfully")
+            logger.debug(f"[Job {job_id}] Results: {results}")
+
+        except Exception as e:
+            error_msg = str(e)
+            error_type = type(e).__name__
+            update_job(
+                job_id,
+                status='failed',
+                message=f'Error: {error_msg}',
+                metrics=timings.to_dict(),
+                memory=memory.to_dict() if memory is not None else None
+            )
+            logger.error(f"[Job {job_id}] ========== PROCESSING FAILED ==========")
+            logger.error(f"[Job {job_id}] ❌ Error type: {error_type}")
+            logger.error(f"[Job {job_id}] ❌ Error message: {error_msg}")
+            logger.error(f"[Job {job_id}] ❌ Full traceback:\n{traceback.format_exc()}")
+            logger.error(f"[Job {job_id}] ========== END ERROR LOG ==========\n")
+        finally:
+            if store is not None:
+                store.cleanup()
+            if memory is not None:
+                memory.close()
+
+    if profile:
+        update_job(job_id, profile=profile_info)
+        logger.info(f"[Job {job_id}] Profile written: {profile_info}")
 
 # Serve the main HTML page
 @app.route('/')
 def index():
-    response = send_file('index.html')
-    # Disable caching to ensure browser always gets the latest version
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    with open('index.html', 'rb') as f:
+        response = app.response_class(f.read(), mimetype='text/html')
+    # Revalidate on every load: unchanged pages cost a 304, a new deploy is picked up immediately
+    response.set_etag(file_etag('index.html'))
+    response.cache_control.no_cache = True
+    return response
+
+# Built React frontend (npm run build); Vite emits content-hashed asset names under /assets
+@app.route('/app')
+def frontend_app():
+    index_path = os.path.join(config.FRONTEND_DIST_DIR, 'index.html')
+    if not os.path.exists(index_path):
+        return jsonify({'error': 'Frontend build not found'}), 404
+    with open(index_path, 'rb') as f:
+        response = app.response_class(f.read(), mimetype='text/html')
+    response.set_etag(file_etag(index_path))
+    response.cache_control.no_cache = True
     return response
 
+@app.route('/assets/<path:filename>')
+def frontend_asset(filename):
+    assets_dir = os.path.join(config.FRONTEND_DIST_DIR, 'assets')
+    if not os.path.isfile(os.path.join(assets_dir, filename)):
+        return jsonify({'error': 'File not found'}), 404
+    return send_immutable(assets_dir, filename)
+
+# Liveness: the process is up and serving requests
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+# Readiness: pipeline imported, models loaded and warmed up
+@app.route('/readyz')
+def readyz():
+    model_loader.start()
+    status = model_loader.status()
+    return jsonify(status), 200 if status['status'] == 'ready' else 503
+
+# Prometheus scrape endpoint: stage timing histograms, per-page counts and queue depth
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def parse_job_options(form):
+    """
+    Per-job options of an upload form: profiling mode, OCR models, the job
+    to update and memory tracking. Returns (options, None), or (None, error message).
+    """
+    # Optional profiling: profile=1|sampling|cprofile profiles this job, profile=0 opts out of PROFILE_JOBS
+    profile = form.get('profile', '').lower()
+    if profile in ('1', 'true', 'yes'):
+        profile = config.PROFILE_MODE
+    elif profile in ('0', 'false', 'no'):
+        profile = None
+    elif profile == '':
+        profile = config.PROFILE_MODE if config.PROFILE_JOBS else None
+    elif profile not in PROFILE_MODES:
+        logger.warning(f"Upload failed: Invalid profile mode - {profile}")
+        return None, f"Invalid profile mode, use one of {', '.join(PROFILE_MODES)}"
+
+    # Optional OCR models for this job (models other than the preloaded pair load on first use)
+    det_arch = form.get('det_arch') or config.OCR_DET_ARCH
+    reco_arch = form.get('reco_arch') or config.OCR_RECO_ARCH
+    if det_arch not in config.OCR_DET_ARCHS:
+        logger.warning(f"Upload failed: Invalid detection model - {det_arch}")
+        return None, f"Invalid det_arch, use one of {', '.join(config.OCR_DET_ARCHS)}"
+    if reco_arch not in config.OCR_RECO_ARCHS:
+        logger.warning(f"Upload failed: Invalid recognition model - {reco_arch}")
+        return None, f"Invalid reco_arch, use one of {', '.join(config.OCR_RECO_ARCHS)}"
+
+    # Optional update of a previous job: pages unchanged since that job are not processed again
+    previous_job_id = form.get('previous_job_id') or None
+    if previous_job_id is not None:
+        try:
+            valid_id = str(uuid.UUID(previous_job_id)) == previous_job_id
+        except ValueError:
+            valid_id = False
+        if not valid_id or not os.path.exists(os.path.join(OUTPUT_FOLDER, previous_job_id, PAGES_FILENAME)):
+            logger.warning(f"Upload failed: No completed job to update - {previous_job_id}")
+            return None, 'previous_job_id is not a completed job'
+
+    # Optional memory tracking: memory=1 tracks this job, memory=0 opts out of MEMORY_TRACKING
+    track_memory = form.get('memory', '').lower()
+    if track_memory not in ('', '1', 'true', 'yes', '0', 'false', 'no'):
+        logger.warning(f"Upload failed: Invalid memory option - {track_memory}")
+        return None, 'Invalid memory option, use 1 or 0'
+    track_memory = None if track_memory == '' else track_memory in ('1', 'true', 'yes')
+
+    return {
+        'profile': profile, 'det_arch': det_arch, 'reco_arch': reco_arch,
+        'previous_job_id': previous_job_id, 'track_memory': track_memory,
+    }, None
+
+def create_job(job_id, options, batch_id=None):
+    """Initialize a queued job's status"""
+    profile = options['profile']
+    jobs[job_id] = {
+        'status': 'queued',
+        'message': 'File uploaded, waiting to process...',
+        'progress': 0,
+        'total_pages': 0,
+        'current_page': 0,
+        'results': [],
+        'metrics': None,
+        'memory': None,
+        'ocr_models': {'det_arch': options['det_arch'], 'reco_arch': options['reco_arch']},
+        'ocr_batching': [],
+        'previous_job_id': options['previous_job_id'],
+        'reused_pages': [],
+        'batch_id': batch_id,
+        'profile': {'mode': profile, 'samples': 0, 'files': []} if profile else None
+    }
+    logger.info(f"Job {job_id} initialized with status: queued")
+
+def run_job(job_id, filepath, options):
+    process_pdf(
+        job_id, filepath, options['profile'], options['det_arch'], options['reco_arch'], options['previous_job_id'],
+        options['track_memory'],
+    )
+
+def start_job(job_id, filepath, options):
+    """Process the job in a background thread"""
+    thread = threading.Thread(target=run_job, args=(job_id, filepath, options))
+    thread.daemon = True
+    thread.start()
+    logger.info(f"Background processing thread started for job {job_id}")
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    logger.warning(f"Upload failed: Request body too large ({request.content_length} bytes)")
+    return jsonify({'error': 'Request too large'}), 413
+
 # API Routes
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -269,6 +663,10 @@ def upload_file():
 
     logger.info(f"File received: {file.filename}")
 
+    options, error = parse_job_options(request.form)
+    if error:
+        return jsonify({'error': error}), 400
+
     if not allowed_file(file.filename):
         logger.warning(f"Upload failed: Invalid file type - {file.filename}")
         return jsonify({'error': 'Invalid file type. Only PDF files are allowed'}), 400
@@ -290,28 +688,192 @@ def upload_file():
         logger.error(f"Save error traceback: {traceback.format_exc()}")
         return jsonify({'error': 'Failed to save file'}), 500
 
-    # Initialize job status
-    jobs[job_id] = {
-        'status': 'queued',
-        'message': 'File uploaded, waiting to process...',
-        'progress': 0,
-        'total_pages': 0,
-        'current_page': 0,
-        'results': []
-    }
-    logger.info(f"Job {job_id} initialized with status: queued")
+    create_job(job_id, options)
+    start_job(job_id, filepath, options)
+
+    return jsonify({
+        'job_id': job_id,
+        'message': 'File uploaded successfully, processing started'
+    }), 202
+
+def save_batch_file(name, stream):
+    """
+    Save one PDF of a batch into the upload folder under a new job id, at
+    most MAX_FILE_SIZE bytes of it (ValueError past that)
+    """
+    job_id = str(uuid.uuid4())
+    filepath = os.path.join(UPLOAD_FOLDER, f"{job_id}_{secure_filename(name) or 'upload.pdf'}")
+    size = 0
+    with open(filepath, 'wb') as f:
+        # Zip members can declare any size: count what is actually written
+        while chunk := stream.read(1024 * 1024):
+            size += len(chunk)
+            if size > config.MAX_FILE_SIZE:
+                break
+            f.write(chunk)
+    if size > config.MAX_FILE_SIZE:
+        os.remove(filepath)
+        raise ValueError(f"{name} is larger than {config.MAX_FILE_SIZE} bytes")
+    return job_id, name, filepath
+
+def run_batch(batch_id, saved, options):
+    """
+    Load and warm up the batch's OCR models once, then queue its child
+    jobs; the shared batch workers run PAGE_WORKERS of them at a time,
+    across all batches
+    """
+    if not model_loader.wait():
+        logger.error(f"[Batch {batch_id}] Model initialization failed: {model_loader.error}")
+    elif (options['det_arch'], options['reco_arch']) != (config.OCR_DET_ARCH, config.OCR_RECO_ARCH):
+        # The model loader warmed up the default pair; children share this one
+        from model_loader import warm_up
+        from ocr.backends import get_ocr
+        try:
+            with stage('model_load'):
+                warm_up(get_ocr(gpu=model_loader.gpu, det_arch=options['det_arch'], reco_arch=options['reco_arch']))
+        except Exception as warmup_error:
+            logger.error(f"[Batch {batch_id}] Warm-up of {options['det_arch']}+{options['reco_arch']} failed: {warmup_error}")
+    start_batch_workers()
+    for job_id, _, filepath in saved:
+        batch_queue.put((job_id, filepath, options))
+    logger.info(f"[Batch {batch_id}] Queued {len(saved)} jobs")
+
+def batch_worker():
+    while True:
+        job_id, filepath, options = batch_queue.get()
+        try:
+            run_job(job_id, filepath, options)
+        except Exception as job_error:
+            logger.error(f"[Job {job_id}] Batch job crashed: {job_error}")
+
+def start_batch_workers():
+    """Start the shared batch job threads (once)"""
+    with batch_workers_lock:
+        while len(batch_workers) < config.PAGE_WORKERS:
+            thread = threading.Thread(target=batch_worker, name=f"batch-worker-{len(batch_workers)}", daemon=True)
+            thread.start()
+            batch_workers.append(thread)
+
+def check_batch_size(saved):
+    if len(saved) >= config.BATCH_MAX_FILES:
+        raise ValueError(f"A batch can have at most {config.BATCH_MAX_FILES} PDFs")
+
+@app.route('/api/batch', methods=['POST'])
+def upload_batch():
+    """Many PDFs in one request: several 'files' fields, zip archives of PDFs, or both"""
+    logger.info("Batch upload request received")
+    # Before the body is parsed: the app-wide limit is sized for one PDF
+    request.max_content_length = config.BATCH_MAX_REQUEST_SIZE
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        logger.warning("Batch upload failed: No files in request")
+        return jsonify({'error': 'No files provided'}), 400
+
+    options, error = parse_job_options(request.form)
+    if error:
+        return jsonify({'error': error}), 400
+
+    saved = []
+    try:
+        for file in files:
+            if file.filename.lower().endswith('.zip'):
+                with zipfile.ZipFile(file.stream) as archive:
+                    for member in archive.infolist():
+                        name = os.path.basename(member.filename)
+                        if member.is_dir() or member.filename.startswith('__MACOSX/') or not allowed_file(name):
+                            continue
+                        # Checked before anything is extracted
+                        check_batch_size(saved)
+                        if member.file_size > config.MAX_FILE_SIZE:
+                            raise ValueError(f"{name} is larger than {config.MAX_FILE_SIZE} bytes")
+                        with archive.open(member) as stream:
+                            saved.append(save_batch_file(name, stream))
+            elif allowed_file(file.filename):
+                check_batch_size(saved)
+                saved.append(save_batch_file(file.filename, file.stream))
+            else:
+                raise ValueError(f"Invalid file type: {file.filename}. Only PDF and zip files are allowed")
+        if not saved:
+            raise ValueError("No PDF files in the request")
+    except (ValueError, zipfile.BadZipFile) as batch_error:
+        logger.warning(f"Batch upload failed: {batch_error}")
+        for _, _, filepath in saved:
+            os.remove(filepath)
+        return jsonify({'error': str(batch_error)}), 400
+
+    batch_id = str(uuid.uuid4())
+    for job_id, name, _ in saved:
+        create_job(job_id, options, batch_id=batch_id)
+        jobs[job_id]['filename'] = name
+    batches[batch_id] = {'created': time.time(), 'job_ids': [job_id for job_id, _, _ in saved]}
+    logger.info(f"Batch {batch_id} initialized with {len(saved)} jobs")
 
-    # Start background processing
-    thread = threading.Thread(target=process_pdf, args=(job_id, filepath))
+    thread = threading.Thread(target=run_batch, args=(batch_id, saved, options))
     thread.daemon = True
     thread.start()
-    logger.info(f"Background processing thread started for job {job_id}")
 
     return jsonify({
-        'job_id': job_id,
-        'message': 'File uploaded successfully, processing started'
+        'batch_id': batch_id,
+        'jobs': [{'job_id': job_id, 'filename': name} for job_id, name, _ in saved],
+        'message': f'{len(saved)} files uploaded, processing started'
     }), 202
 
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    """Aggregate status of a batch: job counts, pages done, progress, throughput and ETA"""
+    if batch_id not in batches:
+        logger.warning(f"Batch status failed: Batch {batch_id} not found")
+        return jsonify({'error': 'Batch not found'}), 404
+
+    batch = batches[batch_id]
+    children = [(job_id, dict(jobs[job_id])) for job_id in batch['job_ids']]
+    counts = {status: 0 for status in ('queued', 'processing', 'completed', 'failed')}
+    pages_done = 0
+    counted = []  # page counts of the jobs that have read their PDF
+    for _, job in children:
+        counts[job['status']] += 1
+        if job['total_pages']:
+            counted.append(job['total_pages'])
+        if job['status'] == 'completed':
+            pages_done += job['total_pages']
+        elif job['current_page']:
+            pages_done += job['current_page'] - 1
+
+    # Jobs that haven't read their PDF yet are assumed to be as long as the average one
+    total_pages = sum(counted) + (len(children) - len(counted)) * (sum(counted) / len(counted) if counted else 0)
+    elapsed = time.time() - batch['created']
+    pages_per_minute = pages_done / elapsed * 60 if elapsed > 0 else 0.0
+    remaining = max(total_pages - pages_done, 0)
+    finished = counts['completed'] + counts['failed']
+
+    if finished == len(children):
+        status = 'completed' if not counts['failed'] else ('failed' if not counts['completed'] else 'partial')
+    else:
+        status = 'queued' if counts['queued'] == len(children) else 'processing'
+
+    return jsonify({
+        'batch_id': batch_id,
+        'status': status,
+        'jobs': counts,
+        'progress': round(sum(job['progress'] for _, job in children) / len(children), 1),
+        'pages_done': pages_done,
+        'total_pages': round(total_pages),
+        'elapsed_seconds': round(elapsed, 1),
+        'pages_per_minute': round(pages_per_minute, 2),
+        'eta_seconds': round(remaining / pages_per_minute * 60) if pages_per_minute and finished < len(children) else None,
+        'children': [
+            {
+                'job_id': job_id,
+                'filename': job.get('filename'),
+                'status': job['status'],
+                'progress': job['progress'],
+                'total_pages': job['total_pages'],
+                'message': job['message'],
+            }
+            for job_id, job in children
+        ],
+    })
+
 @app.route('/api/status/<job_id>', methods=['GET'])
 def get_status(job_id):
     logger.debug(f"Status check for job: {job_id}")
@@ -324,6 +886,42 @@ def get_status(job_id):
     logger.debug(f"Job {job_id} status: {status['status']}, progress: {status['progress']}%")
     return jsonify(status)
 
+@app.route('/api/events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of job status, pushed as process_pdf updates it"""
+    logger.info(f"Event stream opened for job: {job_id}")
+
+    if job_id not in jobs:
+        logger.warning(f"Event stream failed: Job {job_id} not found")
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        version = -1
+        while True:
+            with job_updated:
+                job_updated.wait_for(lambda: job_versions.get(job_id, 0) != version, timeout=config.SSE_HEARTBEAT_SECONDS)
+                changed = job_versions.get(job_id, 0) != version
+                version = job_versions.get(job_id, 0)
+                status = dict(jobs[job_id])
+
+            if not changed:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+
+            yield f"event: status\ndata: {json.dumps(status)}\n\n"
+            if status['status'] in ('completed', 'failed'):
+                return
+
+            # Coalesce: every update in the next interval goes out as one event with the latest status
+            time.sleep(config.SSE_MIN_INTERVAL)
+
+    return Response(
+        stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/results/<job_id>', methods=['GET'])
 def get_results(job_id):
     logger.info(f"Results requested for job: {job_id}")
@@ -345,6 +943,48 @@ def get_results(job_id):
         'results': job['results']
     })
 
+@app.route('/api/results/<job_id>/tendons', methods=['GET'])
+def get_tendons(job_id):
+    """Structured tendon records as JSON (default), ?format=csv (streamed) or ?format=parquet"""
+    fmt = request.args.get('format', 'json')
+    logger.info(f"Tendon records requested for job: {job_id} ({fmt})")
+
+    if job_id not in jobs:
+        logger.warning(f"Tendon records request failed: Job {job_id} not found")
+        return jsonify({'error': 'Job not found'}), 404
+
+    if jobs[job_id]['status'] != 'completed':
+        return jsonify({'error': 'Job not completed yet'}), 400
+
+    job_folder = os.path.join(OUTPUT_FOLDER, job_id)
+    records = load_records(job_folder)
+
+    if fmt == 'json':
+        return jsonify({
+            'job_id': job_id,
+            'tendon_count': len(records),
+            'tendons': records
+        })
+
+    if fmt == 'csv':
+        return Response(
+            iter_csv(records),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{job_id}_tendons.csv"'}
+        )
+
+    if fmt == 'parquet':
+        try:
+            path = write_parquet(job_folder, records)
+        except ImportError as parquet_error:
+            logger.error(f"Parquet export unavailable: {str(parquet_error)}")
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+        response = send_immutable(job_folder, os.path.basename(path), mimetype='application/vnd.apache.parquet')
+        response.headers['Content-Disposition'] = f'attachment; filename="{job_id}_tendons.parquet"'
+        return response
+
+    return jsonify({'error': 'Unsupported format, use json, csv or parquet'}), 400
+
 @app.route('/api/download/<job_id>/<filename>', methods=['GET'])
 def download_file(job_id, filename):
     logger.info(f"Download requested: {job_id}/{filename}")
@@ -355,7 +995,17 @@ def download_file(job_id, filename):
         return jsonify({'error': 'File not found'}), 404
 
     logger.info(f"Serving file: {filepath}")
-    return send_file(filepath, mimetype='image/png')
+    # Job outputs are written once, so they get strong ETags and immutable caching
+    mimetype = 'application/xml' if filename.endswith('.dzi') else None
+    return send_immutable(os.path.join(OUTPUT_FOLDER, job_id), filename, mimetype=mimetype)
+
+# Deep-zoom tiles, laid out as <name>_files/<level>/<col>_<row>.<ext> next to <name>.dzi
+@app.route('/api/download/<job_id>/<pyramid>_files/<int:level>/<tile>', methods=['GET'])
+def download_tile(job_id, pyramid, level, tile):
+    tiles_dir = os.path.join(OUTPUT_FOLDER, job_id, f"{pyramid}_files", str(level))
+    if not os.path.exists(os.path.join(tiles_dir, tile)):
+        return jsonify({'error': 'Tile not found'}), 404
+    return send_immutable(tiles_dir, tile)
 
 if __name__ == '__main__':
     print("=" * 60)
@@ -372,5 +1022,8 @@ if __name__ == '__main__':
     print(f"   - GPU Enabled: {config.USE_GPU}")
     print(f"   - Debug Mode: {config.DEBUG_MODE}")
     print("=" * 60)
+    # With the debug reloader, the parent process only watches files; models load in the child
+    if config.PRELOAD_MODELS and (not config.DEBUG_MODE or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        model_loader.start()
     app.run(debug=config.DEBUG_MODE, host=config.SERVER_HOST, port=config.SERVER_PORT)
 
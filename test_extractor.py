@@ -6,7 +6,9 @@ import numpy as np
 import pandas as pd
 
 from ocr.extractor import TextExtractor
-from ocr.line_detector import detect_lines_global, merge_lines, find_template_and_match, detect_line_ending_in_bbox
+from ocr.line_detector import detect_lines_global, merge_lines, find_template_and_match, detect_line_ending_in_bbox, to_gray
+from metrics import stage
+import config
 
 
 def draw_boxes(image, df, color=(0, 255, 0), thickness=2):
@@ -44,24 +46,91 @@ def draw_boxes(image, df, color=(0, 255, 0), thickness=2):
 
     return img
 
-def extract_tendons(words, image):
-    text_extractor = TextExtractor(words, debug=True)
-    value = text_extractor.get_tendons()
+def allocate(store, name, shape):
+    """In-memory array, or a memmap in the job's page store when one is given"""
+    if store is None:
+        return np.empty(shape, np.uint8)
+    return store.allocate(name, shape)
+
+def line_level_shape(image, level):
+    """Shape of pyramid level `level` (downscaled by 2**level) of the page"""
+    factor = 2 ** level
     height, width = image.shape[:2]
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    ret, thresh = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY_INV)
+    return -(-height // factor), -(-width // factor)
+
+def threshold_lines(image, out, strip_rows=1024, level=0):
+    """
+    Binarize + erode the page for line detection, one strip of rows at a time.
+    With `level` > 0 each strip is downscaled by 2**level into `out` (shaped
+    by line_level_shape); a pixel keeps any ink of its block so thin lines
+    survive. `strip_rows` must be a multiple of 2**level.
+    """
+    height = image.shape[0]
+    factor = 2 ** level
+    out_h, out_w = out.shape[:2]
     kernel = np.ones((2, 2), np.uint8)
-    erode = cv2.erode(thresh, kernel)
+    for y in range(0, height, strip_rows):
+        # a 2x2 erode looks one row up, so each strip starts one row early
+        y0 = max(y - 1, 0)
+        y1 = min(y + strip_rows, height)
+        gray = to_gray(image[y0:y1])
+        ret, thresh = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY_INV)
+        eroded = cv2.erode(thresh, kernel)[y - y0:]
+        if level:
+            sy0, sy1 = y // factor, min(-(-y1 // factor), out_h)
+            small = cv2.resize(eroded, (out_w, sy1 - sy0), interpolation=cv2.INTER_AREA)
+            cv2.threshold(small, 0, 255, cv2.THRESH_BINARY, dst=small)
+            out[sy0:sy1] = small
+        else:
+            out[y:y1] = eroded
+    return out
+
+def copy_to_color(image, out, strip_rows=1024):
+    """Copy the page into the 3-channel output image, one strip of rows at a time"""
+    height = image.shape[0]
+    for y in range(0, height, strip_rows):
+        strip = image[y:y + strip_rows]
+        # Grayscale pages only get color channels here, for the annotated output
+        out[y:y + strip_rows] = cv2.cvtColor(strip, cv2.COLOR_GRAY2BGR) if strip.ndim == 2 else strip
+    return out
+
+def extract_tendons(words, image, store=None, line_level=None, lines=None):
+    """
+    Find TENDON callouts, match their indicator template and the line ending in it.
+    Returns the annotated (BGR) image and one record per callout:
+    text, banded flag, indicator bbox, matched template + scores, template bbox
+    and line endpoints (pixel coordinates; None where nothing was matched).
+    Lines are detected on pyramid level `line_level` (default
+    config.LINE_DETECTION_LEVEL) of the page, unless the page's `lines` are
+    given as (x1, y1, x2, y2) pixel tuples (vector_lines.page_lines).
+    """
+    line_level = config.LINE_DETECTION_LEVEL if line_level is None else line_level
+    with stage('get_tendons'):
+        text_extractor = TextExtractor(words, debug=True)
+        value = text_extractor.get_tendons()
+    height, width = image.shape[:2]
+    if lines is not None:
+        with stage('line_detection'):
+            final_lines = merge_lines(lines)
+    else:
+        with stage('line_threshold'):
+            erode = threshold_lines(image, allocate(store, 'lines', line_level_shape(image, line_level)), level=line_level)
 
-    raw_lines = detect_lines_global(erode)
-    final_lines = merge_lines(raw_lines)
+        with stage('line_detection'):
+            raw_lines = detect_lines_global(erode, level=line_level)
+            final_lines = merge_lines(raw_lines)
+        del erode
+        if store is not None:
+            store.remove('lines')
 
-    vis = image.copy()
+    with stage('copy_output'):
+        vis = copy_to_color(image, allocate(store, 'vis', (height, width, 3)))
     # for x1, y1, x2, y2 in final_lines:
     #     cv2.line(vis, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
     b_th = 10
     i = 0
+    records = []
     for tendon in value:
         # color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
         is_banded = not tendon.loc[tendon.value.str.contains("BANDED")].empty
@@ -75,16 +144,34 @@ def extract_tendons(words, image):
         w, h = x2 - x1, y2 - y1
         xe1, ye1, xe2, ye2 = x1 - w, y1 - h, x2 + w, y2 + int(h * 2.5)
         img_crop = image[ye1:ye2, xe1:xe2]
+        record = {
+            'tendon_idx': i,
+            'text': " ".join(tendon.value.tolist()),
+            'banded': is_banded,
+            'indicator_bbox': [x1, y1, x2, y2],
+            'template': None,
+            'contour_score': None,
+            'template_match_score': None,
+            'template_bbox': None,
+            'line': None,
+        }
+        records.append(record)
         i = i + 1
         if img_crop.shape[0] > 0 and img_crop.shape[1] > 0:
             # cv2.imwrite(f"data/examples-output/tendon_image_{i}.png", img_crop)
-            matched, bbox, val = find_template_and_match(img_crop)
+            with stage('template_matching'):
+                matched, bbox, val, template, score = find_template_and_match(img_crop)
 
             if matched:
                 xt1, yt1, xt2, yt2 = bbox
                 xt1, yt1, xt2, yt2 = xt1 + xe1, yt1 + ye1, xt2 + xe1, yt2 + ye1
+                record['template'] = template
+                record['contour_score'] = float(score)
+                record['template_match_score'] = float(val)
+                record['template_bbox'] = [int(xt1), int(yt1), int(xt2), int(yt2)]
                 found = detect_line_ending_in_bbox(final_lines, (xt1 - b_th, yt1 - b_th, xt2 + b_th, yt2 + b_th))
                 if found is not None:
+                    record['line'] = [int(v) for v in found]
                     cv2.rectangle(vis, (xe1, ye1), (xe2, ye2), color, 3)
                     cv2.rectangle(vis, (xt1, yt1), (xt2, yt2), color, 2)
                     cv2.putText(vis, f"{matched}", (xt1, yt1), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
@@ -100,13 +187,13 @@ def extract_tendons(words, image):
             #     cv2.rectangle(vis, (xe1, ye1), (xe2, ye2), color, 1)
             #     cv2.putText(vis, f"{matched}", (xe1, ye1), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 1)
 
-    return vis
+    return vis, records
 
 def main():
     word_df = pd.read_csv('/home/sadid/PycharmProjects/sgs-drawing-analysis/data/final.csv')
     os.makedirs("data", exist_ok=True)
     image = cv2.imread("data/original.png")
-    vis = extract_tendons(word_df, image)
+    vis, records = extract_tendons(word_df, image)
     cv2.imwrite(f"data/ocr_boxes_tendon-{0}.png", vis)
     print("Finished")
 
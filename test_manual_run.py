@@ -88,8 +88,8 @@ def process_pdf_manual(pdf_path):
             # Step 2b: Extract tendons
             print("\n🎯 Extracting tendons (extract_tendons)...")
             # Note: extract_tendons expects (words, image) not (image, words)
-            annotated_image = extract_tendons(ocr_results, img_array)
-            print(f"✅ Tendon extraction complete")
+            annotated_image, tendons = extract_tendons(ocr_results, img_array)
+            print(f"✅ Tendon extraction complete: {len(tendons)} tendons")
             
             # Step 2c: Save result
             output_filename = f'{job_id}_page_{page_num}.png'
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Check that the model loader retries after a failed load: the first wait()
+sees the failure, the next wait() loads again and succeeds. The pipeline
+imports and the model are replaced, so no models are needed.
+
+    python test_model_loader.py    (or: python -m pytest test_model_loader.py)
+"""
+import model_loader
+from model_loader import ModelLoader
+
+
+def test_wait_retries_after_failed_load():
+    attempts = []
+
+    def import_pipeline():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("model download failed")
+
+    loader = ModelLoader()
+    loader.import_pipeline = import_pipeline
+    detect_gpu, model_loader.detect_gpu = model_loader.detect_gpu, lambda: False
+    warmup, model_loader.config.WARMUP_MODELS = model_loader.config.WARMUP_MODELS, False
+    get_ocr = None
+    try:
+        import ocr.backends
+        get_ocr, ocr.backends.get_ocr = ocr.backends.get_ocr, lambda gpu=False: object()
+
+        assert not loader.wait(timeout=10)
+        assert loader.state == 'failed' and loader.error == "model download failed"
+
+        assert loader.wait(timeout=10)
+        assert loader.state == 'ready' and loader.error is None
+        assert len(attempts) == 2
+
+        # Ready: no further load
+        assert loader.wait(timeout=10)
+        assert len(attempts) == 2
+    finally:
+        model_loader.detect_gpu = detect_gpu
+        model_loader.config.WARMUP_MODELS = warmup
+        if get_ocr is not None:
+            ocr.backends.get_ocr = get_ocr
+
+
+if __name__ == '__main__':
+    test_wait_retries_after_failed_load()
+    print("✅ Model loader retries after a failed load")
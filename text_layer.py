@@ -0,0 +1,159 @@
+"""
+Embedded PDF text layer as a replacement for OCR
+
+Sheets exported from CAD carry their text with exact positions. poppler's
+`pdftotext -bbox` (installed alongside pdftoppm for pdf2image) lists every
+word of a page with its box in PDF points, in the same orientation and crop
+box pdftoppm rasterizes, so dividing by the page size gives the word table
+tile_ocr produces (value, confidence, x1..y2 normalized, tile_id, word_idx)
+without running the models. Text-layer words get confidence 1.0 and
+tile_id 0.
+
+A page falls back to OCR when its layer is missing (scans, text exported as
+outlines) or sparse: fewer than TEXT_LAYER_MIN_WORDS words, or more than
+TEXT_LAYER_MAX_UNMAPPED of them made of characters without a Unicode mapping
+(fonts without a ToUnicode table extract as garbage or U+FFFD).
+
+The OCR time a text-layer page saved is estimated from a stored baseline:
+the seconds per megapixel of the pages OCR'd with the same backend, mode,
+models and device, kept in OCR_BASELINE_FILE across restarts. With the text
+layer on, the server adds every page OCR'd by already loaded models without
+tile cache hits (record_ocr), and benchmarks/text_layer.py --record-baseline
+seeds it from a plan set.
+"""
+import html
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["value", "confidence", "x1", "y1", "x2", "y2", "tile_id", "word_idx"]
+
+_PAGE = re.compile(r'<page width="([\d.]+)" height="([\d.]+)">')
+_WORD = re.compile(
+    r'<word xMin="([-\d.]+)" yMin="([-\d.]+)" xMax="([-\d.]+)" yMax="([-\d.]+)">(.*?)</word>',
+    re.S,
+)
+# Replacement character, C0 controls and private-use glyphs: text without a Unicode mapping
+_UNMAPPED = re.compile('[\ufffd\x00-\x1f\ue000-\uf8ff]')
+
+
+def run_pdftotext(pdf_path, page_number, timeout=60):
+    """`pdftotext -bbox` XHTML of one page (0-based)"""
+    result = subprocess.run(
+        ['pdftotext', '-bbox', '-f', str(page_number + 1), '-l', str(page_number + 1), pdf_path, '-'],
+        capture_output=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"pdftotext failed on page {page_number + 1} of {pdf_path}: "
+            f"{result.stderr.decode(errors='replace').strip()}"
+        )
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+def parse_bbox(xhtml):
+    """Word table of one page of `pdftotext -bbox` output"""
+    page = _PAGE.search(xhtml)
+    if page is None:
+        return pd.DataFrame(columns=COLUMNS)
+    width, height = float(page.group(1)), float(page.group(2))
+
+    rows = []
+    for x1, y1, x2, y2, value in _WORD.findall(xhtml, page.end()):
+        value = html.unescape(value).strip()
+        if value:
+            rows.append((value, float(x1) / width, float(y1) / height, float(x2) / width, float(y2) / height))
+
+    words = pd.DataFrame(rows, columns=["value", "x1", "y1", "x2", "y2"])
+    words[["x1", "y1", "x2", "y2"]] = words[["x1", "y1", "x2", "y2"]].clip(0.0, 1.0)
+    words.insert(1, "confidence", 1.0)
+    words["tile_id"] = 0
+    words["word_idx"] = range(len(words))
+    return words[COLUMNS]
+
+
+def usable(words):
+    """(True, '') when the layer can replace OCR, else (False, reason)"""
+    if len(words) < config.TEXT_LAYER_MIN_WORDS:
+        return False, f"{len(words)} words (< {config.TEXT_LAYER_MIN_WORDS})"
+    unmapped = words["value"].str.contains(_UNMAPPED).mean()
+    if unmapped > config.TEXT_LAYER_MAX_UNMAPPED:
+        return False, f"{unmapped:.0%} of words without a Unicode mapping"
+    return True, ""
+
+
+def page_words(pdf_path, page_number, stats=None):
+    """
+    Word DataFrame of one page (0-based) from the PDF's text layer, or None
+    when the page has to be OCR'd. If `stats` is a dict, the word count and
+    the reason for a fallback are written into it.
+    """
+    try:
+        words = parse_bbox(run_pdftotext(pdf_path, page_number))
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Text layer unavailable for page {page_number + 1}: {e}")
+        words, ok, reason = None, False, str(e)
+    else:
+        ok, reason = usable(words)
+
+    if stats is not None:
+        stats['text_layer_words'] = 0 if words is None else len(words)
+        stats['text_layer_fallback'] = reason or None
+    return words if ok else None
+
+
+def baseline_key(det_arch, reco_arch, gpu):
+    """OCR configuration a stored baseline applies to (what OCR time depends on besides the page size)"""
+    pooled = 'pooled' if config.OCR_POOLED_RECOGNITION else 'tile'
+    quantize = config.OCR_QUANTIZE if config.OCR_CPU_OPTIMIZE and not gpu else 'none'
+    device = 'gpu' if gpu else 'cpu'
+    return f"{config.OCR_BACKEND}:{config.OCR_MODE}:{pooled}:{quantize}:{det_arch}:{reco_arch}:{device}"
+
+
+_baseline_lock = threading.Lock()
+
+
+def load_baseline():
+    """Stored OCR baseline: {key: {'pages', 'seconds', 'megapixels'}}"""
+    try:
+        with open(config.OCR_BASELINE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_ocr(shape, seconds, key):
+    """Add an OCR'd page of image `shape` to the stored baseline of configuration `key`"""
+    path = config.OCR_BASELINE_FILE
+    with _baseline_lock:
+        baseline = load_baseline()
+        entry = baseline.setdefault(key, {'pages': 0, 'seconds': 0.0, 'megapixels': 0.0})
+        entry['pages'] += 1
+        entry['seconds'] += seconds
+        entry['megapixels'] += shape[0] * shape[1] / 1e6
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def estimated_ocr_seconds(shape, key):
+    """
+    Expected OCR time of a page of image `shape` under configuration `key`,
+    None when no page was ever OCR'd with it
+    """
+    entry = load_baseline().get(key)
+    if not entry or not entry['megapixels']:
+        return None
+    return entry['seconds'] / entry['megapixels'] * shape[0] * shape[1] / 1e6
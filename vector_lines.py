@@ -0,0 +1,346 @@
+"""
+Straight lines of a vector PDF page, read from its drawing operators
+
+CAD exports draw tendons and grid lines as stroked path segments, which
+detect_lines_global rebuilds from pixels with a stack of morphology passes
+per tile. poppler's `pdftocairo -svg` (installed alongside pdftoppm for
+pdf2image) writes those paths out in the page's displayed orientation; the
+SVG is parsed as a stream, and the dark stroked segments are mapped onto the
+rasterized page and reduced the way the raster detector reduces ink:
+
+  - only horizontal and vertical segments (within AXIS_TOLERANCE pixels)
+  - collinear segments with gaps up to BRIDGE_GAP pixels are joined, as the
+    bridging close of the raster detector joins dashes
+  - lines shorter than MIN_LENGTH or stroked wider than MAX_WIDTH pixels
+    are dropped
+
+The result is a list of (x1, y1, x2, y2) pixel tuples at the page's DPI,
+ready for merge_lines and detect_line_ending_in_bbox. Glyphs, clip paths and
+patterns are skipped. A page whose SVG is mostly an embedded image (a scan)
+or has fewer than VECTOR_LINES_MIN_SEGMENTS lines returns None, and its
+lines are detected from the raster as before.
+"""
+import logging
+import re
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Pixel constants of the raster detector (ocr/line_detector.py), at full resolution
+AXIS_TOLERANCE = 2
+BRIDGE_GAP = 100
+MIN_LENGTH = 100
+MAX_WIDTH = 15
+# Strokes lighter than this gray level are not ink to the raster threshold (test_extractor.threshold_lines)
+INK_GRAY = 120
+# A page this much covered by images is a scan
+SCAN_COVERAGE = 0.5
+
+SKIPPED = {'defs', 'symbol', 'clipPath', 'mask', 'pattern', 'marker'}
+PARAMS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM = re.compile(r'(matrix|translate|scale)\s*\(([^)]*)\)')
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_URL = re.compile(r'url\(\s*#([^)\s]+)\s*\)')
+
+
+def compose(parent, child):
+    pa, pb, pc, pd, pe, pf = parent
+    ca, cb, cc, cd, ce, cf = child
+    return (
+        pa * ca + pc * cb, pb * ca + pd * cb,
+        pa * cc + pc * cd, pb * cc + pd * cd,
+        pa * ce + pc * cf + pe, pb * ce + pd * cf + pf,
+    )
+
+
+def parse_transform(value):
+    matrix = IDENTITY
+    for name, args in _TRANSFORM.findall(value or ''):
+        n = [float(v) for v in _NUMBER.findall(args)]
+        if name == 'matrix' and len(n) == 6:
+            step = tuple(n)
+        elif name == 'translate' and n:
+            step = (1.0, 0.0, 0.0, 1.0, n[0], n[1] if len(n) > 1 else 0.0)
+        elif name == 'scale' and n:
+            step = (n[0], 0.0, 0.0, n[1] if len(n) > 1 else n[0], 0.0, 0.0)
+        else:
+            continue
+        matrix = compose(matrix, step)
+    return matrix
+
+
+def apply(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def gray_level(color):
+    """0-255 gray of an SVG color, None when it can't be read (treated as ink)"""
+    color = color.strip()
+    if color.startswith('#') and len(color) == 7:
+        r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    elif color.startswith('rgb('):
+        parts = color[4:-1].split(',')
+        if len(parts) != 3:
+            return None
+        r, g, b = (float(p.strip('% ')) * (2.55 if p.strip().endswith('%') else 1) for p in parts)
+    else:
+        return None
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def path_segments(d):
+    """Straight segments (x1, y1, x2, y2) of an SVG path; curves and arcs only move the pen"""
+    tokens = _TOKEN.findall(d)
+    segments = []
+    x = y = start_x = start_y = 0.0
+    command, i = None, 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'Zz':
+                if (x, y) != (start_x, start_y):
+                    segments.append((x, y, start_x, start_y))
+                x, y = start_x, start_y
+                continue
+        if command is None:
+            break
+        count = PARAMS[command.upper()]
+        if i + count > len(tokens):
+            break
+        args = [float(t) for t in tokens[i:i + count]]
+        i += count
+        relative = command.islower()
+        upper = command.upper()
+        if upper == 'H':
+            nx, ny = args[0] + (x if relative else 0.0), y
+        elif upper == 'V':
+            nx, ny = x, args[0] + (y if relative else 0.0)
+        else:
+            nx, ny = args[-2] + (x if relative else 0.0), args[-1] + (y if relative else 0.0)
+
+        if upper == 'M':
+            start_x, start_y = nx, ny
+            # further coordinate pairs of a moveto are linetos
+            command = 'l' if relative else 'L'
+        elif upper in 'LHV':
+            segments.append((x, y, nx, ny))
+        x, y = nx, ny
+    return segments
+
+
+def determinant(matrix):
+    a, b, c, d = matrix[:4]
+    return abs(a * d - b * c)
+
+
+def read_svg(stream, width, height):
+    """
+    Horizontal and vertical stroke segments of a pdftocairo SVG stream, in
+    pixels of a (height, width) raster of the page, and the fraction of the
+    page covered by images.
+
+    cairo writes a page's images into <defs> (as <image>, or inside a <g>
+    or <pattern>) and draws them with <use xlink:href="#id"> or a fill of
+    url(#id); the image area of every definition is kept by id and counted
+    where it is drawn.
+    """
+    horizontal, vertical = [], []
+    image_area = 0.0
+    stack = []  # (transform, stroke, stroke width) per open element
+    defs_stack = []  # (id, scale before its own transform, transform) per open element of a skipped subtree
+    image_areas = {}  # definition id -> image area in the coordinates it is drawn in
+    page_area = float(width * height)
+
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if event == 'end':
+            (defs_stack or stack).pop()
+            element.clear()
+            continue
+        if defs_stack or tag in SKIPPED:
+            parent = defs_stack[-1][2] if defs_stack else IDENTITY
+            matrix = compose(parent, parse_transform(element.get('transform') or element.get('patternTransform')))
+            defs_stack.append((element.get('id'), determinant(parent), matrix))
+            area = 0.0
+            if tag == 'image':
+                area = float(element.get('width', 0)) * float(element.get('height', 0)) * determinant(matrix)
+            elif tag == 'use':
+                href = element.get(XLINK_HREF) or element.get('href') or ''
+                area = image_areas.get(href[1:], 0.0) * determinant(matrix)
+            if area:
+                for definition, scale, _ in defs_stack:
+                    if definition and scale:
+                        image_areas[definition] = image_areas.get(definition, 0.0) + area / scale
+            continue
+
+        if not stack:
+            # Root: map the viewBox (PDF points) onto the raster
+            box = [float(v) for v in _NUMBER.findall(element.get('viewBox', ''))]
+            if len(box) != 4 or not box[2] or not box[3]:
+                raise ValueError("SVG without a viewBox")
+            sx, sy = width / box[2], height / box[3]
+            stack.append(((sx, 0.0, 0.0, sy, -box[0] * sx, -box[1] * sy), 'none', 1.0))
+            continue
+
+        matrix, stroke, stroke_width = stack[-1]
+        matrix = compose(matrix, parse_transform(element.get('transform')))
+        style = dict(
+            item.split(':', 1) for item in element.get('style', '').split(';') if ':' in item
+        )
+        stroke = style.get('stroke', element.get('stroke', stroke)).strip()
+        stroke_width = float(style.get('stroke-width', element.get('stroke-width', stroke_width)))
+        stack.append((matrix, stroke, stroke_width))
+
+        if tag == 'image':
+            image_area += float(element.get('width', 0)) * float(element.get('height', 0)) * determinant(matrix)
+            continue
+        if tag == 'use':
+            href = element.get(XLINK_HREF) or element.get('href') or ''
+            image_area += image_areas.get(href[1:], 0.0) * determinant(matrix)
+            continue
+        fill = _URL.match(style.get('fill', element.get('fill', '')).strip())
+        if fill and fill.group(1) in image_areas:
+            # Image pattern: the filled shape is covered
+            if tag == 'rect':
+                image_area += float(element.get('width', 0)) * float(element.get('height', 0)) * determinant(matrix)
+            elif tag == 'path':
+                points = [
+                    apply(matrix, x, y)
+                    for x1, y1, x2, y2 in path_segments(element.get('d', '')) for x, y in ((x1, y1), (x2, y2))
+                ]
+                if points:
+                    xs, ys = [x for x, _ in points], [y for _, y in points]
+                    image_area += (max(xs) - min(xs)) * (max(ys) - min(ys))
+        if tag != 'path' or stroke == 'none':
+            continue
+        gray = gray_level(stroke)
+        if gray is not None and gray >= INK_GRAY:
+            continue
+        if stroke_width * determinant(matrix) ** 0.5 > MAX_WIDTH:
+            continue
+
+        for sx1, sy1, sx2, sy2 in path_segments(element.get('d', '')):
+            x1, y1 = apply(matrix, sx1, sy1)
+            x2, y2 = apply(matrix, sx2, sy2)
+            if abs(y2 - y1) <= AXIS_TOLERANCE and abs(x2 - x1) > AXIS_TOLERANCE:
+                horizontal.append(((y1 + y2) / 2, min(x1, x2), max(x1, x2)))
+            elif abs(x2 - x1) <= AXIS_TOLERANCE and abs(y2 - y1) > AXIS_TOLERANCE:
+                vertical.append(((x1 + x2) / 2, min(y1, y2), max(y1, y2)))
+
+    return horizontal, vertical, image_area / page_area
+
+
+def join(segments):
+    """
+    Chain collinear (offset, start, end) segments whose gaps are at most
+    BRIDGE_GAP; returns (offset, start, end) runs of at least MIN_LENGTH
+    """
+    runs = []
+    segments = sorted(segments)
+    i = 0
+    while i < len(segments):
+        # one row (or column) of segments within AXIS_TOLERANCE of each other
+        j = i + 1
+        while j < len(segments) and segments[j][0] - segments[i][0] <= AXIS_TOLERANCE:
+            j += 1
+        row = sorted(segments[i:j], key=lambda s: s[1])
+        offset = sum(s[0] for s in row) / len(row)
+        start, end = row[0][1], row[0][2]
+        for _, s_start, s_end in row[1:]:
+            if s_start - end <= BRIDGE_GAP:
+                end = max(end, s_end)
+            else:
+                runs.append((offset, start, end))
+                start, end = s_start, s_end
+        runs.append((offset, start, end))
+        i = j
+    return [run for run in runs if run[2] - run[1] >= MIN_LENGTH]
+
+
+def run_pdftocairo(pdf_path, page_number, width, height, timeout=120):
+    """
+    Parse the SVG export of one page (0-based) while pdftocairo writes it.
+    `timeout` covers export and parsing: the process is killed when it runs
+    out, and always killed and reaped when parsing stops early.
+    """
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            ['pdftocairo', '-svg', '-f', str(page_number + 1), '-l', str(page_number + 1), pdf_path, '-'],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+        error = None
+        try:
+            result = read_svg(process.stdout, width, height)
+            process.wait()
+        except ET.ParseError as e:
+            error = e
+            # A failing pdftocairo closes its output first: let it exit with its status
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+        finally:
+            timer.cancel()
+            stopped = process.poll() is None
+            if stopped:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        if not stopped and process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(
+                f"pdftocairo failed on page {page_number + 1} of {pdf_path}: {stderr.read().decode(errors='replace').strip()}"
+            )
+        if error is not None:
+            raise RuntimeError(f"Unreadable SVG export of page {page_number + 1}: {error}")
+    return result
+
+
+def page_lines(pdf_path, page_number, shape, stats=None):
+    """
+    Lines of one page (0-based) as (x1, y1, x2, y2) pixel tuples of a raster
+    of `shape`, or None when they have to be detected from the raster. If
+    `stats` is a dict, the line count and the reason for a fallback are
+    written into it.
+    """
+    height, width = shape[:2]
+    lines, reason = None, None
+    try:
+        horizontal, vertical, image_coverage = run_pdftocairo(pdf_path, page_number, width, height)
+    except (OSError, RuntimeError, ValueError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Vector lines unavailable for page {page_number + 1}: {e}")
+        reason = str(e)
+    else:
+        lines = [(int(round(x1)), int(round(y)), int(round(x2)), int(round(y))) for y, x1, x2 in join(horizontal)]
+        lines += [(int(round(x)), int(round(y1)), int(round(x)), int(round(y2))) for x, y1, y2 in join(vertical)]
+        if image_coverage >= SCAN_COVERAGE:
+            reason = f"{image_coverage:.0%} of the page is images"
+        elif len(lines) < config.VECTOR_LINES_MIN_SEGMENTS:
+            reason = f"{len(lines)} vector lines (< {config.VECTOR_LINES_MIN_SEGMENTS})"
+
+    if stats is not None:
+        stats['vector_lines'] = 0 if lines is None else len(lines)
+        stats['vector_lines_fallback'] = reason
+    return None if reason else lines